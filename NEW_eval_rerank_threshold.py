@@ -9,6 +9,12 @@ import pandas as pd
 from pymongo import MongoClient
 import voyageai
 
+from canonicalize import Canonicalizer
+from fastpath import load_rows
+from local_reranker import LIST_COLUMNS, list_columns
+from voyage_metering import MeteredVoyage
+from multi_search import LocalVectorIndex, print_counters, search_many, vector_spec
+
 # ---------- Hardcoded config ----------
 MONGODB_URI    = ""
 VOYAGE_API_KEY = ""
@@ -20,6 +26,7 @@ RERANK_MODEL = "rerank-2"
 
 TOP_K = 10
 NUM_CANDIDATES = 1000
+USE_LOCAL_INDEX = False  # True: pull the vectors once and search in-process (exact, one matmul)
 ONLY_INDIVIDUALS = False
 OUT_CSV = "voyage_eval_result.csv"
 PRINT_SAMPLE_N = 0   # set to e.g. 3 if you want a small preview per query
@@ -85,8 +92,31 @@ def fmt_num(x, nd=4):
     except Exception:
         return str(x)
 
+PROJECT_STAGE = {
+    "$project": {
+        "_id": 0,
+        "code":           {"$ifNull": ["$code",           "$Code"]},
+        "displayName":    {"$ifNull": ["$displayName",    "$Display Name"]},
+        "classification": {"$ifNull": ["$classification", "$Classification"]},
+        "specialization": {"$ifNull": ["$specialization", "$Specialization"]},
+        "section":        {"$ifNull": ["$section",        "$Section"]},
+        "rerank_text": 1,
+        "score": {"$meta": "vectorSearchScore"}
+    }
+}
+
+def ann_candidates(coll, qvecs):
+    """Stage 1 (ANN) for all query vectors; one candidate list per vector."""
+    if USE_LOCAL_INDEX:
+        where = (lambda r: r.get("section") == "Individual") if ONLY_INDIVIDUALS else None
+        return LocalVectorIndex.from_collection(coll, VECTOR_FIELD).search_many(qvecs, TOP_K, where)
+    limit = TOP_K if not ONLY_INDIVIDUALS else max(TOP_K*4, 100)  # grab a bit more if we plan to filter
+    stages = [{"$match": {"section": "Individual"}}] if ONLY_INDIVIDUALS else []
+    specs = [vector_spec(INDEX_NAME, VECTOR_FIELD, qvec=v, limit=limit, num_candidates=NUM_CANDIDATES) for v in qvecs]
+    return search_many(coll, specs, stages=stages + [PROJECT_STAGE])
+
 def main():
-    vo = voyageai.Client(api_key=VOYAGE_API_KEY)
+    vo = MeteredVoyage(voyageai.Client(api_key=VOYAGE_API_KEY))
     mongo = MongoClient(MONGODB_URI)
     coll = mongo[DB][COLL]
 
@@ -95,52 +125,47 @@ def main():
         raise RuntimeError(f"No vectors found in '{DB}.{COLL}.{VECTOR_FIELD}'. "
                            f"Either backfill 2048-dim vectors or adjust VECTOR_FIELD.")
 
+    # Canonicalize (normalize + spell-correct) so variant spellings share one embed/search/rerank
+    canon = Canonicalizer.from_rows(load_rows(coll=coll))
+    keys = {q: canon.canonicalize(q) for q in TERMS}
+    unique_keys = list(dict.fromkeys(keys.values()))
+    print(f"{len(TERMS)} terms → {len(unique_keys)} canonical keys ({canon.corrections} spelling corrections)")
+
     # Pre-embed all queries once
     batch_size = 64
-    qvecs = {}
-    for batch in chunks(TERMS, batch_size):
+    qvecs = {}  # canonical key -> vector
+    for batch in chunks(unique_keys, batch_size):
         resp = vo.embed(texts=batch, model=EMBED_MODEL, input_type="query", output_dimension=DIM)
         for q, v in zip(batch, resp.embeddings):
             qvecs[q] = v
 
+    # Stage 1 for every canonical key up front: a handful of $unionWith-packed aggregates, not one per term
+    cands = dict(zip(unique_keys, ann_candidates(coll, [qvecs[k] for k in unique_keys])))
+    print_counters()
+
     frames = []
+    done = {}  # canonical key -> finished frame (variant spellings reuse it)
     for q in TERMS:
-        qvec = qvecs[q]
-
-        pipeline = [
-            {"$vectorSearch": {
-                "index": INDEX_NAME,
-                "path": VECTOR_FIELD,
-                "queryVector": qvec,
-                "numCandidates": NUM_CANDIDATES,
-                "limit": TOP_K if not ONLY_INDIVIDUALS else max(TOP_K*4, 100)
-            }},
-        ]
-        if ONLY_INDIVIDUALS:
-            pipeline.append({"$match": {"section": "Individual"}})
-
-        pipeline.append({
-            "$project": {
-                "_id": 0,
-                "code":           {"$ifNull": ["$code",           "$Code"]},
-                "displayName":    {"$ifNull": ["$displayName",    "$Display Name"]},
-                "classification": {"$ifNull": ["$classification", "$Classification"]},
-                "specialization": {"$ifNull": ["$specialization", "$Specialization"]},
-                "section":        {"$ifNull": ["$section",        "$Section"]},
-                "score": {"$meta": "vectorSearchScore"}
-            }
-        })
-
-        docs = list(coll.aggregate(pipeline, allowDiskUse=True))
+        key = keys[q]
+        if key in done:
+            df = done[key].copy()
+            df["query"] = q
+            frames.append(df)
+            continue
+
+        docs = cands[key]
         base_df = pd.DataFrame(docs)
+        if not base_df.empty:
+            base_df = base_df.assign(**list_columns(docs))   # full-list context for local_reranker.py fit --csv
 
         if base_df.empty:
             # placeholder so CSV shows queries with no hits
-            frames.append(pd.DataFrame([{
+            done[key] = pd.DataFrame([{
                 "query": q, "rank": None, "code": None, "displayName": None,
                 "classification": None, "specialization": None, "section": None,
                 "score": None, "rerank_score": None
-            }]))
+            }])
+            frames.append(done[key])
             if PRINT_SAMPLE_N:
                 print(f"\n====================  {q}  ====================")
                 print("No ANN hits (check index field/path/dim).")
@@ -148,8 +173,8 @@ def main():
 
         # Rerank with Voyage
         try:
-            docs_text = [row_text(r) for _, r in base_df.iterrows()]
-            rr = vo.rerank(query=q, documents=docs_text, model=RERANK_MODEL, top_k=min(TOP_K, len(docs_text)))
+            docs_text = [d.get("rerank_text") or row_text(d) for d in docs]   # precomputed by embedder.py
+            rr = vo.rerank(query=key, documents=docs_text, model=RERANK_MODEL, top_k=min(TOP_K, len(docs_text)))
             items = getattr(rr, "data", getattr(rr, "results", rr))
             pairs = []
             for i, it in enumerate(items):
@@ -178,11 +203,13 @@ def main():
                     f"{safe_str(r.get('code'), 10):<10}  {safe_str(r.get('displayName'), 40)}"
                 )
 
+        done[key] = df
         frames.append(df)
 
     out = pd.concat(frames, ignore_index=True)
     # keep consistent column order, write with blanks for NaNs
-    cols = ["query", "rank", "code", "displayName", "classification", "specialization", "section", "score", "rerank_score"]
+    cols = ["query", "rank", "code", "displayName", "classification", "specialization", "section", "score", "rerank_score",
+            *LIST_COLUMNS]
     for c in cols:
         if c not in out.columns:
             out[c] = None
@@ -190,6 +217,7 @@ def main():
     out.to_csv(OUT_CSV, index=False, na_rep="")
 
     print(f"\n✅ Wrote {len(out)} rows to {OUT_CSV}")
+    vo.print_summary()
 
 if __name__ == "__main__":
     main()
@@ -8,6 +8,7 @@
 # What it prints:
 # - Per-query results (top 3 hits with code/name/score)
 # - Hit@1 and Hit@3 over the eval set (simple heuristic match)
+# - Latency-control counters (query embeds are time-boxed and hedged, see latency_controls.py)
 
 from pymongo import MongoClient
 from functools import lru_cache
@@ -15,6 +16,15 @@ import voyageai
 import argparse
 import re
 
+from canonicalize import Canonicalizer, check_unchanged
+from fastpath import load_rows
+from semantic_cache import SemanticResultCache, search_index_version, print_cache_stats
+from embedding_versions import active_config
+from voyage_metering import MeteredVoyage
+from latency_controls import Degraded, guarded
+from latency_controls import print_counters as print_latency_counters
+from nucc_release import release_collection
+
 # ---------------- CONFIG (edit these two) ----------------
 MONGODB_URI   = ""         
 VOYAGE_API_KEY = ""
@@ -22,6 +32,11 @@ DB, COLL, INDEX = "NUCC", "taxonomy251", "nucc"
 MODEL, DIM = "voyage-3-large", 2048
 NUM_CANDIDATES = 2000
 TOP_K = 3
+CACHE_EPSILON = 0.97     # cosine needed to reuse a near-duplicate query's results
+CACHE_TTL = 600          # seconds
+USE_ACTIVE_VERSION = False  # True → model/dims/path/index follow embedding_versions' active pointer
+                           # (its vectors stay current only while embed_daemon.py runs)
+EMBED_TIMEOUT_MS = 5000     # query embedding gives up here; a duplicate fires at latency_controls' embed p95
 # ---------------------------------------------------------
 
 # Lightweight eval set: query → expected specialty tokens (case-insensitive)
@@ -37,19 +52,39 @@ EVAL_QUERIES = [
 
 client = MongoClient(MONGODB_URI)
 coll = client[DB][COLL]
-vo = voyageai.Client(api_key=VOYAGE_API_KEY)
+vo = MeteredVoyage(voyageai.Client(api_key=VOYAGE_API_KEY))
+result_cache = SemanticResultCache(DIM, epsilon=CACHE_EPSILON, ttl=CACHE_TTL)
+
+@lru_cache(maxsize=1)
+def get_canonicalizer() -> Canonicalizer:
+    return Canonicalizer.from_rows(load_rows(coll=coll))
+
+def search_config() -> dict:
+    if USE_ACTIVE_VERSION:
+        return active_config(client[DB])
+    return {"model": MODEL, "dim": DIM, "path": "embedding", "index": INDEX}
 
 @lru_cache(maxsize=512)
-def embed_query(text: str):
-    out = vo.embed(texts=[text], model=MODEL, input_type="query", output_dimension=DIM)
+def embed_query(text: str, model: str = MODEL, dim: int = DIM):
+    try:
+        out = guarded("embed", lambda: vo.embed(texts=[text], model=model, input_type="query", output_dimension=dim),
+                      timeout_ms=EMBED_TIMEOUT_MS)
+    except Degraded as d:
+        raise RuntimeError(f"Query embedding failed ({d.marker}); nothing to search with") from d.cause
     return out.embeddings[0]
 
 def vector_search(text: str, k=TOP_K, candidates=NUM_CANDIDATES, prefilter=None):
-    qvec = embed_query(text)
+    cfg = search_config()
+    qvec = embed_query(get_canonicalizer().canonicalize(text), cfg["model"], cfg["dim"])  # variants share a cache entry
+    scope = (k, candidates, repr(prefilter))
+    result_cache.ensure_version(cfg["model"], search_index_version(coll, cfg["index"]), cfg["dim"])
+    cached = result_cache.get(qvec, scope)
+    if cached is not None:
+        return cached
     stage = {
         "$vectorSearch": {
-            "index": INDEX,
-            "path": "embedding",
+            "index": cfg["index"],
+            "path": cfg["path"],
             "queryVector": qvec,
             "numCandidates": candidates,
             "limit": k
@@ -69,7 +104,9 @@ def vector_search(text: str, k=TOP_K, candidates=NUM_CANDIDATES, prefilter=None)
             "score": {"$meta":"vectorSearchScore"}
         }}
     ]
-    return list(coll.aggregate(pipeline))
+    hits = list(coll.aggregate(pipeline))
+    result_cache.put(qvec, hits, scope)
+    return hits
 
 def text_contains_any(hay: str, needles: list[str]) -> bool:
     if not hay: return False
@@ -88,7 +125,7 @@ def hit_for_doc(doc, expect_tokens):
 
 def print_hits(title, query, hits):
     print(f"\n[{title}]  '{query}'")
- if not hits:
+    if not hits:
         print("  (no results)")
         return
     for i, h in enumerate(hits, 1):
@@ -104,6 +141,7 @@ def run_eval():
     hit1 = 0
     hit3 = 0
     print("Running Voyage accuracy demo on NUCC taxonomy…")
+    check_unchanged(get_canonicalizer(), [item["q"] for item in EVAL_QUERIES])
     for item in EVAL_QUERIES:
         q = item["q"]
         exp = item["expect"]
@@ -117,15 +155,22 @@ def run_eval():
     print("\nSummary:")
     print(f"  Hit@1: {hit1}/{total}  ({hit1/total:.0%})")
     print(f"  Hit@3: {hit3}/{total}  ({hit3/total:.0%})")
+    print_cache_stats(result_cache)
+    print_latency_counters()
+    vo.print_summary()
 
 def run_free(query_text):
     hits = vector_search(query_text, k=TOP_K)
     print_hits("Ad-hoc", query_text, hits)
+    vo.print_summary()
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser(description="Voyage accuracy demo for NUCC taxonomy")
     ap.add_argument("--free", type=str, help="Run a single ad-hoc query instead of the eval set")
+    ap.add_argument("--release", type=str, help='Pin a NUCC release ("252", or "current")')
     args = ap.parse_args()
+    if args.release:
+        coll = release_collection(client[DB], args.release)
     if args.free:
         run_free(args.free)
     else:
@@ -15,6 +15,8 @@ from pymongo import MongoClient, UpdateOne
 import voyageai
 import re, html, sys
 
+from voyage_metering import MeteredVoyage
+
 # ---------- Hardcoded demo creds (as requested) ----------
 MONGODB_URI = ""
 DB_NAME     = "NUCC"
@@ -30,7 +32,7 @@ BATCH_SIZE          = 128
 # ---------- Connect ----------
 client = MongoClient(MONGODB_URI)
 coll   = client[DB_NAME][COLL_NAME]
-vo     = voyageai.Client(api_key=ATLAS_MODEL_API_KEY)
+vo     = MeteredVoyage(voyageai.Client(api_key=ATLAS_MODEL_API_KEY))
 
 # ---------- Helpers ----------
 def strip_markup(s: str) -> str:
@@ -123,6 +125,7 @@ def main():
         cur.close()
 
     print(f"Done. Processed {processed} docs.")
+    vo.print_summary()
 
 def flush_batch(batch: list, texts: list, ops: list):
     vectors = embed_texts(texts)
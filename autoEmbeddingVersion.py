@@ -8,14 +8,34 @@ and optional reranking (Voyage).
 Run:
   python nucc_eval_auto_rerank.py --retrieval_k 100 --final_k 10 --threshold 0.7
   python nucc_eval_auto_rerank.py --free "heart doctor" --no-rerank
+  python nucc_eval_auto_rerank.py --cascade                 # lite reranker prunes, full reranker orders
+  python nucc_eval_auto_rerank.py --sweep                   # latency / Hit@k per rerank configuration
+  python nucc_eval_auto_rerank.py --no-latency-controls     # no request budget / hedging / breaker
+  python nucc_eval_auto_rerank.py --local-rerank auto       # distilled local reranker when confident
 """
 
 import argparse
-from typing import List, Dict, Any
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from typing import List, Dict, Any, Optional
 
 from pymongo import MongoClient
+from pymongo.errors import ExecutionTimeout
 import voyageai
 
+from canonicalize import Canonicalizer, check_unchanged
+from fastpath import FastPathIndex, load_rows, print_stats
+from voyage_metering import MeteredVoyage
+from rerank_policy import RerankSkipPolicy, log_outcome
+from local_reranker import load_reranker
+from local_reranker import print_stats as print_local_stats
+from replay import percentile
+from embedder import build_rerank_text
+from latency_controls import Budget, Degraded, count_timeout, guarded, mark_degraded
+from latency_controls import print_counters as print_latency_counters
+from multi_search import min_score_stages, print_counters, search_many, vector_spec
+from nucc_release import release_collection
+
 # ---------------- CONFIG (hard-coded for demo) ----------------
 # Mongo: your Atlas collection must have a vector index configured for **auto-embeddings**
 # on the vector field given by VECTOR_PATH (often the same "embedding" field).
@@ -27,15 +47,58 @@ VECTOR_PATH  = "embedding"   # the vector field indexed by Atlas (auto-embedding
 
 # Reranker (optional). Keep Voyage key for rerank only.
 VOYAGE_API_KEY = ""
+VOYAGE_TIMEOUT_S = 5.0              # client-side cap; the per-stage deadlines in latency_controls are tighter
 USE_RERANK     = True
 RERANK_MODEL   = "rerank-2.5-lite"  # or "rerank-2.5" for max quality
 
+# Cascade rerank: each stage reranks the previous stage's survivors.
+# top_k=None → final_k; timeout_s=None → wait. A stage that times out keeps the previous order.
+CASCADE = False
+CASCADE_STAGES = [
+    {"model": "rerank-2.5-lite", "top_k": 20,   "timeout_s": 1.5},   # wide pool → short list
+    {"model": "rerank-2.5",      "top_k": None, "timeout_s": 2.0},   # short list → final order
+]
+# Configurations compared by --sweep (label, stages)
+SWEEP_CONFIGS = [
+    ("lite only",       [{"model": "rerank-2.5-lite", "top_k": None, "timeout_s": None}]),
+    ("full only",       [{"model": "rerank-2.5",      "top_k": None, "timeout_s": None}]),
+    ("lite→full @10",   [{"model": "rerank-2.5-lite", "top_k": 10,   "timeout_s": None},
+                         {"model": "rerank-2.5",      "top_k": None, "timeout_s": None}]),
+    ("lite→full @20",   [{"model": "rerank-2.5-lite", "top_k": 20,   "timeout_s": None},
+                         {"model": "rerank-2.5",      "top_k": None, "timeout_s": None}]),
+    ("lite→full @40",   [{"model": "rerank-2.5-lite", "top_k": 40,   "timeout_s": None},
+                         {"model": "rerank-2.5",      "top_k": None, "timeout_s": None}]),
+]
+
 # Defaults (can be overridden by CLI flags)
 RETRIEVAL_K   = 100          # candidates to feed the reranker
 FINAL_K       = 10           # what you keep/show
 THRESHOLD     = 0.70         # gate on vectorSearchScore (tune 0.6–0.8)
 NUM_CAND_MULT = 3            # numCandidates ≈ MULT * retrieval_k
 NUM_CAND_MAX  = 2000         # safety cap
+
+# Exact code / name / alias fast path (no embed, no $vectorSearch, no rerank on a hit)
+USE_FASTPATH      = True
+FASTPATH_SNAPSHOT = None     # e.g. "taxonomy_snapshot.jsonl"; None = build from the collection
+
+# Adaptive rerank: skip the reranker when the vector-score margin says ANN order is already confident
+ADAPTIVE_RERANK     = False
+RERANK_POLICY_PATH  = "rerank_policy.json"      # fitted by: python3 rerank_policy.py fit
+LOG_RERANK_OUTCOMES = True                      # append every rerank to rerank_outcomes.jsonl (training data)
+
+# Distilled local reranker (fitted by: python3 local_reranker.py fit). No model file → always Voyage.
+#   "replace"   → the local model orders every query, no Voyage call
+#   "prefilter" → the local model trims candidates to LOCAL_PREFILTER_K before Voyage
+#   "auto"      → local when its predicted top-1 margin is confident, otherwise Voyage
+# A degraded rerank (timeout / open breaker) falls back to the local order instead of ANN order.
+LOCAL_RERANK        = "off"
+LOCAL_RERANKER_PATH = "local_reranker.json"
+LOCAL_PREFILTER_K   = 20
+
+# Tail latency (latency_controls.py): request budget, maxTimeMS on $vectorSearch, hedged rerank,
+# circuit breaker → ANN order marked "degraded" instead of a slow or failed answer
+LATENCY_CONTROLS = True
+BATCH_SEARCH_MAX_TIME_MS = 10_000   # maxTimeMS per $unionWith-packed aggregate; on timeout, one query at a time
 # --------------------------------------------------------------
 
 # Eval set WITHOUT "ENT"
@@ -51,14 +114,61 @@ EVAL_QUERIES = [
 # ----- wiring -----
 client = MongoClient(MONGODB_URI)
 coll = client[DB][COLL]
-vo = voyageai.Client(api_key=VOYAGE_API_KEY)
+vo = MeteredVoyage(voyageai.Client(api_key=VOYAGE_API_KEY, timeout=VOYAGE_TIMEOUT_S))
+FAST_PATH = None  # built lazily on first query
+CANON = None      # built lazily on first query
+POLICY = None     # loaded lazily on first query
+LOCAL_RERANKER = False   # loaded lazily on first query (None = no model fitted)
+RERANK_POOL = ThreadPoolExecutor(max_workers=4)   # lets a cascade stage give up after timeout_s
 
 # ----- helpers -----
-def vector_candidates_auto(query_text: str, retrieval_k: int, num_candidates: int) -> List[Dict[str, Any]]:
+PROJECT_STAGE = {
+    "$project": {
+        "_id": 0,
+        "code":           {"$ifNull": ["$code",           "$Code"]},
+        "displayName":    {"$ifNull": ["$displayName",    "$Display Name"]},
+        "classification": {"$ifNull": ["$classification", "$Classification"]},
+        "specialization": {"$ifNull": ["$specialization", "$Specialization"]},
+        "rerank_text": 1,
+        "score": {"$meta":"vectorSearchScore"}
+    }
+}
+
+def get_canonicalizer() -> Canonicalizer:
+    global CANON
+    if CANON is None:
+        rows = load_rows(snapshot_path=FASTPATH_SNAPSHOT) if FASTPATH_SNAPSHOT else load_rows(coll=coll)
+        CANON = Canonicalizer.from_rows(rows)
+    return CANON
+
+def get_policy() -> RerankSkipPolicy:
+    global POLICY
+    if POLICY is None:
+        POLICY = RerankSkipPolicy.load(RERANK_POLICY_PATH)
+    return POLICY
+
+def get_local_reranker():
+    global LOCAL_RERANKER
+    if LOCAL_RERANKER is False:
+        LOCAL_RERANKER = load_reranker(LOCAL_RERANKER_PATH)
+    return LOCAL_RERANKER
+
+def get_fast_path() -> FastPathIndex:
+    global FAST_PATH
+    if FAST_PATH is None:
+        FAST_PATH = (FastPathIndex.from_snapshot(FASTPATH_SNAPSHOT) if FASTPATH_SNAPSHOT
+                     else FastPathIndex.from_collection(coll))
+    return FAST_PATH
+
+def vector_candidates_auto(query_text: str, retrieval_k: int, num_candidates: int,
+                           threshold: Optional[float] = None, budget: Optional[Budget] = None) -> List[Dict[str, Any]]:
     """
     Fetch retrieval_k candidates using Atlas **auto-embeddings**:
     - No client-side embedding
     - $vectorSearch uses "query": <raw text>
+    - threshold: vectorSearchScore gate applied in the pipeline (below-threshold docs never leave Atlas)
+    - budget: caps the aggregate with maxTimeMS; an ExecutionTimeout returns no candidates (counted as a
+      latency_controls timeout) instead of a slow answer
     """
     pipeline = [
         {
@@ -70,36 +180,60 @@ def vector_candidates_auto(query_text: str, retrieval_k: int, num_candidates: in
                 "limit": retrieval_k
             }
         },
-        {
-            "$project": {
-                "_id": 0,
-                "code":           {"$ifNull": ["$code",           "$Code"]},
-                "displayName":    {"$ifNull": ["$displayName",    "$Display Name"]},
-                "classification": {"$ifNull": ["$classification", "$Classification"]},
-                "specialization": {"$ifNull": ["$specialization", "$Specialization"]},
-                "score": {"$meta":"vectorSearchScore"}
-            }
-        }
+        PROJECT_STAGE,
+        *min_score_stages(threshold),
     ]
     # Make the first round-trip deliver all we asked for
-    return list(coll.aggregate(pipeline, batchSize=retrieval_k, allowDiskUse=False))
+    opts = {"maxTimeMS": budget.mongo_max_time_ms("search")} if budget is not None else {}
+    try:
+        return list(coll.aggregate(pipeline, batchSize=retrieval_k, allowDiskUse=False, **opts))
+    except ExecutionTimeout:
+        if budget is None:
+            raise
+        count_timeout()
+        return []
 
-def threshold_gate(docs: List[Dict[str, Any]], thr: float) -> List[Dict[str, Any]]:
-    return [d for d in docs if d.get("score", 0.0) >= thr]
+def gated_candidates_many(query_texts: List[str], retrieval_k: int, threshold: float) -> List[List[Dict[str, Any]]]:
+    """
+    gated_candidates() for many queries in a few $unionWith-packed aggregates (one list per query).
+    With latency controls each aggregate is capped at BATCH_SEARCH_MAX_TIME_MS; if one times out, every
+    query is fetched on its own under its own budget instead.
+    """
+    num_candidates = min(max(NUM_CAND_MULT * retrieval_k, 100), NUM_CAND_MAX)
+    specs = [vector_spec(INDEX, VECTOR_PATH, query=q, limit=retrieval_k, num_candidates=num_candidates)
+             for q in query_texts]
+    if not LATENCY_CONTROLS:
+        return search_many(coll, specs, stages=[PROJECT_STAGE, *min_score_stages(threshold)])
+    try:
+        return search_many(coll, specs, stages=[PROJECT_STAGE, *min_score_stages(threshold)],
+                           max_time_ms=BATCH_SEARCH_MAX_TIME_MS)
+    except ExecutionTimeout:
+        count_timeout()
+        return [gated_candidates(q, retrieval_k, threshold, Budget()) for q in query_texts]
 
-def rerank_with_voyage(query: str, docs: List[Dict[str, Any]], top_n: int) -> List[Dict[str, Any]]:
+def rerank_with_voyage(query: str, docs: List[Dict[str, Any]], top_n: int,
+                       model: str = None, timeout_s: Optional[float] = None,
+                       log: bool = True, budget: Optional[Budget] = None) -> List[Dict[str, Any]]:
     """
     Optional reranker using Voyage; rr.results items have .index and .relevance_score.
+    With timeout_s, raises concurrent.futures.TimeoutError if Voyage has not answered in time.
+    With budget, the call is guarded (deadline, hedge, a breaker per model) and raises latency_controls.Degraded;
+    timeout_s then replaces the rerank STAGE_MS, capped by what is left of the budget.
     """
     if not docs or top_n <= 0:
         return []
 
-    inputs = [
-        f"{d.get('classification','')} | {d.get('specialization','')} | "
-        f"{d.get('displayName','')} | {d.get('code','')}"
-        for d in docs
-    ]
-    rr = vo.rerank(query=query, documents=inputs, model=RERANK_MODEL, top_k=min(top_n, len(docs)))
+    inputs = [d.get("rerank_text") or build_rerank_text(d) for d in docs]   # precomputed by embedder.py
+    kwargs = dict(query=query, documents=inputs, model=model or RERANK_MODEL, top_k=min(top_n, len(docs)))
+    if budget is not None:
+        rr = guarded("rerank", lambda: vo.rerank(**kwargs), budget, name=f"rerank:{kwargs['model']}",
+                     timeout_ms=timeout_s * 1000 if timeout_s is not None else None)
+    elif timeout_s is None:
+        rr = vo.rerank(**kwargs)
+    else:
+        rr = RERANK_POOL.submit(vo.rerank, **kwargs).result(timeout=timeout_s)
+    if log and LOG_RERANK_OUTCOMES:
+        log_outcome(query, docs, rr.results)
 
     ranked: List[Dict[str, Any]] = []
     for r in rr.results:  # already sorted desc
@@ -107,9 +241,57 @@ def rerank_with_voyage(query: str, docs: List[Dict[str, Any]], top_n: int) -> Li
         s = r.relevance_score
         d = dict(docs[i])    # copy
         d["rerank_score"] = float(s)
+        d["rerank_model"] = kwargs["model"]
         ranked.append(d)
     return ranked[:top_n]
 
+def cascade_rerank(query: str, docs: List[Dict[str, Any]], top_n: int,
+                   stages: List[Dict[str, Any]] = None, budget: Optional[Budget] = None,
+                   log: bool = True) -> List[Dict[str, Any]]:
+    """
+    Run the rerank stages in order, each over the previous stage's survivors.
+    A timed-out stage is skipped (its input order is kept, truncated to its top_k) and marked.
+    With budget, each stage gets its own timeout_s (capped by what is left of the budget) and breaker.
+    log=False keeps the first stage out of the outcome log too.
+    """
+    stages = stages or CASCADE_STAGES
+    cur = docs
+    for i, st in enumerate(stages):
+        last = i == len(stages) - 1
+        k = top_n if last or not st.get("top_k") else max(st["top_k"], top_n)
+        try:
+            # Only the first stage sees candidates in ANN order → only it feeds the skip-policy log
+            cur = rerank_with_voyage(query, cur, k, model=st["model"], timeout_s=st.get("timeout_s"),
+                                     log=log and i == 0, budget=budget)
+        except FuturesTimeout:
+            cur = [dict(d, rerank_timeout=st["model"]) for d in cur[:k]]
+        except Degraded as d:
+            cur = mark_degraded(cur[:k], d)
+    return cur[:top_n]
+
+def rerank(query: str, docs: List[Dict[str, Any]], top_n: int, budget: Optional[Budget] = None) -> List[Dict[str, Any]]:
+    """
+    Degraded rerank (deadline, errors, open breaker) → ANN order (or the local model's), marked "degraded".
+    LOCAL_RERANK decides whether the local model answers, trims the candidates, or stays out of the way.
+    A prefiltered rerank is not logged: the trimmed list is neither the ANN candidates nor in ANN order.
+    """
+    local = get_local_reranker() if LOCAL_RERANK != "off" else None
+    scores = local.score(query, docs) if local is not None else None
+    log = True
+    if local is not None:
+        if LOCAL_RERANK == "replace" or (LOCAL_RERANK == "auto" and local.confident(scores)):
+            return local.rerank(query, docs, top_n, scores)
+        if LOCAL_RERANK == "prefilter":
+            docs, scores = local.prefilter(query, docs, max(LOCAL_PREFILTER_K, top_n), scores), None
+            log = False
+    try:
+        if CASCADE:
+            return cascade_rerank(query, docs, top_n, budget=budget, log=log)
+        return rerank_with_voyage(query, docs, top_n, log=log, budget=budget)
+    except Degraded as d:
+        fallback = local.rerank(query, docs, top_n, scores) if local is not None else docs[:top_n]
+        return mark_degraded(fallback, d)
+
 def text_contains_any(hay: str, needles: List[str]) -> bool:
     if not hay:
         return False
@@ -132,47 +314,140 @@ def print_hits(title: str, query: str, hits: List[Dict[str, Any]]) -> None:
         return
     for i, h in enumerate(hits, 1):
         rr = f" | rr:{h['rerank_score']:.3f}" if 'rerank_score' in h else ""
+        rr += f" | DEGRADED {','.join(h['degraded'])}" if h.get("degraded") else ""
         print(f"  {i:02d} | vs:{h.get('score', 0.0):.3f}{rr} | {h.get('code')} | "
               f"{h.get('classification')} / {h.get('specialization')} | {h.get('displayName')}")
 
 def vector_search_with_rerank(query_text: str,
                               retrieval_k: int = RETRIEVAL_K,
                               final_k: int = FINAL_K,
-                              threshold: float = THRESHOLD) -> List[Dict[str, Any]]:
-    # Scale numCandidates with retrieval_k
-    num_candidates = min(max(NUM_CAND_MULT * retrieval_k, 100), NUM_CAND_MAX)
+                              threshold: float = THRESHOLD,
+                              candidates: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """candidates: already-gated docs for this query (batched retrieval); None → fetch them here."""
+    # 0) Normalize + spell-correct, so variant spellings hit the same fast-path / cache keys
+    query_text = get_canonicalizer().canonicalize(query_text)
 
-    # 1) Retrieve candidates via auto-embeddings
-    docs = vector_candidates_auto(query_text, retrieval_k=retrieval_k, num_candidates=num_candidates)
+    # Exact code / name / alias → answer from memory, skip the network entirely
+    if USE_FASTPATH:
+        hits = get_fast_path().lookup(query_text, final_k)
+        if hits is not None:
+            return hits
+    return semantic_search(query_text, retrieval_k, final_k, threshold, candidates)
 
-    # 2) Threshold gate (on vectorSearchScore)
-    if threshold is not None:
-        docs = threshold_gate(docs, threshold)
+def semantic_search(query_text: str,
+                    retrieval_k: int = RETRIEVAL_K,
+                    final_k: int = FINAL_K,
+                    threshold: float = THRESHOLD,
+                    candidates: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """$vectorSearch + rerank for an already-canonicalized query (no fast path)."""
+    budget = Budget() if LATENCY_CONTROLS else None
+    docs = candidates if candidates is not None else gated_candidates(query_text, retrieval_k, threshold, budget)
 
-    # 3) Rerank → take top final_k (or just slice if rerank disabled)
+    # 3) Rerank → take top final_k (or just slice if rerank disabled / ANN order is confident)
     if USE_RERANK and docs:
-        return rerank_with_voyage(query_text, docs, top_n=final_k)
+        if ADAPTIVE_RERANK and get_policy().should_skip([d.get("score", 0.0) for d in docs]):
+            return [dict(d, rerank_skipped=True) for d in docs[:final_k]]
+        return rerank(query_text, docs, top_n=final_k, budget=budget)
     return docs[:final_k]
 
+def gated_candidates(query_text: str, retrieval_k: int, threshold: float,
+                     budget: Optional[Budget] = None) -> List[Dict[str, Any]]:
+    # Scale numCandidates with retrieval_k
+    num_candidates = min(max(NUM_CAND_MULT * retrieval_k, 100), NUM_CAND_MAX)
+
+    # 1) Retrieve candidates via auto-embeddings, 2) threshold gate (on vectorSearchScore) inside the pipeline
+    return vector_candidates_auto(query_text, retrieval_k=retrieval_k, num_candidates=num_candidates,
+                                  threshold=threshold, budget=budget)
+
 def run_eval(retrieval_k=RETRIEVAL_K, final_k=FINAL_K, threshold=THRESHOLD) -> None:
     total = len(EVAL_QUERIES)
     hit1 = hit3 = 0
+    skipped = base1 = base3 = 0   # adaptive rerank: skips, and Hit@k had we always reranked
+    degraded = fast = fast1 = 0   # fast = answered by the fast path, fast1 = of those, Hit@1
     print(f"Eval (AUTO): retrieval_k={retrieval_k}, final_k={final_k}, threshold={threshold}, "
           f"numCandidates≈{min(max(NUM_CAND_MULT*retrieval_k,100),NUM_CAND_MAX)}")
-    for item in EVAL_QUERIES:
+    check_unchanged(get_canonicalizer(), [item["q"] for item in EVAL_QUERIES])
+    qcs = [get_canonicalizer().canonicalize(item["q"]) for item in EVAL_QUERIES]
+    fast_hits = {qc: get_fast_path().lookup(qc, final_k) for qc in dict.fromkeys(qcs)} if USE_FASTPATH else {}
+    # Retrieve the remaining queries' candidates up front in a few round-trips
+    misses = [qc for qc in dict.fromkeys(qcs) if fast_hits.get(qc) is None]
+    prefetched = dict(zip(misses, gated_candidates_many(misses, retrieval_k, threshold)))
+    for item, qc in zip(EVAL_QUERIES, qcs):
         q, exp = item["q"], item["expect"]
-        hits = vector_search_with_rerank(q, retrieval_k, final_k, threshold)
+        if fast_hits.get(qc) is not None:
+            hits = fast_hits[qc]
+            fast += 1
+            fast1 += int(bool(hits) and hit_for_doc(hits[0], exp))
+        else:
+            hits = semantic_search(qc, retrieval_k, final_k, threshold, candidates=prefetched[qc])
         print_hits("Results", q, hits)
+        degraded += int(any(h.get("degraded") for h in hits))
         if hits:
             if hit_for_doc(hits[0], exp): hit1 += 1
             if any(hit_for_doc(h, exp) for h in hits[:3]): hit3 += 1
+        if ADAPTIVE_RERANK:
+            base = hits
+            if hits and hits[0].get("rerank_skipped"):
+                skipped += 1
+                base = rerank(qc, prefetched[qc], top_n=final_k)
+            if base:
+                if hit_for_doc(base[0], exp): base1 += 1
+                if any(hit_for_doc(h, exp) for h in base[:3]): base3 += 1
     print("\nSummary:")
     print(f"  Hit@1: {hit1}/{total}  ({hit1/total:.0%})")
     print(f"  Hit@3: {hit3}/{total}  ({hit3/total:.0%})")
+    if fast:
+        sem = f"; retrieval-only Hit@1: {hit1 - fast1}/{total - fast}" if fast < total else ""
+        print(f"  Answered by the fast path (not retrieval): {fast}/{total}, Hit@1 {fast1}/{fast}{sem}")
+    if ADAPTIVE_RERANK:
+        print(f"  Rerank skipped: {skipped}/{total} ({skipped/total:.0%})  "
+              f"ΔHit@1 vs always-rerank: {hit1 - base1:+d}  ΔHit@3: {hit3 - base3:+d}")
+    if LATENCY_CONTROLS:
+        print(f"  Degraded answers: {degraded}/{total}")
+        print_latency_counters()
+    if LOCAL_RERANK != "off" and get_local_reranker() is not None:
+        print_local_stats(get_local_reranker())
+    if FAST_PATH is not None:
+        print_stats(FAST_PATH)
+    print_counters()
+    vo.print_summary()
+
+def run_sweep(retrieval_k=RETRIEVAL_K, final_k=FINAL_K, threshold=THRESHOLD) -> None:
+    """
+    Same gated candidates for every configuration; only the rerank step is timed,
+    so the rows compare reranker latency / docs scored against Hit@1 / Hit@3.
+    Only the first configuration feeds the outcome log (one training row per query, not one per config).
+    """
+    qcs = [get_canonicalizer().canonicalize(item["q"]) for item in EVAL_QUERIES]
+    gated = gated_candidates_many(qcs, retrieval_k, threshold)
+    cands = [(qc, item["expect"], docs) for qc, item, docs in zip(qcs, EVAL_QUERIES, gated)]
+    total = len(cands)
+    print(f"Rerank sweep: {total} queries, retrieval_k={retrieval_k}, final_k={final_k}, threshold={threshold}")
+    print(f"  {'config':16} {'Hit@1':>6} {'Hit@3':>6} {'p50 ms':>8} {'p95 ms':>8} {'docs/q':>7} {'timeouts':>8}")
+    for c, (label, stages) in enumerate(SWEEP_CONFIGS):
+        hit1 = hit3 = timeouts = docs_scored = 0
+        ms = []
+        for qc, exp, docs in cands:
+            t0 = time.perf_counter()
+            hits = cascade_rerank(qc, docs, final_k, stages, log=c == 0) if docs else []
+            ms.append((time.perf_counter() - t0) * 1000)
+            n = len(docs)
+            for i, st in enumerate(stages):
+                docs_scored += n
+                if i < len(stages) - 1 and st.get("top_k"):
+                    n = min(n, max(st["top_k"], final_k))
+            timeouts += int(any("rerank_timeout" in h for h in hits))
+            if hits:
+                if hit_for_doc(hits[0], exp): hit1 += 1
+                if any(hit_for_doc(h, exp) for h in hits[:3]): hit3 += 1
+        print(f"  {label:16} {hit1/total:6.0%} {hit3/total:6.0%} {percentile(ms, 50):8.0f} "
+              f"{percentile(ms, 95):8.0f} {docs_scored/total:7.1f} {timeouts:8}")
+    vo.print_summary()
 
 def run_free(query_text: str, retrieval_k=RETRIEVAL_K, final_k=FINAL_K, threshold=THRESHOLD) -> None:
     hits = vector_search_with_rerank(query_text, retrieval_k, final_k, threshold)
     print_hits("Ad-hoc", query_text, hits)
+    vo.print_summary()
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser(description="NUCC demo (AUTO) with retrieval_k vs final_k + threshold + optional rerank")
@@ -181,12 +456,36 @@ if __name__ == "__main__":
     ap.add_argument("--final_k", type=int, default=FINAL_K)
     ap.add_argument("--threshold", type=float, default=THRESHOLD)
     ap.add_argument("--no-rerank", action="store_true")
+    ap.add_argument("--no-fastpath", action="store_true", help="Always take the semantic path")
+    ap.add_argument("--adaptive-rerank", action="store_true", help="Skip rerank when the ANN margin is confident")
+    ap.add_argument("--cascade", action="store_true", help="Rerank in stages (CASCADE_STAGES) instead of one model")
+    ap.add_argument("--sweep", action="store_true", help="Compare SWEEP_CONFIGS on the eval set")
+    ap.add_argument("--fastpath-snapshot", type=str, help="Build the fast path from a JSONL snapshot")
+    ap.add_argument("--release", type=str, help='Pin a NUCC release ("252", or "current")')
+    ap.add_argument("--no-latency-controls", action="store_true", help="No budget / hedging / circuit breaker")
+    ap.add_argument("--local-rerank", choices=["off", "replace", "prefilter", "auto"], default=LOCAL_RERANK,
+                    help="Use the distilled local reranker (local_reranker.py fit)")
     args = ap.parse_args()
 
     if args.no_rerank:
         USE_RERANK = False
+    if args.no_fastpath:
+        USE_FASTPATH = False
+    if args.adaptive_rerank:
+        ADAPTIVE_RERANK = True
+    if args.cascade:
+        CASCADE = True
+    if args.no_latency_controls:
+        LATENCY_CONTROLS = False
+    LOCAL_RERANK = args.local_rerank
+    if args.fastpath_snapshot:
+        FASTPATH_SNAPSHOT = args.fastpath_snapshot
+    if args.release:
+        coll = release_collection(client[DB], args.release)
 
-    if args.free:
+    if args.sweep:
+        run_sweep(args.retrieval_k, args.final_k, args.threshold)
+    elif args.free:
         run_free(args.free, args.retrieval_k, args.final_k, args.threshold)
     else:
         run_eval(args.retrieval_k, args.final_k, args.threshold)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# bench_query_paths.py — Atlas auto-embedding vs client-side query embedding, under load
+# - auto:   one round-trip; $vectorSearch.query (Atlas embeds the text with the index's model)
+# - client: vo.embed(input_type="query") → $vectorSearch.queryVector (two round-trips, embed is ours)
+# - Each (path, cache, concurrency) cell runs the same query set REPEATS times on a closed-loop pool
+#   and records end-to-end latency, per-stage latency (embed / search), throughput, errors and Hit@k
+# - cache=off: every request pays every stage. cache=on: one warm pass first, then
+#     auto   → result cache keyed by normalized text (the only thing a client can cache on this path)
+#     client → query-vector cache (text → vector) + semantic result cache (vector → hits)
+# - Query set: the built-in eval set, or a query log (replay.py format; entries with "expect" count for Hit@k)
+#
+# Run:
+#   python3 bench_query_paths.py
+#   python3 bench_query_paths.py --concurrency 1 8 32 --repeats 5 --cache off on
+#   python3 bench_query_paths.py --queries query_log.jsonl --paths client --out bench.csv
+#   python3 local_standins.py run --latency-ms 40 --auto-embed-ms 25 bench_query_paths.py   # offline
+
+import argparse
+import csv
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from pymongo import MongoClient
+import voyageai
+
+from replay import percentile, read_log
+from semantic_cache import SemanticResultCache
+from voyage_metering import MeteredVoyage
+
+# ---------------- CONFIG ----------------
+MONGODB_URI    = ""
+VOYAGE_API_KEY = ""
+
+DB, COLL = "NUCC", "taxonomy251"
+VECTOR_PATH  = "embedding"
+AUTO_INDEX   = "nucc"            # auto-embedding index ($vectorSearch.query)
+VECTOR_INDEX = "default"         # vector index queried with queryVector
+EMBED_MODEL, DIM = "voyage-3-large", 2048   # should match the auto-embedding index's model for a fair Hit@k
+
+TOP_K          = 10
+NUM_CANDIDATES = 200
+CONCURRENCY    = [1, 4, 16]
+REPEATS        = 3               # passes over the query set per cell
+PATHS          = ["auto", "client"]
+CACHE_MODES    = ["off", "on"]
+CACHE_EPSILON  = 0.97
+OUT_CSV        = "bench_query_paths.csv"
+# ----------------------------------------
+
+EVAL_QUERIES = [
+    {"q": "heart doctor",               "expect": ["cardiology", "cardiologist", "cardio"]},
+    {"q": "women's health doctor",      "expect": ["obstetrics & gynecology", "obgyn", "ob/gyn"]},
+    {"q": "kidney doctor",              "expect": ["nephrology", "nephrologist"]},
+    {"q": "skin doctor",                "expect": ["dermatology", "dermatologist"]},
+    {"q": "allergy shots",              "expect": ["allergy", "immunology"]},
+    {"q": "pediatric heart doctor",     "expect": ["pediatric", "pediatrics", "cardiology"]},
+    {"q": "ear nose throat",            "expect": ["otolaryngology"]},
+    {"q": "eye doctor",                 "expect": ["ophthalmology", "optometrist"]},
+]
+
+PROJECT_STAGE = {
+    "$project": {
+        "_id": 0,
+        "code":           {"$ifNull": ["$code",           "$Code"]},
+        "displayName":    {"$ifNull": ["$displayName",    "$Display Name"]},
+        "classification": {"$ifNull": ["$classification", "$Classification"]},
+        "specialization": {"$ifNull": ["$specialization", "$Specialization"]},
+        "score": {"$meta": "vectorSearchScore"}
+    }
+}
+
+def hit_for_doc(doc: Dict[str, Any], expect_tokens: List[str]) -> bool:
+    joined = " | ".join(doc.get(f) or "" for f in ("displayName", "classification", "specialization", "code")).lower()
+    return any(t.lower() in joined for t in expect_tokens)
+
+def norm_text(q: str) -> str:
+    return " ".join(q.lower().split())
+
+class QueryPaths:
+    """Both query paths against one collection, with the per-path caches used by cache=on."""
+    def __init__(self, coll, vo, top_k: int = TOP_K, num_candidates: int = NUM_CANDIDATES):
+        self.coll, self.vo = coll, vo
+        self.top_k, self.num_candidates = top_k, num_candidates
+        self.reset_caches()
+
+    def reset_caches(self) -> None:
+        self.text_results: Dict[str, List[Dict[str, Any]]] = {}
+        self.qvecs: Dict[str, List[float]] = {}
+        self.semantic = SemanticResultCache(DIM, epsilon=CACHE_EPSILON)
+        self._lock = threading.Lock()       # SemanticResultCache is not thread-safe
+
+    def _search(self, spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+        spec.update(path=VECTOR_PATH, numCandidates=self.num_candidates, limit=self.top_k)
+        return list(self.coll.aggregate([{"$vectorSearch": spec}, PROJECT_STAGE]))
+
+    def auto(self, q: str, cache: bool) -> Dict[str, Any]:
+        key = norm_text(q)
+        if cache and key in self.text_results:
+            return {"hits": self.text_results[key], "search_ms": 0.0, "cache": "result"}
+        t0 = time.perf_counter()
+        hits = self._search({"index": AUTO_INDEX, "query": q})
+        out = {"hits": hits, "search_ms": (time.perf_counter() - t0) * 1000, "cache": ""}
+        if cache:
+            self.text_results[key] = hits
+        return out
+
+    def client(self, q: str, cache: bool) -> Dict[str, Any]:
+        key = norm_text(q)
+        out: Dict[str, Any] = {"cache": ""}
+        qvec = self.qvecs.get(key) if cache else None
+        if qvec is None:
+            t0 = time.perf_counter()
+            qvec = self.vo.embed(texts=[q], model=EMBED_MODEL, input_type="query", output_dimension=DIM).embeddings[0]
+            out["embed_ms"] = (time.perf_counter() - t0) * 1000
+            if cache:
+                self.qvecs[key] = qvec
+        else:
+            out.update(embed_ms=0.0, cache="vector")
+        if cache:
+            with self._lock:
+                hits = self.semantic.get(qvec, self.top_k)
+            if hits is not None:
+                return dict(out, hits=hits, search_ms=0.0, cache="result")
+        t0 = time.perf_counter()
+        hits = self._search({"index": VECTOR_INDEX, "queryVector": list(qvec)})
+        out.update(hits=hits, search_ms=(time.perf_counter() - t0) * 1000)
+        if cache:
+            with self._lock:
+                self.semantic.put(qvec, hits, self.top_k)
+        return out
+
+def run_cell(paths: QueryPaths, path: str, cache: bool, concurrency: int,
+             queries: List[Dict[str, Any]], repeats: int) -> List[Dict[str, Any]]:
+    fn = paths.auto if path == "auto" else paths.client
+    paths.reset_caches()
+    if cache:
+        for item in queries:                # warm pass, not measured
+            fn(item["q"], True)
+    work = [item for _ in range(repeats) for item in queries]
+
+    def one(i: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        row = {"path": path, "cache": "on" if cache else "off", "concurrency": concurrency, "i": i, "q": item["q"]}
+        t0 = time.perf_counter()
+        try:
+            res = fn(item["q"], cache)
+        except Exception as ex:
+            row.update(ok=False, error=f"{type(ex).__name__}: {ex}"[:200])
+        else:
+            hits = res["hits"]
+            row.update(ok=True, error="", served_from=res["cache"], embed_ms=res.get("embed_ms"),
+                       search_ms=res["search_ms"], n_results=len(hits))
+            if item.get("expect"):
+                row["hit1"] = bool(hits) and hit_for_doc(hits[0], item["expect"])
+                row["hitk"] = any(hit_for_doc(h, item["expect"]) for h in hits)
+        row["e2e_ms"] = (time.perf_counter() - t0) * 1000
+        return row
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        rows = list(pool.map(one, range(len(work)), work))
+    wall = time.perf_counter() - t0
+    for r in rows:
+        r["cell_wall_s"] = wall
+    return rows
+
+def summarize_cell(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ok = [r for r in rows if r["ok"]]
+    e2e = [r["e2e_ms"] for r in ok]
+    emb = [r["embed_ms"] for r in ok if r.get("embed_ms") is not None]
+    sea = [r["search_ms"] for r in ok]
+    judged = [r for r in ok if "hit1" in r]
+    wall = rows[0]["cell_wall_s"] if rows else 0.0
+    return {
+        "n": len(rows), "errors": len(rows) - len(ok), "qps": len(rows) / wall if wall else 0.0,
+        "p50": percentile(e2e, 50), "p95": percentile(e2e, 95), "p99": percentile(e2e, 99),
+        "mean": statistics.fmean(e2e) if e2e else 0.0,
+        "embed_p50": percentile(emb, 50) if emb else None, "search_p50": percentile(sea, 50),
+        "cached": sum(1 for r in ok if r["served_from"]) / len(ok) if ok else 0.0,
+        "hit1": sum(r["hit1"] for r in judged) / len(judged) if judged else None,
+        "hitk": sum(r["hitk"] for r in judged) / len(judged) if judged else None,
+    }
+
+def print_table(cells: List[tuple]) -> None:
+    fmt = lambda x, nd=1: "-" if x is None else f"{x:.{nd}f}"
+    print(f"\n{'path':<7} {'cache':<5} {'conc':>4} {'n':>5} {'err':>4} {'QPS':>7} {'p50':>7} {'p95':>7} "
+          f"{'p99':>7} {'embed50':>8} {'search50':>8} {'cached':>6} {'Hit@1':>6} {f'Hit@{TOP_K}':>6}")
+    for (path, cache, conc), s in cells:
+        print(f"{path:<7} {cache:<5} {conc:>4} {s['n']:>5} {s['errors']:>4} {s['qps']:>7.1f} {s['p50']:>7.1f} "
+              f"{s['p95']:>7.1f} {s['p99']:>7.1f} {fmt(s['embed_p50']):>8} {s['search_p50']:>8.1f} "
+              f"{s['cached']:>6.0%} {fmt(s['hit1'], 2):>6} {fmt(s['hitk'], 2):>6}")
+
+def write_csv(rows: List[Dict[str, Any]], path: str) -> None:
+    cols = ["path", "cache", "concurrency", "i", "q", "ok", "error", "served_from", "e2e_ms", "embed_ms",
+            "search_ms", "n_results", "hit1", "hitk"]
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        w = csv.DictWriter(fh, fieldnames=cols, extrasaction="ignore")
+        w.writeheader()
+        for r in rows:
+            w.writerow({c: round(r[c], 3) if isinstance(r.get(c), float) else r.get(c) for c in cols})
+
+def load_queries(path: Optional[str]) -> List[Dict[str, Any]]:
+    if not path:
+        return EVAL_QUERIES
+    return [{"q": e["q"], "expect": e.get("expect")} for e in read_log(path)]
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark auto-embedding vs client-side query embedding")
+    ap.add_argument("--paths", nargs="+", choices=["auto", "client"], default=PATHS)
+    ap.add_argument("--cache", nargs="+", choices=["off", "on"], default=CACHE_MODES)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=CONCURRENCY)
+    ap.add_argument("--repeats", type=int, default=REPEATS)
+    ap.add_argument("--queries", help="Query log JSONL (replay.py format, optional 'expect' tokens)")
+    ap.add_argument("--k", type=int, default=TOP_K)
+    ap.add_argument("--num-candidates", type=int, default=NUM_CANDIDATES)
+    ap.add_argument("--out", default=OUT_CSV)
+    args = ap.parse_args()
+
+    TOP_K = args.k
+    client = MongoClient(MONGODB_URI)
+    vo = MeteredVoyage(voyageai.Client(api_key=VOYAGE_API_KEY))
+    paths = QueryPaths(client[DB][COLL], vo, args.k, args.num_candidates)
+    queries = load_queries(args.queries)
+    print(f"{len(queries)} queries × {args.repeats} repeats per cell; k={args.k}, "
+          f"numCandidates={args.num_candidates}, model={EMBED_MODEL}/{DIM}")
+
+    all_rows, cells = [], []
+    for path in args.paths:
+        for cache in args.cache:
+            for conc in args.concurrency:
+                rows = run_cell(paths, path, cache == "on", conc, queries, args.repeats)
+                s = summarize_cell(rows)
+                print(f"  {path:<6} cache={cache:<3} conc={conc:<3} p50={s['p50']:.1f}ms "
+                      f"p99={s['p99']:.1f}ms QPS={s['qps']:.1f} errors={s['errors']}")
+                all_rows += rows
+                cells.append(((path, cache, conc), s))
+
+    print_table(cells)
+    write_csv(all_rows, args.out)
+    print(f"\n✅ Wrote {len(all_rows)} rows to {args.out}")
+    vo.print_summary()
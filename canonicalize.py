@@ -0,0 +1,202 @@
+# canonicalize.py — Query canonicalization + spelling correction for NUCC searches
+# - Unicode (NFKC) + casefold + whitespace normalization
+# - Symmetric-delete (SymSpell-style) fuzzy correction against the taxonomy vocabulary
+#   plus a small lay-term vocabulary, so "migrane" / "pyschotherapy" / "shouler replacement "
+#   collapse to the same canonical key as their correct spellings
+# - Use the canonical key for embedding and for any embedding/result cache
+#
+# Usage:
+#   python3 canonicalize.py --snapshot taxonomy_snapshot.jsonl "migrane" "Pyschotherapy" "shouler replacement "
+
+import argparse
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastpath import load_rows
+
+# ---------------- CONFIG ----------------
+MAX_EDIT = 2          # longest edit distance indexed
+FIX_DIST = 1          # distance actually corrected: at 2, real terms collide (colonoscopy → colposcopy)
+FREQ_MARGIN = 3.0     # several terms at the best distance: the top one must be this much more frequent
+PREFIX_LEN = 7        # SymSpell prefix length (bounds the delete index size)
+MIN_WORD_LEN = 5      # never "correct" short tokens (cbt, hrt, iud, pcos, ...)
+# ----------------------------------------
+
+# Correctly spelled lay terms seen in production queries (taxonomy text rarely uses them)
+LAY_VOCAB = """
+abdominoplasty abnormalities abuse acne acupressure adhd alcohol alopecia anemia annual anxiety arthritis
+athletes back biopsy birth blood blurred bone botox bowel breast broken bronchitis burns canal cancer care
+cardiologist cataract cholesterol colposcopy cornea cosmetic counseling cranial cryotherapy dementia
+density dental dentofacial depression dermatomyositis devices diabetes dialysis disorder doctor echocardiogram
+eczema elbow emergency epilepsy exercise extraction fertility fertilization fibroids fitness foot gallstones
+gastroenteritis gastroenterologist genetic giving glasses hair head headache health healthcare hemorrhoids
+hepatitis hernia high hip home hormones hurt hyperhidrosis immunizations infertility injury insomnia
+internalist irritable kidney kids knee lice lipoma liposuction loss lung lymphatic mammogram management
+marriage marrow maternity medical melanoma menopause mental midwife migraine migraines moles mood obesity
+osteoporosis pain parkinson physical physician plan postpartum prenatal prescription pressure prostate
+prosthesis psoriasis psychotherapy pump rash rehabilitation removal renal replacement retina room root
+rosacea salpingectomy scoliosis screening severe shot shoulder sinusitis skin smear social speech sports
+stomach stones stress substance sudden surgery syndrome tachycardia tendinitis test therapy thoracic
+thyroidectomy tinnitus tongue tonsils tooth transplant treatment varicocelectomy vertigo vision vitro wart
+weight weightloss wrist
+""".split() + """
+allergy angioplasty apnea appendectomy arrhythmia asthma audiology bariatric bunion bypass cardiac carpal
+cataracts cesarean chemotherapy chiropractor circumcision colonoscopy concussion contraception dermatitis
+diabetic dizziness endometriosis endoscopy fracture glaucoma gout hearing hypertension hysterectomy
+incontinence infusion inhaler lasik lupus mammography mastectomy neuropathy orthodontics pacemaker
+pediatrician pneumonia radiation sciatica seizure sleep sprain thyroid tunnel ulcer ultrasound
+vaccination vasectomy
+""".split()
+
+# Correctly spelled words / queries the corrector must leave alone (checked by check_unchanged)
+KNOWN_GOOD = ["colonoscopy", "diabetic", "allergy shots", "kidneys", "doctors", "pains", "sleep apnea",
+              "heart doctor", "endoscopy", "hypertension"]
+
+_WORD_RE = re.compile(r"[^\W\d_]+")
+
+def normalize_text(s: str) -> str:
+    """NFKC + casefold + collapse whitespace. Keeps in-word punctuation (x-ray, women's, ob/gyn)."""
+    if not s:
+        return ""
+    s = unicodedata.normalize("NFKC", s).casefold()
+    return " ".join(s.split())
+
+def damerau_levenshtein(a: str, b: str, max_dist: int) -> int:
+    """Optimal-string-alignment distance; returns max_dist + 1 as soon as it is exceeded."""
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = cur[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+            row_min = min(row_min, cur[j])
+        if row_min > max_dist:
+            return max_dist + 1
+        prev2, prev = prev, cur
+    return prev[len(b)]
+
+class SymSpell:
+    """Symmetric-delete spelling index: precomputed deletes → candidate words, verified by edit distance."""
+
+    def __init__(self, max_edit: int = MAX_EDIT, prefix_len: int = PREFIX_LEN):
+        self.max_edit = max_edit
+        self.prefix_len = prefix_len
+        self.words: Dict[str, int] = {}
+        self.deletes: Dict[str, List[str]] = {}
+
+    def _edits(self, word: str, dist: int) -> set:
+        out, frontier = {word}, {word}
+        for _ in range(dist):
+            nxt = set()
+            for w in frontier:
+                for i in range(len(w)):
+                    nxt.add(w[:i] + w[i + 1:])
+            out |= nxt
+            frontier = nxt
+        return out
+
+    def add_word(self, word: str, count: int = 1) -> None:
+        if word in self.words:
+            self.words[word] += count
+            return
+        self.words[word] = count
+        for d in self._edits(word[:self.prefix_len], self.max_edit):
+            self.deletes.setdefault(d, []).append(word)
+
+    def lookup(self, word: str, max_dist: Optional[int] = None,
+               margin: float = 1.0) -> Optional[Tuple[str, int]]:
+        """
+        Best (term, distance): smallest distance first, then most frequent term. With margin > 1, a tie
+        at the best distance only resolves if the top term is margin times as frequent as the runner-up.
+        """
+        max_dist = self.max_edit if max_dist is None else min(max_dist, self.max_edit)
+        if word in self.words:
+            return word, 0
+        hits: Dict[str, int] = {}
+        for d in self._edits(word[:self.prefix_len], max_dist):
+            for cand in self.deletes.get(d, ()):
+                if cand not in hits:
+                    hits[cand] = damerau_levenshtein(word, cand, max_dist)
+        ranked = sorted(((dist, -self.words[c], c) for c, dist in hits.items() if dist <= max_dist))
+        if not ranked:
+            return None
+        dist, neg_count, term = ranked[0]
+        if len(ranked) > 1 and ranked[1][0] == dist and -ranked[1][1] * margin > -neg_count:
+            return None                          # ambiguous: leave the word alone
+        return term, dist
+
+class Canonicalizer:
+    """
+    canonicalize(text) → canonical key (normalized + spelling-corrected).
+    Results are memoized, so repeated queries cost one dict lookup.
+    """
+
+    def __init__(self, vocab: Dict[str, int], min_word_len: int = MIN_WORD_LEN):
+        self.min_word_len = min_word_len
+        self.index = SymSpell()
+        for w, n in vocab.items():
+            self.index.add_word(w, n)
+        self._memo: Dict[str, str] = {}
+        self.corrections = 0
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict], extra: Iterable[str] = LAY_VOCAB) -> "Canonicalizer":
+        vocab: Counter = Counter()
+        for r in rows:
+            for f in ("displayName", "classification", "specialization"):
+                vocab.update(_WORD_RE.findall(normalize_text(r.get(f) or "")))
+        for w in extra:
+            vocab[w] += 1
+        return cls(dict(vocab))
+
+    def _known_plural(self, w: str) -> bool:
+        """doctors / kidneys / allergies / sinuses: a known word + s / es (y → ies) is not a typo."""
+        words = self.index.words
+        return ((w.endswith("s") and w[:-1] in words) or (w.endswith("es") and w[:-2] in words)
+                or (w.endswith("ies") and w[:-3] + "y" in words))
+
+    def _fix_word(self, m: "re.Match") -> str:
+        w = m.group(0)
+        if len(w) < self.min_word_len or w in self.index.words or self._known_plural(w):
+            return w
+        hit = self.index.lookup(w, FIX_DIST, FREQ_MARGIN)
+        if hit is None:
+            return w
+        self.corrections += 1
+        return hit[0]
+
+    def canonicalize(self, text: str) -> str:
+        key = self._memo.get(text)
+        if key is None:
+            key = _WORD_RE.sub(self._fix_word, normalize_text(text))
+            self._memo[text] = key
+        return key
+
+def check_unchanged(canon: Canonicalizer, terms: Iterable[str]) -> None:
+    """Correctly spelled queries (eval sets + KNOWN_GOOD) must canonicalize to themselves; exit naming any that do not."""
+    bad = {t: k for t in [*terms, *KNOWN_GOOD] if (k := canon.canonicalize(t)) != normalize_text(t)}
+    if bad:
+        raise SystemExit("Canonicalizer rewrites correctly spelled queries: "
+                         + ", ".join(f"{t!r} → {k!r}" for t, k in bad.items()))
+
+def group_by_canonical(terms: Iterable[str], canon: Canonicalizer) -> Dict[str, str]:
+    """term -> canonical key (insertion-ordered); use set(values) for the unique embed list."""
+    return {t: canon.canonicalize(t) for t in terms}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Canonicalize / spell-correct NUCC queries")
+    ap.add_argument("queries", nargs="+")
+    ap.add_argument("--snapshot", type=str, help="Taxonomy JSONL snapshot for the vocabulary")
+    args = ap.parse_args()
+
+    canon = Canonicalizer.from_rows(load_rows(snapshot_path=args.snapshot) if args.snapshot else [])
+    for q in args.queries:
+        print(f"{q!r:32} → {canon.canonicalize(q)!r}")
@@ -8,6 +8,11 @@ from pymongo import MongoClient
 import voyageai
 from itertools import islice
 
+from canonicalize import Canonicalizer
+from fastpath import load_rows
+from voyage_metering import MeteredVoyage
+from multi_search import LocalVectorIndex, print_counters, search_many, vector_spec
+
 # ---------- Hardcoded config (from your snippets) ----------
 MONGODB_URI    = ""
 VOYAGE_API_KEY = ""
@@ -18,6 +23,7 @@ MODEL, DIM = "voyage-3.5", 1024
 TOP_K = 10
 NUM_CANDIDATES = 500  # ~50x TOP_K is a good starting point for recall/latency
 OUT_CSV = "voyage_eval_result.csv"
+USE_LOCAL_INDEX = False  # True: pull the vectors once and search in-process (exact, one matmul)
 # -----------------------------------------------------------
 
 # Customer-provided terms
@@ -66,14 +72,20 @@ def chunks(lst, n):
 
 def main():
     # Clients
-    vo = voyageai.Client(api_key=VOYAGE_API_KEY)
+    vo = MeteredVoyage(voyageai.Client(api_key=VOYAGE_API_KEY))
     mongo = MongoClient(MONGODB_URI)
     coll = mongo[DB][COLL]
 
+    # 0) Canonicalize (normalize + spell-correct) so variant spellings share one key
+    canon = Canonicalizer.from_rows(load_rows(coll=coll))
+    keys = {q: canon.canonicalize(q) for q in TERMS}
+    unique_keys = list(dict.fromkeys(keys.values()))
+    print(f"{len(TERMS)} terms → {len(unique_keys)} canonical keys ({canon.corrections} spelling corrections)")
+
     # 1) Embed in batches to minimize RPM pressure
     batch_size = 64
-    embeddings = {}  # query -> vector
-    for batch in chunks(TERMS, batch_size):
+    embeddings = {}  # canonical key -> vector
+    for batch in chunks(unique_keys, batch_size):
         resp = vo.embed(
             texts=batch,
             model=MODEL,
@@ -83,33 +95,13 @@ def main():
         for q, vec in zip(batch, resp.embeddings):
             embeddings[q] = vec
 
-    # 2) For each query, run Vector Search and collect top-10 rows
+    # 2) Vector Search every canonical key in a handful of round-trips, collect top-10 rows
+    hits = search_all(coll, [embeddings[k] for k in unique_keys])
+    results = dict(zip(unique_keys, hits))  # canonical key -> docs
+    print_counters()
     frames = []
     for q in TERMS:
-        qvec = embeddings[q]
-        pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": INDEX,
-                    "path": "embedding",
-                    "queryVector": qvec,
-                    "numCandidates": NUM_CANDIDATES,
-                    "limit": TOP_K
-                }
-            },
-            {
-                "$project": {
-                    "_id": 0,
-                    "code":           {"$ifNull": ["$code",           "$Code"]},
-                    "displayName":    {"$ifNull": ["$displayName",    "$Display Name"]},
-                    "classification": {"$ifNull": ["$classification", "$Classification"]},
-                    "specialization": {"$ifNull": ["$specialization", "$Specialization"]},
-                    "section":        {"$ifNull": ["$section",        "$Section"]},
-                    "score": {"$meta": "vectorSearchScore"}
-                }
-            }
-        ]
-        docs = list(coll.aggregate(pipeline, allowDiskUse=True))
+        docs = results[keys[q]]
         df = pd.DataFrame(docs)
         df.insert(0, "query", q)
         # Ensure stable columns even if empty
@@ -126,6 +118,26 @@ def main():
     out = pd.concat(frames, ignore_index=True)
     out.to_csv(OUT_CSV, index=False)
     print(f"✅ Wrote {len(out)} rows to {OUT_CSV}")
+    vo.print_summary()
+
+PROJECT_STAGE = {
+    "$project": {
+        "_id": 0,
+        "code":           {"$ifNull": ["$code",           "$Code"]},
+        "displayName":    {"$ifNull": ["$displayName",    "$Display Name"]},
+        "classification": {"$ifNull": ["$classification", "$Classification"]},
+        "specialization": {"$ifNull": ["$specialization", "$Specialization"]},
+        "section":        {"$ifNull": ["$section",        "$Section"]},
+        "score": {"$meta": "vectorSearchScore"}
+    }
+}
+
+def search_all(coll, qvecs):
+    """One result list per query vector; $unionWith-packed aggregates, or one matmul locally."""
+    if USE_LOCAL_INDEX:
+        return LocalVectorIndex.from_collection(coll, "embedding").search_many(qvecs, TOP_K)
+    specs = [vector_spec(INDEX, "embedding", qvec=v, limit=TOP_K, num_candidates=NUM_CANDIDATES) for v in qvecs]
+    return search_many(coll, specs, stages=[PROJECT_STAGE])
 
 if __name__ == "__main__":
     main()
@@ -4,12 +4,23 @@
 # - First-stage: $vectorSearch to get candidates
 # - Second-stage: Voyage reranker to reorder those candidates
 # - Output: voyage_eval_result.csv with rank, score, rerank_score
+# - Embed / rerank / search calls are time-boxed (latency_controls.py): a slow or failing rerank keeps
+#   ANN order and its rows are marked in the "degraded" column. Nothing here is hedged: these are batch
+#   calls (64 texts, a full candidate list), and a duplicate would double their tokens
 
 import pandas as pd
 from pymongo import MongoClient
 import voyageai
 from itertools import islice
 
+from canonicalize import Canonicalizer
+from fastpath import load_rows
+from local_reranker import LIST_COLUMNS, list_columns
+from voyage_metering import MeteredVoyage
+from latency_controls import Budget, Degraded, guarded
+from latency_controls import print_counters as print_latency_counters
+from multi_search import LocalVectorIndex, print_counters, search_many, vector_spec
+
 # ---------- Hardcoded config (as provided) ----------
 MONGODB_URI    = ""
 VOYAGE_API_KEY = ""  # replace if rotated
@@ -17,10 +28,14 @@ VOYAGE_API_KEY = ""  # replace if rotated
 DB, COLL, INDEX = "NUCC", "taxonomy251", "vector_idx"
 EMBED_MODEL, DIM = "voyage-3.5", 1024
 RERANK_MODEL = "rerank-2"              # or 'rerank-1' / 'rerank-2-lite' if you prefer
+VOYAGE_TIMEOUT_S   = 5.0               # client-side cap on any Voyage call
+EMBED_TIMEOUT_MS   = 5000              # per query-embedding batch (not hedged)
+SEARCH_MAX_TIME_MS = 10000             # maxTimeMS per $unionWith-packed aggregate
 
 TOP_K = 10
 NUM_CANDIDATES = 1000                  # candidate pool before reranking
 OUT_CSV = "voyage_eval_result.csv"
+USE_LOCAL_INDEX = False                # True: pull the vectors once and search in-process (exact, one matmul)
 ONLY_INDIVIDUALS = False               # set True to drop Clinic/Center noise
 # ----------------------------------------------------
 
@@ -66,65 +81,91 @@ def row_text(row):
     parts = [row.get("displayName"), row.get("classification"), row.get("specialization"), row.get("code")]
     return " | ".join([p for p in parts if p])
 
+PROJECT_STAGE = {
+    "$project": {
+        "_id": 0,
+        "code":           {"$ifNull": ["$code",           "$Code"]},
+        "displayName":    {"$ifNull": ["$displayName",    "$Display Name"]},
+        "classification": {"$ifNull": ["$classification", "$Classification"]},
+        "specialization": {"$ifNull": ["$specialization", "$Specialization"]},
+        "section":        {"$ifNull": ["$section",        "$Section"]},
+        "rerank_text": 1,
+        "score": {"$meta": "vectorSearchScore"}
+    }
+}
+
+def ann_candidates(coll, qvecs):
+    """Stage 1 (ANN) for all query vectors; one candidate list per vector."""
+    if USE_LOCAL_INDEX:
+        where = (lambda r: r.get("section") == "Individual") if ONLY_INDIVIDUALS else None
+        return LocalVectorIndex.from_collection(coll, "embedding").search_many(qvecs, TOP_K, where)
+    limit = TOP_K if not ONLY_INDIVIDUALS else max(TOP_K*4, 100)  # grab a bit more if we plan to filter
+    stages = [{"$match": {"section": "Individual"}}] if ONLY_INDIVIDUALS else []
+    specs = [vector_spec(INDEX, "embedding", qvec=v, limit=limit, num_candidates=NUM_CANDIDATES) for v in qvecs]
+    return search_many(coll, specs, stages=stages + [PROJECT_STAGE], max_time_ms=SEARCH_MAX_TIME_MS)
+
 def main():
-    vo = voyageai.Client(api_key=VOYAGE_API_KEY)
+    vo = MeteredVoyage(voyageai.Client(api_key=VOYAGE_API_KEY, timeout=VOYAGE_TIMEOUT_S))
     mongo = MongoClient(MONGODB_URI)
     coll = mongo[DB][COLL]
 
+    # Canonicalize (normalize + spell-correct) so variant spellings share one embed/search/rerank
+    canon = Canonicalizer.from_rows(load_rows(coll=coll))
+    keys = {q: canon.canonicalize(q) for q in TERMS}
+    unique_keys = list(dict.fromkeys(keys.values()))
+    print(f"{len(TERMS)} terms → {len(unique_keys)} canonical keys ({canon.corrections} spelling corrections)")
+
     # 1) Pre-embed queries in batches (to be gentle on RPM/TPM)
     batch_size = 64
-    qvecs = {}
-    for batch in chunks(TERMS, batch_size):
-        resp = vo.embed(texts=batch, model=EMBED_MODEL, input_type="query", output_dimension=DIM)
+    qvecs = {}  # canonical key -> vector
+    for batch in chunks(unique_keys, batch_size):
+        try:
+            resp = guarded("embed", lambda b=batch: vo.embed(texts=b, model=EMBED_MODEL, input_type="query",
+                                                            output_dimension=DIM),
+                           timeout_ms=EMBED_TIMEOUT_MS, hedge_after_ms=None)
+        except Degraded as d:
+            raise RuntimeError(f"Query embedding failed ({d.marker}); nothing to search with") from d.cause
         for q, v in zip(batch, resp.embeddings):
             qvecs[q] = v
 
+    # Stage 1 for every canonical key up front: a handful of $unionWith-packed aggregates, not one per term
+    cands = dict(zip(unique_keys, ann_candidates(coll, [qvecs[k] for k in unique_keys])))
+    print_counters()
+
     all_frames = []
 
+    done = {}  # canonical key -> finished frame (variant spellings reuse it)
+    degraded = 0
     for q in TERMS:
-        qvec = qvecs[q]
+        key = keys[q]
+        if key in done:
+            df = done[key].copy()
+            df["query"] = q
+            all_frames.append(df)
+            continue
 
         # ----- Stage 1: ANN candidate retrieval -----
-        pipeline = [
-            {"$vectorSearch": {
-                "index": INDEX,
-                "path": "embedding",
-                "queryVector": qvec,
-                "numCandidates": NUM_CANDIDATES,
-                "limit": TOP_K if not ONLY_INDIVIDUALS else max(TOP_K*4, 100)  # grab a bit more if we plan to filter
-            }},
-        ]
-        if ONLY_INDIVIDUALS:
-            pipeline.append({"$match": {"section": "Individual"}})
-
-        pipeline.append({
-            "$project": {
-                "_id": 0,
-                "code":           {"$ifNull": ["$code",           "$Code"]},
-                "displayName":    {"$ifNull": ["$displayName",    "$Display Name"]},
-                "classification": {"$ifNull": ["$classification", "$Classification"]},
-                "specialization": {"$ifNull": ["$specialization", "$Specialization"]},
-                "section":        {"$ifNull": ["$section",        "$Section"]},
-                "score": {"$meta": "vectorSearchScore"}
-            }
-        })
-
-        docs = list(coll.aggregate(pipeline, allowDiskUse=True))
+        docs = cands[key]
         base_df = pd.DataFrame(docs)
+        if not base_df.empty:
+            base_df = base_df.assign(**list_columns(docs))   # full-list context for local_reranker.py fit --csv
 
         # If nothing came back, emit a placeholder row and continue
         if base_df.empty:
-            all_frames.append(pd.DataFrame([{
+            done[key] = pd.DataFrame([{
                 "query": q, "code": None, "displayName": None,
                 "classification": None, "specialization": None, "section": None,
                 "score": None, "rerank_score": None, "rank": None
-            }]))
+            }])
+            all_frames.append(done[key])
             continue
 
         # ----- Stage 2: Cross-encoder reranking (Voyage) -----
         try:
-            docs_text = [row_text(r) for _, r in base_df.iterrows()]
-            rr = vo.rerank(query=q, documents=docs_text, model=RERANK_MODEL, top_k=min(TOP_K, len(docs_text)))
+            docs_text = [d.get("rerank_text") or row_text(d) for d in docs]   # precomputed by embedder.py
+            rr = guarded("rerank", lambda k=key, t=docs_text: vo.rerank(query=k, documents=t, model=RERANK_MODEL,
+                                                                    top_k=min(TOP_K, len(t))),
+                         Budget(), hedge_after_ms=None)
             # Be resilient to response shapes: prefer .data, else .results, else iterable
             items = getattr(rr, "data", getattr(rr, "results", rr))
             pairs = []
@@ -138,24 +179,30 @@ def main():
             df = base_df.iloc[order].copy()
             df.insert(0, "query", q)
             df["rerank_score"] = rerank_scores
-        except Exception as e:
-            # If rerank fails, keep ANN order
+        except Degraded as d:
+            # Rerank timed out / failed / breaker open: keep ANN order and say so
             df = base_df.copy()
             df.insert(0, "query", q)
             df["rerank_score"] = None
+            df["degraded"] = d.marker
+            degraded += 1
 
         # Add rank and enforce column order
         df["rank"] = range(1, len(df) + 1)
-        cols = ["query", "rank", "code", "displayName", "classification", "specialization", "section", "score", "rerank_score"]
+        cols = ["query", "rank", "code", "displayName", "classification", "specialization", "section", "score", "rerank_score",
+                "degraded", *LIST_COLUMNS]
         for c in cols:
             if c not in df.columns: df[c] = None
         df = df[cols]
 
+        done[key] = df
         all_frames.append(df)
 
     out = pd.concat(all_frames, ignore_index=True)
     out.to_csv(OUT_CSV, index=False)
-    print(f"✅ Wrote {len(out)} rows to {OUT_CSV}")
+    print(f"✅ Wrote {len(out)} rows to {OUT_CSV}  ({degraded} terms degraded to ANN order)")
+    print_latency_counters()
+    vo.print_summary()
 
 if __name__ == "__main__":
     main()
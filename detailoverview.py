@@ -1,7 +1,15 @@
-# detailoverview.py — Atlas Vector Search sanity checker (no env vars)
+
+# detailoverview.py — Atlas Vector Search sanity checker + profiler (no env vars)
+#
+# Run:
+#   python3 detailoverview.py "allergy immunology"                 # sanity checks + top-K results
+#   python3 detailoverview.py "allergy immunology" --profile       # + explain, stage timings, numCandidates curve,
+#                                                                   #   payload bytes, misconfiguration report
+#   python3 detailoverview.py "heart doctor" --profile --runs 20 --candidates 50,100,500,1000
 
 from pymongo import MongoClient
-import voyageai, sys, json, traceback
+import voyageai, sys, json, traceback, argparse, statistics, time
+import bson
 
 # ----- Atlas connection (paste your working FindCare SRV here) -----
 MONGODB_URI = ""
@@ -13,30 +21,175 @@ MODEL, DIM = "voyage-3.5", 1024           # must match stored vectors & index nu
 NUM_CANDIDATES = 2000
 TOP_K = 10
 
+# ----- Profiler settings -----
+VECTOR_PATH = "embedding"
+FILTER_FIELDS = ["code", "classification", "specialization", "section"]   # filters the scripts rely on
+PROFILE_RUNS = 10
+CANDIDATE_CURVE = [TOP_K, 50, 100, 250, 500, 1000, 2000]
+MAX_NUM_CANDIDATES = 10000                # Atlas limit
+
+PROJECT_STAGE = {
+    "$project": {
+        "_id": 0,
+        "code": {"$ifNull": ["$code", "$Code"]},
+        "displayName": {"$ifNull": ["$displayName", "$Display Name"]},
+        "classification": {"$ifNull": ["$classification", "$Classification"]},
+        "specialization": {"$ifNull": ["$specialization", "$Specialization"]},
+        "section": {"$ifNull": ["$section", "$Section"]},
+        "score": {"$meta": "vectorSearchScore"}
+    }
+}
+
+def vs_stage(qvec, num_candidates=NUM_CANDIDATES, limit=TOP_K, exact=False):
+    stage = {"index": INDEX, "path": VECTOR_PATH, "queryVector": qvec, "limit": limit}
+    if exact:
+        stage["exact"] = True           # ENN ground truth for recall
+    else:
+        stage["numCandidates"] = num_candidates
+    return {"$vectorSearch": stage}
+
+def timed(fn, runs):
+    out, ms = None, []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = fn()
+        ms.append((time.perf_counter() - t0) * 1000)
+    return out, ms
+
+def pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))]
+
+def fmt_ms(xs):
+    return f"p50 {statistics.median(xs):7.1f}ms  p95 {pct(xs, 95):7.1f}ms  min {min(xs):7.1f}ms"
+
+# ----- profiler sections -----
+def report_index(db, coll, idxs, sizes):
+    """Index status/size + misconfiguration checks. Returns list of warnings."""
+    warnings = []
+    vs = [i for i in idxs if i.get("name") == INDEX]
+    if not vs:
+        return [f"Search index '{INDEX}' not found on {DB}.{COLL}"]
+    idx = vs[0]
+    fields = (idx.get("latestDefinition") or {}).get("fields", [])
+    vec_fields = [f for f in fields if f.get("type") == "vector"]
+    filt = {f.get("path") for f in fields if f.get("type") == "filter"}
+    print(f"\n== Index '{INDEX}' ==")
+    print(f"  type={idx.get('type')} status={idx.get('status')} queryable={idx.get('queryable')}")
+    for f in vec_fields:
+        print(f"  vector path={f.get('path')} dims={f.get('numDimensions')} similarity={f.get('similarity')}")
+    print(f"  filters: {sorted(filt) or '(none)'}")
+
+    stats = db.command("collStats", COLL)
+    n = stats.get("count", 0)
+    print(f"  collection: {n} docs, data {stats.get('size', 0) / 1e6:.2f}MB, "
+          f"avg doc {stats.get('avgObjSize', 0):.0f}B, btree indexes {stats.get('totalIndexSize', 0) / 1e6:.2f}MB")
+
+    if idx.get("status") not in ("READY", None) or idx.get("queryable") is False:
+        warnings.append(f"Index status {idx.get('status')} / queryable={idx.get('queryable')}")
+    if not vec_fields:
+        warnings.append("Index has no vector field")
+    for f in vec_fields:
+        dims = f.get("numDimensions")
+        print(f"  est. raw vector size: {n * (dims or 0) * 4 / 1e6:.2f}MB (float32, before graph overhead)")
+        if f.get("path") != VECTOR_PATH:
+            warnings.append(f"Index vector path '{f.get('path')}' != queried path '{VECTOR_PATH}'")
+        if dims != DIM:
+            warnings.append(f"Query model {MODEL} emits {DIM} dims but index expects {dims}")
+        bad = [s for s in sizes if s["_id"] not in (0, dims)]
+        for s in bad:
+            warnings.append(f"{s['n']} docs store {s['_id']}-dim vectors; index expects {dims}")
+    missing_vec = sum(s["n"] for s in sizes if s["_id"] == 0)
+    if missing_vec:
+        warnings.append(f"{missing_vec} docs have no '{VECTOR_PATH}' vector (invisible to $vectorSearch)")
+    for f in FILTER_FIELDS:
+        if f not in filt:
+            warnings.append(f"Filter field '{f}' missing from index (prefilters on it will fail)")
+        elif coll.count_documents({f: {"$exists": True}}, limit=1) == 0:
+            warnings.append(f"Filter field '{f}' indexed but no doc has it (Title Case '{f.title()}' only?)")
+    if NUM_CANDIDATES > MAX_NUM_CANDIDATES:
+        warnings.append(f"numCandidates {NUM_CANDIDATES} exceeds Atlas max {MAX_NUM_CANDIDATES}")
+    if NUM_CANDIDATES < TOP_K:
+        warnings.append(f"numCandidates {NUM_CANDIDATES} < limit {TOP_K}")
+    elif n and NUM_CANDIDATES >= n:
+        warnings.append(f"numCandidates {NUM_CANDIDATES} >= collection size {n}: ANN is doing exact work; "
+                        f"consider exact=true or a smaller pool")
+    return warnings
+
+def report_explain(db, qvec):
+    print("\n== explain (executionStats) ==")
+    pipeline = [vs_stage(qvec), PROJECT_STAGE]
+    exp = db.command({"explain": {"aggregate": COLL, "pipeline": pipeline, "cursor": {}},
+                      "verbosity": "executionStats"})
+    for st in exp.get("stages", []):
+        name = next((k for k in st if k.startswith("$")), "?")
+        ms = st.get("executionTimeMillisEstimate")
+        print(f"  {name:15} nReturned={st.get('nReturned')} time≈{ms}ms")
+        detail = st.get(name) if isinstance(st.get(name), dict) else {}
+        if "explain" in detail:
+            print("    " + json.dumps(detail["explain"], default=str)[:600])
+
+def report_stage_timings(coll, vo, query_text, runs):
+    print(f"\n== stage timings ({runs} runs) ==")
+    _, embed_ms = timed(lambda: vo.embed(texts=[query_text], model=MODEL, input_type="query",
+                                         output_dimension=DIM).embeddings[0], runs)
+    qvec = vo.embed(texts=[query_text], model=MODEL, input_type="query", output_dimension=DIM).embeddings[0]
+    _, vs_ms = timed(lambda: list(coll.aggregate([vs_stage(qvec), {"$project": {"_id": 1}}])), runs)
+    _, full_ms = timed(lambda: list(coll.aggregate([vs_stage(qvec), PROJECT_STAGE])), runs)
+    print(f"  embed (voyage)           {fmt_ms(embed_ms)}")
+    print(f"  $vectorSearch (ids only) {fmt_ms(vs_ms)}")
+    print(f"  + $project               {fmt_ms(full_ms)}  (projection ≈ {statistics.median(full_ms) - statistics.median(vs_ms):+.1f}ms)")
+    return qvec
+
+def report_candidate_curve(coll, qvec, runs, curve):
+    print(f"\n== numCandidates vs latency / recall@{TOP_K} (vs exact ENN) ==")
+    exact = list(coll.aggregate([vs_stage(qvec, exact=True), {"$project": {"_id": 1}}]))
+    truth = {d["_id"] for d in exact}
+    for nc in curve:
+        if nc < TOP_K or nc > MAX_NUM_CANDIDATES:
+            continue
+        res, ms = timed(lambda: list(coll.aggregate([vs_stage(qvec, nc), {"$project": {"_id": 1}}])), runs)
+        recall = len(truth & {d["_id"] for d in res}) / len(truth) if truth else 0.0
+        print(f"  numCandidates={nc:>5}  {fmt_ms(ms)}  recall={recall:.2f}")
+
+def report_payload(coll, qvec):
+    print("\n== payload bytes per result ==")
+    projected = list(coll.aggregate([vs_stage(qvec), PROJECT_STAGE]))
+    full = list(coll.aggregate([vs_stage(qvec)]))
+    for label, rows in (("projected", projected), ("full doc ", full)):
+        if rows:
+            b = [len(bson.encode(r)) for r in rows]
+            print(f"  {label}: {statistics.fmean(b):8.0f} B/result  ({sum(b) / 1024:.1f} KiB for {len(rows)} results)")
+
 def main():
+    ap = argparse.ArgumentParser(description="Atlas Vector Search sanity checker / profiler")
+    ap.add_argument("query", nargs="*", default=["allergy", "immunology"])
+    ap.add_argument("--profile", action="store_true", help="explain + timings + candidate curve + config checks")
+    ap.add_argument("--runs", type=int, default=PROFILE_RUNS)
+    ap.add_argument("--candidates", type=str, help="Comma-separated numCandidates values for the curve")
+    args = ap.parse_args()
+
     try:
         client = MongoClient(MONGODB_URI)
-        coll = client[DB][COLL]
+        db = client[DB]
+        coll = db[COLL]
         vo = voyageai.Client(api_key=VOYAGE_API_KEY)
 
         # 1) Visibility checks
-        print("Collections:", client[DB].list_collection_names())
-        idxs = list(coll.aggregate([
-            {"$listSearchIndexes": {}},
-            {"$project": {"name": 1, "type": 1}}
-        ]))
-        print("Search indexes:", idxs)
+        print("Collections:", db.list_collection_names())
+        idxs = list(coll.aggregate([{"$listSearchIndexes": {}}]))
+        print("Search indexes:", [{"name": i.get("name"), "type": i.get("type")} for i in idxs])
 
         # 2) Vector length sanity
         sizes = list(coll.aggregate([
-            {"$project": {"len": {"$cond": [{"$isArray": "$embedding"}, {"$size": "$embedding"}, 0]}}},
+            {"$project": {"len": {"$cond": [{"$isArray": f"${VECTOR_PATH}"}, {"$size": f"${VECTOR_PATH}"}, 0]}}},
             {"$group": {"_id": "$len", "n": {"$sum": 1}}},
             {"$sort": {"_id": 1}}
         ]))
         print("Vector length histogram:", sizes)
 
         # 3) Build query vector
-        query_text = "allergy immunology" if len(sys.argv) == 1 else " ".join(sys.argv[1:])
+        query_text = " ".join(args.query)
         print("Query text:", query_text)
         qvec = vo.embed(
             texts=[query_text],
@@ -45,37 +198,30 @@ def main():
             output_dimension=DIM
         ).embeddings[0]
 
-        # ----- Drop-in replacement pipeline (coalesce Title Case + camelCase) -----
-        pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": INDEX,
-                    "path": "embedding",
-                    "queryVector": qvec,
-                    "numCandidates": NUM_CANDIDATES,
-                    "limit": TOP_K
-                }
-            },
-            {
-                "$project": {
-                    "_id": 0,
-                    "code": {"$ifNull": ["$code", "$Code"]},
-                    "displayName": {"$ifNull": ["$displayName", "$Display Name"]},
-                    "classification": {"$ifNull": ["$classification", "$Classification"]},
-                    "specialization": {"$ifNull": ["$specialization", "$Specialization"]},
-                    "section": {"$ifNull": ["$section", "$Section"]},
-                    "score": {"$meta": "vectorSearchScore"}
-                }
-            }
-        ]
-
         # 4) Run search and print results
-        results = list(coll.aggregate(pipeline))
+        results = list(coll.aggregate([vs_stage(qvec), PROJECT_STAGE]))
         print(f"Results: {len(results)}")
         for i, r in enumerate(results, 1):
             print(f"{i:02d} | {r.get('score'):.3f} | {r.get('code')} | "
                   f"{r.get('classification')} / {r.get('specialization')} | {r.get('displayName')}")
 
+        if not args.profile:
+            return
+
+        # 5) Profiler
+        warnings = report_index(db, coll, idxs, sizes)
+        report_explain(db, qvec)
+        report_stage_timings(coll, vo, query_text, args.runs)
+        curve = [int(x) for x in args.candidates.split(",")] if args.candidates else CANDIDATE_CURVE
+        report_candidate_curve(coll, qvec, args.runs, curve)
+        report_payload(coll, qvec)
+
+        print("\n== misconfiguration check ==")
+        for w in warnings:
+            print(f"  ⚠️  {w}")
+        if not warnings:
+            print("  ✅ no issues found")
+
     except Exception:
         print("ERROR:")
         traceback.print_exc()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# embed_batch.py — Bulk re-embeds through the Voyage Batch API instead of online vo.embed calls
+#
+# Steps:
+#   prepare  - scan the collection, clean Definition/Notes (same as embedder.py) and write one batch
+#              request per doc whose embedding text changed (or was never embedded with VOYAGE_MODEL).
+#              custom_id = "<id type>:<_id>|<text sha1>|<model>|<dims>", so results map back without a side table
+#              and the model the batch is run with is fixed at prepare time.
+#   submit   - upload the JSONL and create the batch job with the model / dims recorded in its custom_ids
+#   status   - poll the job; downloads the output file (raw JSONL) once it has completed
+#   ingest   - stream the results file into bulk UpdateOne writes (embedding, text hash, model, rerank_text).
+#              A result is written only if the doc's current text still hashes to the batched text and no
+#              newer vector for it exists; the write is conditional on the hash / model it was checked against,
+#              so a vector the daemon wrote meanwhile is never overwritten by an hours-old batch.
+#              Idempotent and resumable via a line checkpoint next to the file.
+#
+# Run:
+#   python3 embed_batch.py prepare --out embed_batch_input.jsonl
+#   python3 embed_batch.py submit  --input embed_batch_input.jsonl
+#   python3 embed_batch.py status  --batch-id batch_abc123 --out embed_batch_output.jsonl
+#   python3 embed_batch.py ingest  --results embed_batch_output.jsonl
+
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.request
+import uuid
+from typing import Any, Dict, Iterator, List, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+import embedder
+from embedder import PROJECTION, RERANK_TEXT_FIELD, build_embedding_text, build_rerank_text, clean_fields, text_hash
+
+# ---------------- CONFIG ----------------
+VOYAGE_BATCH_BASE_URL = "https://api.voyageai.com/v1"
+COMPLETION_WINDOW     = "12h"
+INGEST_BULK_SIZE      = 1000
+# Model / dims / key / collection come from embedder.py so batch and online runs stay in sync
+# ----------------------------------------
+
+def encode_id(doc_id: Any) -> str:
+    if isinstance(doc_id, ObjectId):
+        return f"oid:{doc_id}"
+    if isinstance(doc_id, int):
+        return f"int:{doc_id}"
+    return f"str:{doc_id}"
+
+def decode_id(s: str) -> Any:
+    kind, _, val = s.partition(":")
+    if kind == "oid":
+        return ObjectId(val)
+    if kind == "int":
+        return int(val)
+    return val
+
+def make_custom_id(doc_id: Any, h: str, model: str = None, dim: int = None) -> str:
+    return f"{encode_id(doc_id)}|{h}|{model or embedder.VOYAGE_MODEL}|{dim or embedder.EMBED_DIM}"
+
+def parse_custom_id(cid: str) -> Tuple[Any, str, str, int]:
+    """(_id, text hash, model, dims); files prepared before the model was recorded are rejected."""
+    parts = cid.rsplit("|", 3)
+    if len(parts) != 4 or not parts[3].isdigit():
+        raise SystemExit(f"custom_id {cid!r} has no model / dims (prepared by an older embed_batch.py); "
+                         f"re-run prepare")
+    id_part, h, model, dim = parts
+    return decode_id(id_part), h, model, int(dim)
+
+def input_model(input_path: str) -> Tuple[str, int]:
+    """Model / dims recorded in a prepared file (all lines share them)."""
+    with open(input_path, encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                _, _, model, dim = parse_custom_id(json.loads(line)["custom_id"])
+                return model, dim
+    raise SystemExit(f"{input_path} has no requests")
+
+# ---------- prepare ----------
+def prepare(out_path: str, force: bool = False) -> None:
+    coll = embedder.connect()
+    proj = {**PROJECTION, "embedding_text_hash": 1, "embedding_model": 1}
+    written = skipped = cleaned = 0
+    clean_ops = []
+    with open(out_path, "w", encoding="utf-8") as fh:
+        cur = coll.find({}, projection=proj, no_cursor_timeout=True)
+        try:
+            for doc in cur:
+                updates = clean_fields(doc)
+                if updates:
+                    clean_ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": updates}))
+                    cleaned += 1
+                text = build_embedding_text({**doc, **updates})
+                h = text_hash(text)
+                if (not force and doc.get("embedding_text_hash") == h
+                        and doc.get("embedding_model") == embedder.VOYAGE_MODEL):
+                    skipped += 1
+                    continue
+                fh.write(json.dumps({"custom_id": make_custom_id(doc["_id"], h),
+                                     "body": {"input": [text]}}, ensure_ascii=False) + "\n")
+                written += 1
+                if len(clean_ops) >= INGEST_BULK_SIZE:
+                    coll.bulk_write(clean_ops, ordered=False)
+                    clean_ops.clear()
+        finally:
+            cur.close()
+    if clean_ops:
+        coll.bulk_write(clean_ops, ordered=False)
+    print(f"✅ Wrote {written} requests to {out_path} ({skipped} unchanged skipped, {cleaned} docs cleaned)")
+
+# ---------- submit / status ----------
+def _api(method: str, path: str, body: bytes = None, content_type: str = "application/json", raw: bool = False):
+    """JSON response as a dict; raw=True returns the body bytes untouched (file downloads are JSONL)."""
+    req = urllib.request.Request(f"{VOYAGE_BATCH_BASE_URL}{path}", data=body, method=method)
+    req.add_header("Authorization", f"Bearer {embedder.VOYAGE_API_KEY}")
+    if body is not None:
+        req.add_header("Content-Type", content_type)
+    with urllib.request.urlopen(req, timeout=120) as resp:
+        data = resp.read()
+    return data if raw else json.loads(data)
+
+def submit(input_path: str) -> None:
+    model, dim = input_model(input_path)
+    boundary = uuid.uuid4().hex
+    with open(input_path, "rb") as fh:
+        payload = fh.read()
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"purpose\"\r\n\r\nbatch\r\n"
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; "
+            f"filename=\"{os.path.basename(input_path)}\"\r\nContent-Type: application/jsonl\r\n\r\n"
+            ).encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+    f = _api("POST", "/files", body, f"multipart/form-data; boundary={boundary}")
+    batch = _api("POST", "/batches", json.dumps({
+        "endpoint": "/v1/embeddings",
+        "input_file_id": f["id"],
+        "completion_window": COMPLETION_WINDOW,
+        "request_params": {"model": model, "input_type": "document", "output_dimension": dim},
+    }).encode())
+    print(f"✅ Submitted batch {batch.get('id')} (file {f['id']}, {model}/{dim}, status {batch.get('status')})")
+
+def status(batch_id: str, out_path: str) -> None:
+    b = _api("GET", f"/batches/{batch_id}")
+    print(f"Batch {batch_id}: {b.get('status')}  {b.get('request_counts', '')}")
+    if b.get("status") == "completed" and b.get("output_file_id") and out_path:
+        content = _api("GET", f"/files/{b['output_file_id']}/content", raw=True)
+        with open(out_path, "wb") as fh:
+            fh.write(content)
+        print(f"✅ Downloaded results to {out_path}")
+
+# ---------- ingest ----------
+def iter_results(path: str, start_line: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    with open(path, encoding="utf-8") as fh:
+        for n, line in enumerate(fh, 1):
+            if n <= start_line or not line.strip():
+                continue
+            yield n, json.loads(line)
+
+def result_vector(rec: Dict[str, Any]):
+    """Embedding from one output line; tolerates {response: {body: {data}}} and {response: {data}}."""
+    resp = rec.get("response") or {}
+    body = resp.get("body", resp)
+    data = body.get("data") or []
+    return data[0].get("embedding") if data else None
+
+def ingest_ops(coll, batch: List[Tuple[Any, str, str, List[float]]]) -> Tuple[List[UpdateOne], int]:
+    """
+    UpdateOnes for (_id, hash, model, vector) results whose doc still has that text; returns (ops, stale).
+    Each op is conditional on the stored hash / model it was checked against, so a concurrent newer write wins.
+    """
+    proj = {**PROJECTION, "embedding_text_hash": 1, "embedding_model": 1,
+            "dim": {"$size": {"$ifNull": ["$embedding", []]}}}
+    docs = {d["_id"]: d for d in coll.aggregate([{"$match": {"_id": {"$in": [r[0] for r in batch]}}},
+                                                 {"$project": proj}])}
+    ops, stale = [], 0
+    for doc_id, h, model, vec in batch:
+        doc = docs.get(doc_id)
+        working = {**doc, **clean_fields(doc)} if doc is not None else None
+        stored_h, stored_model = (doc or {}).get("embedding_text_hash"), (doc or {}).get("embedding_model")
+        if (doc is None or text_hash(build_embedding_text(working)) != h         # text edited since prepare
+                or (stored_h == h and stored_model == model and doc["dim"] == len(vec))   # already written
+                or (stored_h == h and model != embedder.VOYAGE_MODEL)):          # newer model's vector exists
+            stale += 1
+            continue
+        ops.append(UpdateOne({"_id": doc_id, "embedding_text_hash": stored_h, "embedding_model": stored_model},
+                             {"$set": {"embedding": vec, "embedding_text_hash": h, "embedding_model": model,
+                                       RERANK_TEXT_FIELD: build_rerank_text(working)}}))
+    return ops, stale
+
+def ingest(results_path: str) -> None:
+    coll = embedder.connect()
+    ckpt_path = results_path + ".ckpt"
+    err_path = results_path + ".errors.jsonl"
+    start = 0
+    if os.path.exists(ckpt_path):
+        with open(ckpt_path) as fh:
+            start = int(fh.read().strip() or 0)
+        print(f"Resuming after line {start}", file=sys.stderr)
+
+    batch, written, skipped, errors, last_line = [], 0, 0, 0, start
+    t0 = time.perf_counter()
+
+    def flush():
+        nonlocal written, skipped
+        if batch:
+            ops, stale = ingest_ops(coll, batch)
+            modified = coll.bulk_write(ops, ordered=False).modified_count if ops else 0
+            written += modified
+            skipped += stale + len(ops) - modified          # ops that lost the race to a newer write
+            batch.clear()
+        with open(ckpt_path + ".tmp", "w") as fh:
+            fh.write(str(last_line))
+        os.replace(ckpt_path + ".tmp", ckpt_path)
+
+    with open(err_path, "a", encoding="utf-8") as err_fh:
+        for n, rec in iter_results(results_path, start):
+            last_line = n
+            vec = result_vector(rec)
+            if rec.get("error") or vec is None:
+                err_fh.write(json.dumps(rec)[:2000] + "\n")
+                errors += 1
+                continue
+            doc_id, h, model, _ = parse_custom_id(rec["custom_id"])
+            batch.append((doc_id, h, model, vec))
+            if len(batch) >= INGEST_BULK_SIZE:
+                flush()
+                print(f"Ingested {written} vectors...", file=sys.stderr)
+        flush()
+
+    dt = time.perf_counter() - t0
+    print(f"✅ Ingested {written} vectors in {dt:.1f}s ({skipped} stale / already current skipped, "
+          f"{errors} failed requests → {err_path})")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Voyage Batch API re-embed: prepare → submit → status → ingest")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("prepare"); p.add_argument("--out", default="embed_batch_input.jsonl")
+    p.add_argument("--force", action="store_true", help="Include docs whose text hash is unchanged")
+    p = sub.add_parser("submit"); p.add_argument("--input", default="embed_batch_input.jsonl")
+    p = sub.add_parser("status"); p.add_argument("--batch-id", required=True)
+    p.add_argument("--out", default="embed_batch_output.jsonl")
+    p = sub.add_parser("ingest"); p.add_argument("--results", default="embed_batch_output.jsonl")
+    args = ap.parse_args()
+
+    if args.cmd == "prepare":
+        prepare(args.out, args.force)
+    elif args.cmd == "submit":
+        submit(args.input)
+    elif args.cmd == "status":
+        status(args.batch_id, args.out)
+    else:
+        ingest(args.results)
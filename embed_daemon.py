@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# embed_daemon.py — Change-stream driven incremental embedder for NUCC.taxonomy251
+# - Watches the collection (insert / update / replace) with fullDocument=updateLookup
+# - Debounces: changed docs collect for DEBOUNCE_SECONDS (or until MAX_BATCH) and are embedded together
+# - Re-embeds only docs whose embedding text hash (embedder.text_hash) changed; ignores its own writes
+# - Persists the resume token after each committed batch, so a restart picks up where it stopped
+#   (events replayed after a crash are harmless: unchanged hashes are skipped)
+# - Keeps the active embedding_versions.py version (emb_<version>) current too: after each flush the changed
+#   docs go through that version's backfill, so searches on the active version never see stale vectors
+#
+# Change streams need a replica set. Local stand-in for testing:
+#   mongod --replSet rs0 --dbpath /tmp/rs0 --port 27017 &
+#   mongosh --eval 'rs.initiate()'
+#   python3 embed_daemon.py --uri "mongodb://localhost:27017/?replicaSet=rs0"
+#
+# Run:
+#   python3 embed_daemon.py                 # run forever
+#   python3 embed_daemon.py --once          # drain pending changes, flush, exit (handy in tests)
+
+import argparse
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from bson import json_util
+from pymongo import UpdateOne
+
+import embedder
+from embedder import RERANK_TEXT_FIELD, build_embedding_text, build_rerank_text, clean_fields, text_hash
+from embedding_versions import active_config, backfill
+
+# ---------------- CONFIG ----------------
+RESUME_TOKEN_PATH = "embed_daemon.resume.json"
+DEBOUNCE_SECONDS  = 2.0     # wait this long after the first pending change before embedding
+MAX_BATCH         = 128     # ...or flush as soon as this many docs are pending
+IDLE_EXIT_SECONDS = 5.0     # --once: exit after this long without events
+# ----------------------------------------
+
+# Fields this daemon (and the other embedders) write; updates touching only these are our own echo
+OWN_FIELDS = {"embedding", "embedding_text_hash", "embedding_model", RERANK_TEXT_FIELD}
+
+def load_token(path: str = RESUME_TOKEN_PATH) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as fh:
+        return json_util.loads(fh.read())
+
+def save_token(token: Optional[Dict[str, Any]], path: str = RESUME_TOKEN_PATH) -> None:
+    if token is None:
+        return
+    with open(path + ".tmp", "w", encoding="utf-8") as fh:
+        fh.write(json_util.dumps(token))
+    os.replace(path + ".tmp", path)
+
+def is_own_write(change: Dict[str, Any]) -> bool:
+    if change.get("operationType") != "update":
+        return False
+    desc = change.get("updateDescription") or {}
+    touched = set(desc.get("updatedFields", {})) | set(desc.get("removedFields", []))
+    return bool(touched) and all(f in OWN_FIELDS or f.startswith("emb_") for f in touched)  # + versioned fields
+
+def refresh_active_version(coll, ids: List[Any]) -> int:
+    """Re-embed ids into the active version's field where their text changed; 0 if nothing is activated."""
+    try:
+        cfg = active_config(coll.database)
+    except RuntimeError:
+        return 0
+    return backfill(coll, cfg, ids=ids, verbose=False)
+
+def flush(coll, pending: Dict[Any, Dict[str, Any]],
+          embed_fn: Callable[[List[str]], List[List[float]]]) -> Dict[str, int]:
+    """Embed the changed docs among pending and write them back. Returns counters."""
+    ids, texts, sets = [], [], []
+    clean_only = []
+    for doc_id, doc in pending.items():
+        updates = clean_fields(doc)
+        working = {**doc, **updates}
+        text = build_embedding_text(working)
+        h = text_hash(text)
+        rerank_text = build_rerank_text(working)
+        if doc.get(RERANK_TEXT_FIELD) != rerank_text:
+            updates[RERANK_TEXT_FIELD] = rerank_text    # rerank paths prefer the stored text
+        if doc.get("embedding_text_hash") == h and doc.get("embedding_model") == embedder.VOYAGE_MODEL:
+            if updates:
+                clean_only.append(UpdateOne({"_id": doc_id}, {"$set": updates}))
+            continue
+        ids.append(doc_id)
+        texts.append(text)
+        sets.append({**updates, "embedding_text_hash": h, "embedding_model": embedder.VOYAGE_MODEL})
+
+    ops = list(clean_only)
+    for i in range(0, len(texts), embedder.BATCH_SIZE):
+        vectors = embed_fn(texts[i:i + embedder.BATCH_SIZE])
+        for doc_id, set_doc, vec in zip(ids[i:], sets[i:], vectors):
+            ops.append(UpdateOne({"_id": doc_id}, {"$set": {**set_doc, "embedding": vec}}))
+    if ops:
+        coll.bulk_write(ops, ordered=False)
+    return {"embedded": len(texts), "skipped": len(pending) - len(texts)}
+
+def run(coll, embed_fn: Callable = None, once: bool = False,
+        token_path: str = RESUME_TOKEN_PATH) -> None:
+    embed_fn = embed_fn or embedder.embed_texts
+    token = load_token(token_path)
+    pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+    pending: Dict[Any, Dict[str, Any]] = {}
+    first_at = None
+    last_event = time.monotonic()
+    totals = {"events": 0, "embedded": 0, "skipped": 0, "versioned": 0}
+    print(f"Watching {coll.full_name} ({'resuming' if token else 'from now'})", file=sys.stderr)
+
+    with coll.watch(pipeline, full_document="updateLookup", resume_after=token,
+                    max_await_time_ms=int(min(DEBOUNCE_SECONDS, 1.0) * 1000)) as stream:
+        try:
+            while stream.alive:
+                change = stream.try_next()
+                now = time.monotonic()
+                if change is not None:
+                    last_event = now
+                    totals["events"] += 1
+                    doc = change.get("fullDocument")
+                    if doc is not None and not is_own_write(change):
+                        pending[doc["_id"]] = doc       # later edits of the same doc overwrite earlier ones
+                        first_at = first_at or now
+                    elif not pending:
+                        save_token(stream.resume_token, token_path)  # nothing outstanding: skip past echoes
+
+                if pending and (len(pending) >= MAX_BATCH or now - first_at >= DEBOUNCE_SECONDS):
+                    t0 = time.perf_counter()
+                    c = flush(coll, pending, embed_fn)
+                    versioned = refresh_active_version(coll, list(pending))
+                    save_token(stream.resume_token, token_path)
+                    totals["embedded"] += c["embedded"]
+                    totals["skipped"] += c["skipped"]
+                    totals["versioned"] += versioned
+                    print(f"Flushed {len(pending)} docs: embedded={c['embedded']} skipped={c['skipped']} "
+                          f"active-version={versioned} in {time.perf_counter() - t0:.2f}s", file=sys.stderr)
+                    pending.clear()
+                    first_at = None
+
+                if once and not pending and now - last_event >= IDLE_EXIT_SECONDS:
+                    break
+        except KeyboardInterrupt:
+            pass
+        # Normal exit or Ctrl-C: commit what is pending. A failed flush propagates instead of being retried
+        # here with the same batch (paying for its embeds twice); the resume token replays it on restart.
+        if pending:
+            flush(coll, pending, embed_fn)
+            refresh_active_version(coll, list(pending))
+            save_token(stream.resume_token, token_path)
+
+    print(f"Done. events={totals['events']} embedded={totals['embedded']} skipped={totals['skipped']} "
+          f"active-version={totals['versioned']}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Change-stream incremental embedder")
+    ap.add_argument("--uri", type=str, help="Override embedder.MONGODB_URI (e.g. a local replica set)")
+    ap.add_argument("--once", action="store_true", help="Exit once the stream has been idle for a while")
+    ap.add_argument("--token-file", default=RESUME_TOKEN_PATH)
+    args = ap.parse_args()
+
+    if args.uri:
+        embedder.MONGODB_URI = args.uri
+    run(embedder.connect(), once=args.once, token_path=args.token_file)
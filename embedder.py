@@ -5,13 +5,16 @@
 #  - Builds an embedding text from key fields
 #  - Calls VoyageAI to create 1024‑dim embeddings (voyage-3.5) with input_type="document"
 #  - Writes the vector to "embedding" and saves cleaned Definition/Notes
+#  - Stores the reranker's document string in "rerank_text" (--rerank-text backfills it without embedding)
 #
 # NOTE: This script contains plaintext credentials because it's for quick demos.
 #       Rotate/replace your API key after sharing/using in public contexts.
 
 from pymongo import MongoClient, UpdateOne
 import voyageai
-import re, html, sys
+import re, html, sys, hashlib, argparse
+
+from voyage_metering import MeteredVoyage, estimate_tokens, print_estimate
 
 # ---------- Hardcoded demo creds (as requested) ----------
 MONGODB_URI = ""
@@ -22,11 +25,17 @@ VOYAGE_API_KEY = ""
 VOYAGE_MODEL   = "voyage-4-large"   # keep this in sync with your index
 EMBED_DIM      = 2048           # keep this in sync with your Atlas Vector Search index
 BATCH_SIZE     = 128
+RERANK_TEXT_FIELD = "rerank_text"   # precomputed "classification | specialization | displayName | code"
+
+# ---------- Connect (lazily, so the helpers below can be imported) ----------
+client = coll = vo = None
 
-# ---------- Connect ----------
-client = MongoClient(MONGODB_URI)
-coll = client[DB_NAME][COLL_NAME]
-vo = voyageai.Client(api_key=VOYAGE_API_KEY)
+def connect():
+    global client, coll, vo
+    client = MongoClient(MONGODB_URI)
+    coll = client[DB_NAME][COLL_NAME]
+    vo = MeteredVoyage(voyageai.Client(api_key=VOYAGE_API_KEY))
+    return coll
 
 # ---------- Helpers ----------
 TAG_RE = re.compile(r"<[^>]+>")
@@ -61,6 +70,31 @@ def build_embedding_text(doc: dict) -> str:
     ]
     return " ".join([p for p in parts if p])
 
+def build_rerank_text(doc: dict) -> str:
+    """The compact string the reranker scores; stored so queries don't rebuild it per candidate."""
+    parts = [
+        get(doc, "classification", "Classification"),
+        get(doc, "specialization", "Specialization"),
+        get(doc, "displayName", "Display Name"),
+        get(doc, "code", "Code"),
+    ]
+    return " | ".join([" ".join(p.split()) for p in parts if p])
+
+def text_hash(text: str) -> str:
+    """Stable hash of the embedding text; stored next to the vector so reruns can skip unchanged docs."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def clean_fields(doc: dict) -> dict:
+    """Definition/Notes values that change after strip_markup (only those need writing back)."""
+    updates = {}
+    for fld in ("definition", "Definition", "notes", "Notes"):
+        raw = doc.get(fld)
+        if isinstance(raw, str) and raw:
+            cleaned = strip_markup(raw)
+            if cleaned != raw:
+                updates[fld] = cleaned
+    return updates
+
 def embed_texts(texts):
     if not texts:
         return []
@@ -72,20 +106,21 @@ def embed_texts(texts):
     )
     return res.embeddings
 
+PROJECTION = {
+    "_id": 1,
+    "displayName": 1, "Display Name": 1,
+    "classification": 1, "Classification": 1,
+    "specialization": 1, "Specialization": 1,
+    "definition": 1, "Definition": 1,
+    "grouping": 1, "Grouping": 1,
+    "section": 1, "Section": 1,
+    "code": 1, "Code": 1,
+    "notes": 1, "Notes": 1,
+}
+
 def main():
-    projection = {
-        "_id": 1,
-        "displayName": 1, "Display Name": 1,
-        "classification": 1, "Classification": 1,
-        "specialization": 1, "Specialization": 1,
-        "definition": 1, "Definition": 1,
-        "grouping": 1, "Grouping": 1,
-        "section": 1, "Section": 1,
-        "code": 1, "Code": 1,
-        "notes": 1, "Notes": 1,
-    }
-
-    cur = coll.find({}, projection=projection, no_cursor_timeout=True)
+    connect()
+    cur = coll.find({}, projection=PROJECTION, no_cursor_timeout=True)
 
     batch, texts, ops = [], [], []
     processed = 0
@@ -93,19 +128,14 @@ def main():
     try:
         for doc in cur:
             # Clean fields if present
-            updates = {}
-            for fld in ("definition", "Definition", "notes", "Notes"):
-                raw = doc.get(fld)
-                if isinstance(raw, str) and raw:
-                    cleaned = strip_markup(raw)
-                    if cleaned != raw:
-                        updates[fld] = cleaned
+            updates = clean_fields(doc)
 
             # Build text for embedding (from cleaned view)
             working = {**doc, **updates}
             text = build_embedding_text(working)
 
-            batch.append((doc["_id"], updates))
+            batch.append((doc["_id"], {**updates, "embedding_text_hash": text_hash(text),
+                                       RERANK_TEXT_FIELD: build_rerank_text(working)}))
             texts.append(text)
 
             if len(batch) == BATCH_SIZE:
@@ -128,11 +158,12 @@ def main():
         cur.close()
 
     print(f"Done. Processed {processed} docs.")
+    vo.print_summary()
 
 def write_batch(batch, texts, ops):
     vectors = embed_texts(texts)
     for (doc_id, updates), vec in zip(batch, vectors):
-        set_doc = {"embedding": vec}
+        set_doc = {"embedding": vec, "embedding_model": VOYAGE_MODEL}
         if updates:
             set_doc.update(updates)
         ops.append(UpdateOne({"_id": doc_id}, {"$set": set_doc}))
@@ -142,6 +173,36 @@ def write_batch(batch, texts, ops):
         coll.bulk_write(ops)
         ops.clear()
 
+def backfill_rerank_text():
+    """Write rerank_text where it is missing or stale; no embedding calls."""
+    connect()
+    ops, changed = [], 0
+    for d in coll.find({}, projection={**PROJECTION, RERANK_TEXT_FIELD: 1}):
+        text = build_rerank_text(d)
+        if d.get(RERANK_TEXT_FIELD) != text:
+            ops.append(UpdateOne({"_id": d["_id"]}, {"$set": {RERANK_TEXT_FIELD: text}}))
+        if len(ops) >= 1000:
+            changed += coll.bulk_write(ops, ordered=False).modified_count
+            ops.clear()
+    if ops:
+        changed += coll.bulk_write(ops, ordered=False).modified_count
+    print(f"Done. {RERANK_TEXT_FIELD} written on {changed} docs.")
+
+def estimate():
+    """Count tokens for a full re-embed locally; no paid calls."""
+    connect()
+    texts = (build_embedding_text({**d, **clean_fields(d)}) for d in coll.find({}, projection=PROJECTION))
+    print_estimate(estimate_tokens(vo, texts, VOYAGE_MODEL), VOYAGE_MODEL, BATCH_SIZE)
+
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser(description="Clean Definition/Notes and (re-)embed the taxonomy")
+    ap.add_argument("--estimate", action="store_true", help="Pre-flight token/cost estimate only")
+    ap.add_argument("--rerank-text", action="store_true", help="Backfill rerank_text only (no embedding)")
+    args = ap.parse_args()
+    if args.estimate:
+        estimate()
+    elif args.rerank_text:
+        backfill_rerank_text()
+    else:
+        main()
 
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# embedder_sharded.py — embedder.py split over worker processes, resumable from per-shard checkpoints
+# - plan: $bucketAuto over _id → SHARDS contiguous _id ranges of ~equal size. The plan is kept in STATE_DIR,
+#   so every rerun walks the same ranges (a changed model / dims / collection needs --restart). The first
+#   range is open below and the last open above, so docs inserted after planning are still walked
+# - each shard runs in a worker process with its own MongoClient + Voyage client, reads its range in _id
+#   order one page at a time (short-lived cursors instead of no_cursor_timeout), embeds the page in one
+#   call and writes it with one unordered bulk_write
+# - after every bulk_write the shard's checkpoint (last committed _id, docs done) is replaced atomically;
+#   a rerun resumes each shard right after its last committed _id and skips finished shards; once every
+#   shard has finished, the next run starts a new pass over the same plan (with --changed-only, a cheap
+#   sweep that embeds only docs edited since)
+# - the parent polls the checkpoints and prints docs done / total, docs/s, ETA and shard states
+# - cleaning, embedding text, rerank_text and text hash are embedder.py's (same model / dims / collection)
+#
+# Run:
+#   python3 embedder_sharded.py --workers 8 --shards 32
+#   python3 embedder_sharded.py --changed-only            # skip docs whose text hash + model are current
+#   python3 embedder_sharded.py --status                  # checkpoint progress per shard, then exit
+#   python3 embedder_sharded.py --restart                 # new plan, old checkpoints discarded
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+from bson import json_util
+from pymongo import UpdateOne
+
+import embedder
+from embedder import PROJECTION, RERANK_TEXT_FIELD, build_embedding_text, build_rerank_text, clean_fields, text_hash
+
+# ---------------- CONFIG ----------------
+STATE_DIR      = "embedder_sharded_state"
+SHARDS         = 16                    # _id ranges; more shards than workers evens out slow ranges
+WORKERS        = 4                     # processes (each with its own Voyage concurrency)
+PAGE_SIZE      = embedder.BATCH_SIZE   # docs per find page = per embed call = per bulk_write
+PROGRESS_EVERY = 2.0                   # seconds between progress lines
+# ----------------------------------------
+
+SHARD_PROJECTION = {**PROJECTION, "embedding_text_hash": 1, "embedding_model": 1}
+
+# ---------- state ----------
+def _write_json(path: str, obj: Any) -> None:
+    with open(path + ".tmp", "w") as fh:
+        fh.write(json_util.dumps(obj))
+    os.replace(path + ".tmp", path)
+
+def _read_json(path: str) -> Optional[Any]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as fh:
+        return json_util.loads(fh.read())
+
+def plan_path(state_dir: str) -> str:
+    return os.path.join(state_dir, "plan.json")
+
+def checkpoint_path(state_dir: str, shard: int) -> str:
+    return os.path.join(state_dir, f"shard_{shard:04d}.json")
+
+def load_checkpoint(state_dir: str, shard: int) -> Dict[str, Any]:
+    return _read_json(checkpoint_path(state_dir, shard)) or {"last_id": None, "done": 0, "embedded": 0,
+                                                             "finished": False}
+
+def clear_checkpoints(state_dir: str) -> None:
+    for p in glob.glob(os.path.join(state_dir, "shard_*.json")):
+        os.remove(p)
+
+def fingerprint(n_shards: int) -> Dict[str, Any]:
+    return {"db": embedder.DB_NAME, "coll": embedder.COLL_NAME, "model": embedder.VOYAGE_MODEL,
+            "dim": embedder.EMBED_DIM, "shards": n_shards}
+
+def make_plan(coll, n_shards: int) -> List[Dict[str, Any]]:
+    """
+    $bucketAuto on _id → [{shard, min, max, last, count}]; a range is [min, max), except that the first
+    is open below and the last open above (run_shard), so later inserts fall in some range.
+    """
+    buckets = list(coll.aggregate([{"$bucketAuto": {"groupBy": "$_id", "buckets": n_shards}}]))
+    return [{"shard": i, "min": b["_id"]["min"], "max": b["_id"]["max"], "last": i == len(buckets) - 1,
+             "count": b["count"]} for i, b in enumerate(buckets)]
+
+def load_or_make_plan(coll, state_dir: str, n_shards: int, restart: bool = False) -> List[Dict[str, Any]]:
+    os.makedirs(state_dir, exist_ok=True)
+    state = None if restart else _read_json(plan_path(state_dir))
+    if state is not None:
+        if state["fingerprint"] != fingerprint(state["fingerprint"]["shards"]):
+            raise SystemExit(f"{plan_path(state_dir)} was made for {state['fingerprint']}; "
+                             f"embedder.py now says {fingerprint(n_shards)} (use --restart)")
+        if state["fingerprint"]["shards"] != n_shards:
+            print(f"Resuming the existing {state['fingerprint']['shards']}-shard plan "
+                  f"(--shards {n_shards} ignored; --restart to re-plan)", file=sys.stderr)
+        return state["shards"]
+    clear_checkpoints(state_dir)
+    shards = make_plan(coll, n_shards)
+    _write_json(plan_path(state_dir), {"fingerprint": fingerprint(n_shards), "created": time.time(),
+                                       "shards": shards})
+    return shards
+
+# ---------- worker ----------
+def run_shard(shard: Dict[str, Any], state_dir: str, changed_only: bool = False,
+              page_size: int = PAGE_SIZE) -> Dict[str, Any]:
+    """Embed one _id range from its checkpoint to the end; checkpoint after every committed page."""
+    if embedder.coll is None:
+        embedder.connect()                    # per process: clients are not fork-safe
+    coll = embedder.coll
+    ck = load_checkpoint(state_dir, shard["shard"])
+    upper = {} if shard["last"] else {"$lt": shard["max"]}
+    while not ck["finished"]:
+        if ck["last_id"] is not None:
+            lower = {"$gt": ck["last_id"]}
+        else:
+            lower = {} if shard["shard"] == 0 else {"$gte": shard["min"]}
+        page = list(coll.find({"_id": {**lower, **upper}} if lower or upper else {}, projection=SHARD_PROJECTION)
+                    .sort("_id", 1).limit(page_size))
+        if not page:
+            ck["finished"] = True
+            break
+        batch, texts = [], []
+        for doc in page:
+            updates = clean_fields(doc)
+            working = {**doc, **updates}
+            text = build_embedding_text(working)
+            h = text_hash(text)
+            if changed_only and doc.get("embedding_text_hash") == h and doc.get("embedding_model") == embedder.VOYAGE_MODEL:
+                continue
+            batch.append((doc["_id"], {**updates, "embedding_text_hash": h,
+                                       RERANK_TEXT_FIELD: build_rerank_text(working)}))
+            texts.append(text)
+        if batch:
+            vectors = embedder.embed_texts(texts)
+            coll.bulk_write([UpdateOne({"_id": doc_id}, {"$set": {**updates, "embedding": vec,
+                                                                 "embedding_model": embedder.VOYAGE_MODEL}})
+                             for (doc_id, updates), vec in zip(batch, vectors)], ordered=False)
+        ck.update(last_id=page[-1]["_id"], done=ck["done"] + len(page), embedded=ck["embedded"] + len(batch),
+                  finished=len(page) < page_size)
+        ck["updated"] = time.time()
+        _write_json(checkpoint_path(state_dir, shard["shard"]), ck)
+    _write_json(checkpoint_path(state_dir, shard["shard"]), ck)
+    return {"shard": shard["shard"], **ck}
+
+# ---------- parent ----------
+def progress(plan: List[Dict[str, Any]], state_dir: str) -> Dict[str, int]:
+    cks = [load_checkpoint(state_dir, s["shard"]) for s in plan]
+    return {"done": sum(c["done"] for c in cks), "embedded": sum(c["embedded"] for c in cks),
+            "finished": sum(c["finished"] for c in cks),
+            "started": sum(c["done"] > 0 and not c["finished"] for c in cks)}
+
+def print_progress(plan: List[Dict[str, Any]], state_dir: str, t0: float, done0: int, failed: int = 0) -> None:
+    total = sum(s["count"] for s in plan)
+    p = progress(plan, state_dir)
+    el = time.perf_counter() - t0
+    rate = (p["done"] - done0) / el if el > 0 else 0.0
+    left = max(0, total - p["done"])
+    eta = f"{left / rate:,.0f}s" if rate > 0 else "-"
+    fails = f", {failed} failed" if failed else ""
+    print(f"  {p['done']:,}/{total:,} docs ({p['done'] / total if total else 1:.1%}), embedded {p['embedded']:,}, "
+          f"{rate:,.0f} docs/s, ETA {eta}; shards: {p['finished']}/{len(plan)} finished, {p['started']} running"
+          f"{fails}", file=sys.stderr)
+
+def print_status(plan: List[Dict[str, Any]], state_dir: str) -> None:
+    print(f"{'shard':>5} {'docs':>8} {'done':>8} {'embedded':>8}  state     last _id")
+    for s in plan:
+        c = load_checkpoint(state_dir, s["shard"])
+        state = "finished" if c["finished"] else ("partial" if c["done"] else "pending")
+        print(f"{s['shard']:>5} {s['count']:>8} {c['done']:>8} {c['embedded']:>8}  {state:<9} {c['last_id']}")
+    p = progress(plan, state_dir)
+    print(f"Total: {p['done']:,}/{sum(s['count'] for s in plan):,} docs, {p['finished']}/{len(plan)} shards finished")
+
+def run(workers: int = WORKERS, n_shards: int = SHARDS, changed_only: bool = False, restart: bool = False,
+        state_dir: str = STATE_DIR) -> int:
+    coll = embedder.connect()
+    plan = load_or_make_plan(coll, state_dir, n_shards, restart)
+    if plan and all(load_checkpoint(state_dir, s["shard"])["finished"] for s in plan):
+        print("Every shard finished last time; starting a new pass over the same plan", file=sys.stderr)
+        clear_checkpoints(state_dir)
+    todo = [s for s in plan if not load_checkpoint(state_dir, s["shard"])["finished"]]
+    done0 = progress(plan, state_dir)["done"]
+    print(f"{len(plan)} shards over {sum(s['count'] for s in plan):,} docs; {len(plan) - len(todo)} finished, "
+          f"{len(todo)} to run with {workers} worker(s) → {embedder.VOYAGE_MODEL}/{embedder.EMBED_DIM}",
+          file=sys.stderr)
+    t0 = time.perf_counter()
+    failed: List[int] = []
+    if workers <= 1:
+        for s in todo:
+            run_shard(s, state_dir, changed_only)
+            print_progress(plan, state_dir, t0, done0)
+        embedder.vo.print_summary()
+    else:
+        embedder.client = embedder.coll = embedder.vo = None     # workers connect for themselves
+        with ProcessPoolExecutor(workers) as pool:
+            futs = {pool.submit(run_shard, s, state_dir, changed_only): s["shard"] for s in todo}
+            pending = set(futs)
+            while pending:
+                finished, pending = wait(pending, timeout=PROGRESS_EVERY, return_when=FIRST_COMPLETED)
+                for f in finished:
+                    if f.exception() is not None:
+                        failed.append(futs[f])
+                        print(f"  shard {futs[f]} failed: {type(f.exception()).__name__}: {f.exception()}",
+                              file=sys.stderr)
+                print_progress(plan, state_dir, t0, done0, len(failed))
+    p = progress(plan, state_dir)
+    fails = f"; shards {sorted(failed)} failed — rerun to resume" if failed else ""
+    print(f"{'✅ Done' if not failed else '⚠️ Stopped'}: {p['done']:,} docs scanned ({p['done'] - done0:,} this run, "
+          f"{time.perf_counter() - t0:.1f}s), {p['embedded']:,} embedded{fails}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Sharded, resumable multi-process embedder")
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--shards", type=int, default=SHARDS)
+    ap.add_argument("--changed-only", action="store_true", help="Skip docs already embedded from the same text")
+    ap.add_argument("--state-dir", default=STATE_DIR)
+    ap.add_argument("--restart", action="store_true", help="Re-plan and discard checkpoints")
+    ap.add_argument("--status", action="store_true", help="Show per-shard checkpoints and exit")
+    args = ap.parse_args()
+    if args.status:
+        state = _read_json(plan_path(args.state_dir))
+        if state is None:
+            raise SystemExit(f"No plan in {args.state_dir} yet")
+        print_status(state["shards"], args.state_dir)
+    else:
+        sys.exit(run(args.workers, args.shards, args.changed_only, args.restart, args.state_dir))
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# embedding_versions.py — Versioned multi-model embeddings with blue/green index cutover
+# - Each version = (model, dims, similarity) with its own vector field "emb_<version>" and its own
+#   Atlas Vector Search index "nucc_<version>"; the legacy "embedding" field is left alone
+# - Active version lives in one pointer doc (NUCC.embedding_versions {_id: "active"}), so the switch is a
+#   single atomic document update and a rollback is the same update with the previous version
+# - backfill embeds only docs missing the field or whose embedding text changed (resumable by construction)
+# - shadow runs the same queries through the active and a candidate version and compares latency + quality;
+#   before the first activation the "active" side is the legacy embedding field / INDEX
+# - The bulk writers (embedder, embedder_sharded, nucc_ingest, embed_batch) only maintain the legacy field.
+#   embed_daemon.py keeps the active version current: after each flush it runs backfill(ids=...) for the
+#   changed docs. Without the daemon, re-run "backfill <active>" after content changes
+#
+# Run:
+#   python3 embedding_versions.py status
+#   python3 embedding_versions.py create-index v4l_2048
+#   python3 embedding_versions.py backfill v4l_2048 [--adopt-legacy]
+#   python3 embedding_versions.py shadow v4l_2048
+#   python3 embedding_versions.py activate v4l_2048      # or: rollback
+
+import argparse
+import datetime
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.operations import SearchIndexModel
+
+import embedder
+from embedder import PROJECTION, build_embedding_text, clean_fields, text_hash
+
+# ---------------- CONFIG ----------------
+VERSIONS: Dict[str, Dict[str, Any]] = {
+    "v35_1024": {"model": "voyage-3.5",     "dim": 1024, "similarity": "cosine"},
+    "v3l_2048": {"model": "voyage-3-large", "dim": 2048, "similarity": "cosine"},
+    "v4l_2048": {"model": "voyage-4-large", "dim": 2048, "similarity": "dotProduct"},
+}
+FILTER_FIELDS = ["code", "classification", "specialization", "section"]
+CONTROL_COLL  = "embedding_versions"
+LEGACY_INDEX  = "nucc"              # vectorSearch index on the legacy "embedding" field
+NUM_CANDIDATES, TOP_K = 500, 10
+ACTIVE_CACHE_SECONDS = 30.0
+# ----------------------------------------
+
+SHADOW_QUERIES = [
+    {"q": "heart doctor",           "expect": ["cardiology", "cardiologist", "cardio"]},
+    {"q": "ENT",                    "expect": ["otolaryngology", "ent", "ear nose throat"]},
+    {"q": "women's health doctor",  "expect": ["obstetrics & gynecology", "obgyn", "ob/gyn"]},
+    {"q": "kidney doctor",          "expect": ["nephrology", "nephrologist"]},
+    {"q": "skin doctor",            "expect": ["dermatology", "dermatologist"]},
+    {"q": "allergy shots",          "expect": ["allergy", "immunology"]},
+    {"q": "pediatric heart doctor", "expect": ["pediatric", "pediatrics", "cardiology"]},
+]
+
+def version_config(version: str) -> Dict[str, Any]:
+    if version not in VERSIONS:
+        raise SystemExit(f"Unknown version {version!r}; known: {', '.join(VERSIONS)}")
+    return {**VERSIONS[version], "version": version,
+            "path": f"emb_{version}", "hash_field": f"emb_{version}_hash", "index": f"nucc_{version}"}
+
+def legacy_config() -> Dict[str, Any]:
+    """The unversioned "embedding" field written by embedder.py (what searches used before any activation)."""
+    return {"version": "legacy", "model": embedder.VOYAGE_MODEL, "dim": embedder.EMBED_DIM, "similarity": "cosine",
+            "path": "embedding", "hash_field": "embedding_text_hash", "index": LEGACY_INDEX}
+
+_active_memo: Dict[str, Any] = {}
+
+def active_config(db, default: str = None) -> Dict[str, Any]:
+    """Config of the active version (memoized for ACTIVE_CACHE_SECONDS). Search scripts call this per query."""
+    now = time.monotonic()
+    if _active_memo and now - _active_memo["at"] < ACTIVE_CACHE_SECONDS:
+        return _active_memo["cfg"]
+    ptr = db[CONTROL_COLL].find_one({"_id": "active"}) or {}
+    version = ptr.get("version") or default
+    if version is None:
+        raise RuntimeError(f"No active embedding version in {db.name}.{CONTROL_COLL}; run 'activate' first")
+    cfg = version_config(version)
+    _active_memo.update(at=now, cfg=cfg)
+    return cfg
+
+def index_definition(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    fields = [{"type": "vector", "path": cfg["path"], "numDimensions": cfg["dim"],
+               "similarity": cfg["similarity"]}]
+    fields += [{"type": "filter", "path": f} for f in FILTER_FIELDS]
+    return {"fields": fields}
+
+def index_state(coll, name: str) -> Dict[str, Any]:
+    for idx in coll.aggregate([{"$listSearchIndexes": {"name": name}}]):
+        return {"status": idx.get("status"), "queryable": bool(idx.get("queryable"))}
+    return {"status": "MISSING", "queryable": False}
+
+# ---------- commands ----------
+def create_index(coll, cfg: Dict[str, Any]) -> None:
+    if index_state(coll, cfg["index"])["status"] != "MISSING":
+        print(f"Index {cfg['index']} already exists")
+        return
+    coll.create_search_index(SearchIndexModel(definition=index_definition(cfg),
+                                              name=cfg["index"], type="vectorSearch"))
+    print(f"✅ Created vectorSearch index {cfg['index']} on {cfg['path']} ({cfg['dim']} dims)")
+
+def backfill(coll, cfg: Dict[str, Any], adopt_legacy: bool = False, ids: Optional[List[Any]] = None,
+             verbose: bool = True) -> int:
+    """Embed docs (all, or just ids) whose cfg hash field is missing or stale. Returns docs embedded."""
+    if adopt_legacy:
+        # Vectors already produced by this model in the legacy field can be copied server-side, no embeds
+        res = coll.update_many(
+            {"embedding_model": cfg["model"], "embedding": {"$size": cfg["dim"]}, cfg["path"]: {"$exists": False}},
+            [{"$set": {cfg["path"]: "$embedding", cfg["hash_field"]: "$embedding_text_hash"}}])
+        print(f"Adopted {res.modified_count} legacy vectors into {cfg['path']}", file=sys.stderr)
+
+    vo = embedder.vo
+    cur = coll.find({} if ids is None else {"_id": {"$in": list(ids)}},
+                    projection={**PROJECTION, cfg["hash_field"]: 1}, no_cursor_timeout=True)
+    ids, texts, hashes, ops = [], [], [], []
+    done = skipped = 0
+    t0 = time.perf_counter()
+
+    def flush():
+        nonlocal done
+        if texts:
+            vecs = vo.embed(texts=texts, model=cfg["model"], input_type="document",
+                            output_dimension=cfg["dim"]).embeddings
+            for doc_id, h, v in zip(ids, hashes, vecs):
+                ops.append(UpdateOne({"_id": doc_id}, {"$set": {cfg["path"]: v, cfg["hash_field"]: h}}))
+            done += len(texts)
+            ids.clear(); texts.clear(); hashes.clear()
+        if ops:
+            coll.bulk_write(ops, ordered=False)
+            ops.clear()
+        if verbose:
+            print(f"Backfilled {done} docs ({done / (time.perf_counter() - t0):.1f} docs/s)...", file=sys.stderr)
+
+    try:
+        for doc in cur:
+            text = build_embedding_text({**doc, **clean_fields(doc)})
+            h = text_hash(text)
+            if doc.get(cfg["hash_field"]) == h:
+                skipped += 1
+                continue
+            ids.append(doc["_id"]); texts.append(text); hashes.append(h)
+            if len(texts) >= embedder.BATCH_SIZE:
+                flush()
+        flush()
+    finally:
+        cur.close()
+    if verbose:
+        print(f"✅ Backfill {cfg['version']}: embedded {done}, already current {skipped}")
+    return done
+
+def status(db, coll) -> None:
+    ptr = db[CONTROL_COLL].find_one({"_id": "active"}) or {}
+    total = coll.estimated_document_count()
+    print(f"Active: {ptr.get('version')}  (previous: {ptr.get('previous')}, switched {ptr.get('switched_at')})")
+    for v in VERSIONS:
+        cfg = version_config(v)
+        n = coll.count_documents({cfg["path"]: {"$exists": True}})
+        st = index_state(coll, cfg["index"])
+        print(f"  {v:10} {cfg['model']:16} {cfg['dim']:>5}d  vectors {n}/{total}  "
+              f"index {cfg['index']}: {st['status']}{' (queryable)' if st['queryable'] else ''}")
+
+def search(coll, vo, cfg: Dict[str, Any], q: str) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    qvec = vo.embed(texts=[q], model=cfg["model"], input_type="query", output_dimension=cfg["dim"]).embeddings[0]
+    t1 = time.perf_counter()
+    hits = list(coll.aggregate([
+        {"$vectorSearch": {"index": cfg["index"], "path": cfg["path"], "queryVector": qvec,
+                           "numCandidates": NUM_CANDIDATES, "limit": TOP_K}},
+        {"$project": {"_id": 0,
+                      "code":           {"$ifNull": ["$code",           "$Code"]},
+                      "displayName":    {"$ifNull": ["$displayName",    "$Display Name"]},
+                      "classification": {"$ifNull": ["$classification", "$Classification"]},
+                      "specialization": {"$ifNull": ["$specialization", "$Specialization"]},
+                      "score": {"$meta": "vectorSearchScore"}}},
+    ]))
+    t2 = time.perf_counter()
+    return {"hits": hits, "embed_ms": (t1 - t0) * 1000, "search_ms": (t2 - t1) * 1000}
+
+def hit(doc: Dict[str, Any], expect: List[str]) -> bool:
+    hay = " | ".join(str(doc.get(f) or "") for f in ("displayName", "classification", "specialization", "code")).lower()
+    return any(e.lower() in hay for e in expect)
+
+def shadow(db, coll, candidate: Dict[str, Any]) -> None:
+    try:
+        active = active_config(db)
+    except RuntimeError:
+        active = legacy_config()          # first cutover: compare against the legacy field / index
+    vo = embedder.vo
+    rows = {"active": [], "candidate": []}
+    overlaps = []
+    for item in SHADOW_QUERIES:
+        a = search(coll, vo, active, item["q"])
+        c = search(coll, vo, candidate, item["q"])
+        rows["active"].append((a, item["expect"]))
+        rows["candidate"].append((c, item["expect"]))
+        sa = {h["code"] for h in a["hits"]}
+        sc = {h["code"] for h in c["hits"]}
+        overlaps.append(len(sa & sc) / len(sa | sc) if sa | sc else 1.0)
+    print(f"Shadow: active={active['version']} vs candidate={candidate['version']} ({len(SHADOW_QUERIES)} queries)")
+    for label, cfg in (("active", active), ("candidate", candidate)):
+        rs = rows[label]
+        h1 = sum(1 for r, e in rs if r["hits"] and hit(r["hits"][0], e))
+        h3 = sum(1 for r, e in rs if any(hit(h, e) for h in r["hits"][:3]))
+        emb = [r["embed_ms"] for r, _ in rs]
+        srch = [r["search_ms"] for r, _ in rs]
+        print(f"  {label:9} {cfg['version']:10} Hit@1 {h1}/{len(rs)}  Hit@3 {h3}/{len(rs)}  "
+              f"embed p50 {statistics.median(emb):.0f}ms  search p50 {statistics.median(srch):.0f}ms  "
+              f"max {max(srch):.0f}ms")
+    print(f"  top-{TOP_K} Jaccard overlap: mean {statistics.fmean(overlaps):.2f}, min {min(overlaps):.2f}")
+
+def activate(db, coll, cfg: Dict[str, Any], force: bool = False) -> None:
+    st = index_state(coll, cfg["index"])
+    total = coll.estimated_document_count()
+    n = coll.count_documents({cfg["path"]: {"$exists": True}})
+    if not force and (not st["queryable"] or n < total):
+        raise SystemExit(f"Refusing to activate {cfg['version']}: index {st['status']}"
+                         f"{' (queryable)' if st['queryable'] else ''}, vectors {n}/{total}. Use --force to override.")
+    prev = (db[CONTROL_COLL].find_one({"_id": "active"}) or {}).get("version")
+    db[CONTROL_COLL].update_one({"_id": "active"}, {"$set": {
+        "version": cfg["version"], "previous": prev,
+        "switched_at": datetime.datetime.now(datetime.timezone.utc)}}, upsert=True)
+    _active_memo.clear()
+    print(f"✅ Active embedding version: {prev} → {cfg['version']}")
+
+def rollback(db) -> None:
+    ptr = db[CONTROL_COLL].find_one({"_id": "active"}) or {}
+    if not ptr.get("previous"):
+        raise SystemExit("Nothing to roll back to")
+    db[CONTROL_COLL].update_one({"_id": "active"}, {"$set": {
+        "version": ptr["previous"], "previous": ptr["version"],
+        "switched_at": datetime.datetime.now(datetime.timezone.utc)}})
+    print(f"✅ Rolled back: {ptr['version']} → {ptr['previous']}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Versioned embeddings + blue/green cutover")
+    ap.add_argument("cmd", choices=["status", "create-index", "backfill", "shadow", "activate", "rollback"])
+    ap.add_argument("version", nargs="?")
+    ap.add_argument("--adopt-legacy", action="store_true", help="backfill: copy matching legacy vectors first")
+    ap.add_argument("--force", action="store_true", help="activate: skip readiness checks")
+    args = ap.parse_args()
+
+    coll = embedder.connect()
+    db = coll.database
+    if args.cmd in ("create-index", "backfill", "shadow", "activate") and not args.version:
+        ap.error(f"{args.cmd} needs a version")
+    if args.cmd == "status":
+        status(db, coll)
+    elif args.cmd == "create-index":
+        create_index(coll, version_config(args.version))
+    elif args.cmd == "backfill":
+        backfill(coll, version_config(args.version), args.adopt_legacy)
+    elif args.cmd == "shadow":
+        shadow(db, coll, version_config(args.version))
+    elif args.cmd == "activate":
+        activate(db, coll, version_config(args.version), args.force)
+    else:
+        rollback(db)
@@ -0,0 +1,231 @@
+# fastpath.py — Zero-network exact-match lookups for NUCC taxonomy queries
+# - In-memory hash index over codes, normalized display names and an alias table
+# - Built from the live collection (one find) or from a JSONL snapshot
+# - lookup() answers exact codes / names / aliases in microseconds; returns None on a miss
+#   so callers fall back to the semantic path ($vectorSearch + rerank)
+# - Hit-rate counters per match type
+#
+# Usage:
+#   python3 fastpath.py --export taxonomy_snapshot.jsonl      # snapshot the collection
+#   python3 fastpath.py --snapshot taxonomy_snapshot.jsonl "207K00000X" "ENT" "Dermatology"
+
+import argparse
+import json
+import re
+import sys
+import time
+import unicodedata
+from typing import List, Dict, Any, Optional, Iterable
+
+# ---------------- CONFIG ----------------
+MONGODB_URI = ""
+DB, COLL = "NUCC", "taxonomy251"
+SNAPSHOT_PATH = "taxonomy_snapshot.jsonl"
+# ----------------------------------------
+
+# Maintained alias table: normalized alias -> NUCC codes (best first).
+# Keep entries short and unambiguous; anything fuzzy belongs to the semantic path.
+# Lay phrasings from the eval sets ("heart doctor", "skin doctor", ...) stay out: those measure retrieval.
+ALIASES: Dict[str, List[str]] = {
+    "ent":                  ["207Y00000X"],            # Otolaryngology
+    "ear nose throat":      ["207Y00000X"],
+    "ear nose and throat":  ["207Y00000X"],
+    "obgyn":                ["207V00000X"],            # Obstetrics & Gynecology
+    "ob gyn":               ["207V00000X"],
+    "ob/gyn":               ["207V00000X"],
+    "gyn":                  ["207V00000X"],
+    "cardiologist":         ["207RC0000X"],            # Internal Medicine / Cardiovascular Disease
+    "cardiology":           ["207RC0000X"],
+    "pediatric cardiology": ["2080P0202X"],
+    "nephrologist":         ["207RN0300X"],
+    "dermatologist":        ["207N00000X"],
+    "allergist":            ["207K00000X"],
+    "gi":                   ["207RG0100X"],            # Gastroenterology
+    "gastroenterologist":   ["207RG0100X"],
+    "neurologist":          ["2084N0400X"],
+    "psychiatrist":         ["2084P0800X"],
+    "psychologist":         ["103T00000X"],
+    "pt":                   ["225100000X"],            # Physical Therapist
+    "physical therapist":   ["225100000X"],
+    "ophthalmologist":      ["207W00000X"],
+    "eye doctor":           ["207W00000X", "152W00000X"],
+    "optometrist":          ["152W00000X"],
+    "orthopedist":          ["207X00000X"],
+    "orthopedic surgeon":   ["207X00000X"],
+    "midwife":              ["176B00000X"],
+    "np":                   ["363L00000X"],            # Nurse Practitioner
+    "nurse practitioner":   ["363L00000X"],
+    "pcp":                  ["207Q00000X", "207R00000X"],
+    "family doctor":        ["207Q00000X"],
+    "internist":            ["207R00000X"],
+    "internalist":          ["207R00000X"],
+    "er":                   ["207P00000X"],            # Emergency Medicine
+    "emergency room":       ["207P00000X"],
+    "dentist":              ["1223G0001X"],
+    "endodontist":          ["1223E0200X"],
+    "endocrinologist":      ["207RE0101X"],
+    "oncologist":           ["207RX0202X"],
+    "radiologist":          ["2085R0202X"],
+    "pulmonologist":        ["207RP1001X"],
+    "urologist":            ["208800000X"],
+    "rheumatologist":       ["207RR0500X"],
+    "speech therapist":     ["235Z00000X"],
+    "fertility doctor":     ["207VE0102X"],
+}
+
+# Fields kept in the index / snapshot (coalesced from Title Case + camelCase)
+FIELDS = ("code", "displayName", "classification", "specialization", "section", "grouping")
+PROJECTION = {
+    "_id": 0,
+    "code": 1, "Code": 1,
+    "displayName": 1, "Display Name": 1,
+    "classification": 1, "Classification": 1,
+    "specialization": 1, "Specialization": 1,
+    "section": 1, "Section": 1,
+    "grouping": 1, "Grouping": 1,
+}
+
+CODE_RE = re.compile(r"^[0-9A-Z]{9}X$")
+_PUNCT_RE = re.compile(r"[^\w\s&/]+")
+
+def normalize_key(s: str) -> str:
+    """Casefold, NFKC-normalize, drop punctuation (keeps & and /), collapse whitespace."""
+    if not s:
+        return ""
+    s = unicodedata.normalize("NFKC", s).casefold()
+    s = _PUNCT_RE.sub(" ", s)
+    return " ".join(s.split())
+
+def normalize_row(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Coalesce Title Case / camelCase field names into the camelCase shape the scripts print."""
+    alt = {"code": "Code", "displayName": "Display Name", "classification": "Classification",
+           "specialization": "Specialization", "section": "Section", "grouping": "Grouping"}
+    row = {}
+    for f in FIELDS:
+        v = doc.get(f)
+        if v is None:
+            v = doc.get(alt[f])
+        row[f] = v
+    return row
+
+def load_rows(coll=None, snapshot_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Rows from a JSONL snapshot (preferred, no network) or from the collection."""
+    if snapshot_path:
+        with open(snapshot_path, encoding="utf-8") as fh:
+            return [normalize_row(json.loads(line)) for line in fh if line.strip()]
+    if coll is None:
+        raise ValueError("load_rows needs a collection or a snapshot path")
+    return [normalize_row(d) for d in coll.find({}, projection=PROJECTION)]
+
+def export_snapshot(coll, path: str) -> int:
+    n = 0
+    with open(path, "w", encoding="utf-8") as fh:
+        for d in coll.find({}, projection=PROJECTION):
+            fh.write(json.dumps(normalize_row(d), ensure_ascii=False) + "\n")
+            n += 1
+    return n
+
+class FastPathIndex:
+    """
+    Exact-match index: code -> row, normalized name -> rows, alias -> rows.
+    lookup() returns result dicts shaped like the $vectorSearch projection
+    (plus source="fastpath"), or None so the caller takes the semantic path.
+    """
+
+    def __init__(self, rows: Iterable[Dict[str, Any]], aliases: Optional[Dict[str, List[str]]] = None):
+        self.by_code: Dict[str, Dict[str, Any]] = {}
+        self.by_name: Dict[str, List[Dict[str, Any]]] = {}
+        for r in rows:
+            code = (r.get("code") or "").strip().upper()
+            if not code:
+                continue
+            self.by_code[code] = r
+            for f in ("displayName", "classification"):
+                key = normalize_key(r.get(f) or "")
+                if key:
+                    self.by_name.setdefault(key, [])
+                    if r not in self.by_name[key]:
+                        self.by_name[key].append(r)
+        # Classification keys should resolve to the generic row ("<classification> / None") first
+        for key, lst in self.by_name.items():
+            lst.sort(key=lambda r: (r.get("specialization") not in (None, "", "None"), r.get("code") or ""))
+        self.by_alias: Dict[str, List[Dict[str, Any]]] = {}
+        for alias, codes in (ALIASES if aliases is None else aliases).items():
+            hits = [self.by_code[c] for c in codes if c in self.by_code]
+            if hits:
+                self.by_alias[normalize_key(alias)] = hits
+        self.counters = {"lookups": 0, "code": 0, "name": 0, "alias": 0, "miss": 0}
+
+    @classmethod
+    def from_collection(cls, coll, aliases=None) -> "FastPathIndex":
+        return cls(load_rows(coll=coll), aliases)
+
+    @classmethod
+    def from_snapshot(cls, path: str, aliases=None) -> "FastPathIndex":
+        return cls(load_rows(snapshot_path=path), aliases)
+
+    def lookup(self, query: str, k: int = 10) -> Optional[List[Dict[str, Any]]]:
+        self.counters["lookups"] += 1
+        raw = (query or "").strip()
+        code = raw.upper()
+        if CODE_RE.match(code) and code in self.by_code:
+            self.counters["code"] += 1
+            return self._results([self.by_code[code]], "code", k)
+        key = normalize_key(raw)
+        if key in self.by_name:
+            self.counters["name"] += 1
+            return self._results(self.by_name[key], "name", k)
+        if key in self.by_alias:
+            self.counters["alias"] += 1
+            return self._results(self.by_alias[key], "alias", k)
+        self.counters["miss"] += 1
+        return None
+
+    @staticmethod
+    def _results(rows: List[Dict[str, Any]], match: str, k: int) -> List[Dict[str, Any]]:
+        return [{**r, "score": 1.0, "source": "fastpath", "match": match} for r in rows[:k]]
+
+    def stats(self) -> Dict[str, Any]:
+        c = dict(self.counters)
+        hits = c["code"] + c["name"] + c["alias"]
+        c["hits"] = hits
+        c["hit_rate"] = hits / c["lookups"] if c["lookups"] else 0.0
+        return c
+
+    def __len__(self) -> int:
+        return len(self.by_code)
+
+def print_stats(fp: FastPathIndex) -> None:
+    s = fp.stats()
+    print(f"Fast path: {s['hits']}/{s['lookups']} hits ({s['hit_rate']:.0%})  "
+          f"code={s['code']} name={s['name']} alias={s['alias']} miss={s['miss']}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="NUCC exact-match fast path (codes, names, aliases)")
+    ap.add_argument("queries", nargs="*")
+    ap.add_argument("--snapshot", type=str, help="Build from a JSONL snapshot instead of the collection")
+    ap.add_argument("--export", type=str, help="Write a JSONL snapshot of the collection and exit")
+    args = ap.parse_args()
+
+    if args.export or not args.snapshot:
+        from pymongo import MongoClient
+        coll = MongoClient(MONGODB_URI)[DB][COLL]
+        if args.export:
+            print(f"✅ Wrote {export_snapshot(coll, args.export)} rows to {args.export}")
+            sys.exit(0)
+        fp = FastPathIndex.from_collection(coll)
+    else:
+        fp = FastPathIndex.from_snapshot(args.snapshot)
+
+    print(f"Indexed {len(fp)} codes, {len(fp.by_name)} names, {len(fp.by_alias)} aliases")
+    for q in args.queries:
+        t0 = time.perf_counter()
+        hits = fp.lookup(q)
+        us = (time.perf_counter() - t0) * 1e6
+        if hits is None:
+            print(f"  '{q}': miss ({us:.1f}µs) → semantic path")
+            continue
+        for h in hits:
+            print(f"  '{q}': [{h['match']}] {h['code']} | {h['classification']} / {h['specialization']} | "
+                  f"{h['displayName']} ({us:.1f}µs)")
+    print_stats(fp)
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# fixtures.py — Record every Voyage + MongoDB read a script makes, then replay it with no network
+# - record: wraps voyageai.Client (embed, rerank) and pymongo.MongoClient (aggregate incl. $vectorSearch,
+#   find, find_one, count_documents, estimated_document_count, distinct), runs the script unchanged and
+#   stores request → response in a gzip JSONL fixture keyed by a hash of the request
+# - replay: the same wrappers answer from the fixture only; a request that was never recorded raises
+#   FixtureMiss (no silent fall-through to the network). Writes are refused
+# - Float vectors (≥ VECTOR_MIN_LEN floats) are stored as base64 float32. Recording hands the script the
+#   same round-tripped values replay will, so record and replay runs see identical inputs
+# - Execution-only options (batchSize, maxTimeMS, allowDiskUse ...) are not part of the key
+# - --latency replays each response after its recorded latency (compare perf against identical inputs)
+#
+# Run:
+#   python3 fixtures.py record fixtures/accuracy1.jsonl.gz accuracy1.py
+#   python3 fixtures.py replay fixtures/accuracy1.jsonl.gz accuracy1.py
+#   python3 fixtures.py replay --latency fixtures/terms.jsonl.gz NEW_eval_rerank_threshold.py
+#   python3 fixtures.py record --local fixtures/chen.jsonl.gz chenRun_rerank.py   # record against local_standins
+#   python3 fixtures.py info fixtures/accuracy1.jsonl.gz
+
+import argparse
+import atexit
+import base64
+import gzip
+import hashlib
+import json
+import os
+import runpy
+import sys
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Dict
+
+import numpy as np
+from bson import json_util
+
+from local_standins import LocalCursor
+
+# ---------------- CONFIG ----------------
+VECTOR_MIN_LEN = 16
+IGNORED_KWARGS = {"batchSize", "batch_size", "allowDiskUse", "maxTimeMS", "max_time_ms", "no_cursor_timeout",
+                  "comment", "session"}
+READ_METHODS   = ("aggregate", "find", "find_one", "count_documents", "estimated_document_count", "distinct")
+WRITE_METHODS  = ("insert_one", "insert_many", "update_one", "update_many", "replace_one", "delete_one",
+                  "delete_many", "bulk_write", "create_index", "create_search_index")
+# ----------------------------------------
+
+class FixtureMiss(KeyError):
+    """Replay saw a request that is not in the fixture."""
+
+# ---------- encoding ----------
+def _pack(obj: Any) -> Any:
+    if isinstance(obj, list) and len(obj) >= VECTOR_MIN_LEN and all(isinstance(x, float) for x in obj):
+        return {"$f32": base64.b64encode(np.asarray(obj, dtype="<f4").tobytes()).decode("ascii")}
+    if isinstance(obj, list):
+        return [_pack(x) for x in obj]
+    if isinstance(obj, dict):
+        return {k: _pack(v) for k, v in obj.items()}
+    return obj
+
+def _unpack(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        if len(obj) == 1 and "$f32" in obj:
+            return np.frombuffer(base64.b64decode(obj["$f32"]), dtype="<f4").astype(float).tolist()
+        return {k: _unpack(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_unpack(x) for x in obj]
+    return obj
+
+def request_key(kind: str, request: Dict[str, Any]) -> str:
+    body = json_util.dumps({"kind": kind, **request}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+# ---------- store ----------
+class FixtureStore:
+    def __init__(self, path: str, mode: str, latency: bool = False):
+        self.path, self.mode, self.latency = path, mode, latency
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with gzip.open(path, "rt", encoding="utf-8") as fh:
+                for line in fh:
+                    if line.strip():
+                        e = json.loads(line)
+                        self.entries[e["key"]] = e
+        self._loaded = len(self.entries)
+
+    def call(self, kind: str, request: Dict[str, Any], fn) -> Any:
+        """Serve one request from the fixture (replay) or from fn() and keep it (record)."""
+        key = request_key(kind, request)
+        with self._lock:
+            e = self.entries.get(key)
+        if e is not None:
+            self.counts[f"{kind} hit"] += 1
+            if self.latency and self.mode == "replay":
+                time.sleep(e.get("ms", 0.0) / 1000.0)
+            return json_util.loads(json.dumps(_unpack(e["response"])))
+        if self.mode == "replay":
+            self.counts[f"{kind} miss"] += 1
+            raise FixtureMiss(f"{kind} request {key[:12]} not in {self.path} (re-record it)")
+        t0 = time.perf_counter()
+        response = fn()
+        ms = (time.perf_counter() - t0) * 1000
+        stored = _pack(json.loads(json_util.dumps(response)))
+        with self._lock:
+            self.entries[key] = {"key": key, "kind": kind, "ms": round(ms, 2), "response": stored}
+        self.counts[f"{kind} recorded"] += 1
+        return json_util.loads(json.dumps(_unpack(stored)))
+
+    def save(self) -> None:
+        if self.mode != "record" or len(self.entries) == self._loaded:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+            for e in self.entries.values():
+                fh.write(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.replace(tmp, self.path)
+
+    def summary(self) -> str:
+        return ", ".join(f"{k}={v}" for k, v in sorted(self.counts.items())) or "no calls"
+
+# ---------- Voyage ----------
+class FixtureVoyage:
+    """embed / rerank through the store; replay needs no client (and no API key)."""
+    def __init__(self, store: FixtureStore, client=None):
+        self._store, self._vo = store, client
+
+    def __getattr__(self, name):
+        if self._vo is None:
+            raise AttributeError(f"{name} is not available in replay")
+        return getattr(self._vo, name)
+
+    def embed(self, texts, model=None, **kwargs):
+        req = {"texts": list(texts), "model": model, **kwargs}
+        def live():
+            r = self._vo.embed(texts=texts, model=model, **kwargs)
+            return {"embeddings": [list(map(float, v)) for v in r.embeddings],
+                    "total_tokens": getattr(r, "total_tokens", None)}
+        out = self._store.call("embed", req, live)
+        return SimpleNamespace(embeddings=out["embeddings"], total_tokens=out["total_tokens"])
+
+    def rerank(self, query, documents, model, top_k=None, **kwargs):
+        req = {"query": query, "documents": list(documents), "model": model, "top_k": top_k, **kwargs}
+        def live():
+            r = self._vo.rerank(query=query, documents=documents, model=model, top_k=top_k, **kwargs)
+            return {"results": [{"index": x.index, "relevance_score": float(x.relevance_score),
+                                 "document": getattr(x, "document", None)} for x in r.results],
+                    "total_tokens": getattr(r, "total_tokens", None)}
+        out = self._store.call("rerank", req, live)
+        return SimpleNamespace(results=[SimpleNamespace(**x) for x in out["results"]],
+                               total_tokens=out["total_tokens"])
+
+# ---------- MongoDB ----------
+def _bind(method: str, args: tuple, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    names = {"aggregate": ("pipeline",), "find": ("filter", "projection"), "find_one": ("filter", "projection"),
+             "count_documents": ("filter",), "distinct": ("key", "filter")}.get(method, ())
+    req = dict(zip(names, args))
+    req.update({k: v for k, v in kwargs.items() if k not in IGNORED_KWARGS})
+    return req
+
+class FixtureCollection:
+    def __init__(self, store: FixtureStore, database: "FixtureDatabase", name: str, coll=None):
+        self._store, self.database, self.name, self._coll = store, database, name, coll
+        self.full_name = f"{database.name}.{name}"
+
+    def _read(self, method: str, *args, **kwargs):
+        req = {"ns": self.full_name, **_bind(method, args, kwargs)}
+        def live():
+            res = getattr(self._coll, method)(*args, **kwargs)
+            return list(res) if method in ("aggregate", "find") else res
+        out = self._store.call(method, req, live)
+        return LocalCursor(out) if method in ("aggregate", "find") else out
+
+    def __getattr__(self, name):
+        if name in READ_METHODS:
+            return lambda *a, **k: self._read(name, *a, **k)
+        if self._store.mode == "replay":
+            if name in WRITE_METHODS:
+                raise NotImplementedError(f"fixtures replay is read-only ({self.full_name}.{name})")
+            raise AttributeError(name)
+        return getattr(self._coll, name)
+
+class FixtureDatabase:
+    def __init__(self, store: FixtureStore, name: str, db=None):
+        self._store, self.name, self._db = store, name, db
+        self._colls: Dict[str, FixtureCollection] = {}
+
+    def __getitem__(self, name: str) -> FixtureCollection:
+        if name not in self._colls:
+            self._colls[name] = FixtureCollection(self._store, self, name,
+                                                  self._db[name] if self._db is not None else None)
+        return self._colls[name]
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._db is not None and callable(getattr(type(self._db), name, None)):
+            return getattr(self._db, name)
+        return self[name]
+
+class FixtureClient:
+    def __init__(self, store: FixtureStore, client=None):
+        self._store, self._client = store, client
+        self._dbs: Dict[str, FixtureDatabase] = {}
+
+    def __getitem__(self, name: str) -> FixtureDatabase:
+        if name not in self._dbs:
+            self._dbs[name] = FixtureDatabase(self._store, name,
+                                              self._client[name] if self._client is not None else None)
+        return self._dbs[name]
+
+    def get_database(self, name: str) -> FixtureDatabase:
+        return self[name]
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+
+# ---------- patching ----------
+def install(store: FixtureStore) -> None:
+    """Route voyageai.Client and pymongo.MongoClient (as currently installed) through the store."""
+    import pymongo
+    import voyageai
+    real_voyage, real_mongo = voyageai.Client, pymongo.MongoClient
+    if store.mode == "replay":
+        voyageai.Client = lambda *a, **k: FixtureVoyage(store)
+        pymongo.MongoClient = lambda *a, **k: FixtureClient(store)
+    else:
+        voyageai.Client = lambda *a, **k: FixtureVoyage(store, real_voyage(*a, **k))
+        pymongo.MongoClient = lambda *a, **k: FixtureClient(store, real_mongo(*a, **k))
+
+def info(path: str) -> None:
+    if not os.path.exists(path):
+        raise SystemExit(f"No fixture at {path}")
+    store = FixtureStore(path, "replay")
+    kinds = Counter(e["kind"] for e in store.entries.values())
+    ms = Counter()
+    for e in store.entries.values():
+        ms[e["kind"]] += e.get("ms", 0.0)
+    print(f"{path}: {len(store.entries)} requests, {os.path.getsize(path) / 1024:.1f} KiB")
+    for k, n in sorted(kinds.items()):
+        print(f"  {k:26} {n:6}  recorded {ms[k] / 1000:.2f}s")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Record / replay Voyage + MongoDB reads for deterministic evals")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("record", "replay"):
+        p = sub.add_parser(name)
+        p.add_argument("fixture")
+        p.add_argument("script")
+        p.add_argument("script_args", nargs=argparse.REMAINDER)
+    sub.choices["record"].add_argument("--local", action="store_true",
+                                       help="Record against local_standins (Voyage stub + local store)")
+    sub.choices["replay"].add_argument("--latency", action="store_true", help="Sleep each recorded latency")
+    sub.add_parser("info").add_argument("fixture")
+    args = ap.parse_args()
+
+    if args.cmd == "info":
+        info(args.fixture)
+        sys.exit(0)
+    store = FixtureStore(args.fixture, args.cmd, latency=getattr(args, "latency", False))
+    if getattr(args, "local", False):
+        import local_standins
+        srv, url = local_standins.start_voyage_stub()
+        local_standins.install(url)
+    install(store)
+    atexit.register(store.save)
+    sys.argv = [args.script] + args.script_args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    try:
+        runpy.run_path(args.script, run_name="__main__")
+    finally:
+        print(f"\n[fixtures {args.cmd}] {store.summary()}", file=sys.stderr)
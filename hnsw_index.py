@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# hnsw_index.py — In-process HNSW approximate index for corpora too big for brute force
+# - Hierarchical Navigable Small World graph (Malkov & Yashunin) in numpy: M links per node on the upper
+#   layers, 2*M on layer 0, neighbor-selection heuristic, tunable M / efConstruction / efSearch
+# - Same contract as multi_search.LocalVectorIndex: search_many(qvecs, limit, where) → rows + "score" on
+#   the Atlas vectorSearchScore scale ((1 + cos) / 2), so scripts can swap one for the other
+# - Incremental: add() inserts into a built graph; "update" inserts only collection docs not yet indexed
+# - Persisted as a directory of .npy files (vectors + layer-0 links are memory-mapped on load) + rows.jsonl
+# - recall: measured Recall@k against exact search for several efSearch values, with query latency, using
+#   queries the graph has never seen: real query embeddings (--query-log, replay.py's JSONL format, embedded
+#   with embedder.py's model as input_type="query") or, for synth, HOLDOUT vectors withheld from the build
+# - Pure Python graph walk: builds run at a few hundred inserts/s, so large corpora are an offline job;
+#   queries touch O(efSearch · M · log n) vectors while exact search grows with n
+#
+# Run:
+#   python3 hnsw_index.py build taxonomy.hnsw                      # embedder's collection, "embedding" field
+#   python3 hnsw_index.py update taxonomy.hnsw                     # insert docs added since the build
+#   python3 hnsw_index.py recall taxonomy.hnsw --query-log query_log.jsonl --ef-search 16 32 64 128
+#   python3 hnsw_index.py synth synth.hnsw --n 50000 --dim 256     # random clustered corpus for scale tests
+#   python3 hnsw_index.py recall synth.hnsw                        # synth's held-out vectors
+
+import argparse
+import heapq
+import json
+import math
+import os
+import shutil
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from fastpath import FIELDS, PROJECTION, normalize_row
+
+# ---------------- CONFIG ----------------
+M               = 16
+EF_CONSTRUCTION = 100
+EF_SEARCH       = 64
+SEED            = 42
+HOLDOUT         = 200         # synth: vectors withheld from the graph as recall queries
+HOLDOUT_FILE    = "holdout.npy"
+# ----------------------------------------
+
+class HNSWIndex:
+    def __init__(self, dim: int, m: int = M, ef_construction: int = EF_CONSTRUCTION, ef_search: int = EF_SEARCH,
+                 similarity: str = "cosine", capacity: int = 1024, seed: int = SEED):
+        if similarity not in ("cosine", "dotProduct"):
+            raise ValueError(f"HNSWIndex supports cosine / dotProduct, not {similarity}")
+        self.dim, self.m, self.ef_construction, self.ef_search = dim, m, ef_construction, ef_search
+        self.similarity = similarity
+        self.ml = 1.0 / math.log(m)
+        self.rng = np.random.default_rng(seed)
+        self.n = 0
+        self.vecs = np.zeros((capacity, dim), dtype=np.float32)
+        self.levels = np.zeros(capacity, dtype=np.int8)
+        self.links0 = np.full((capacity, 2 * m), -1, dtype=np.int32)    # layer 0, padded with -1
+        self.upper: List[Dict[int, List[int]]] = []                    # layer l ≥ 1: node → neighbors
+        self.entry = -1
+        self.rows: List[Dict[str, Any]] = []
+
+    # ---------- storage ----------
+    def _grow(self, need: int) -> None:
+        cap = len(self.vecs)
+        if need <= cap and self.vecs.flags.writeable and self.links0.flags.writeable:
+            return
+        cap = max(need, cap * 2 if need > cap else cap)
+        for name, fill in (("vecs", 0), ("levels", 0), ("links0", -1)):
+            old = getattr(self, name)
+            new = np.full((cap,) + old.shape[1:], fill, dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def _prep(self, v: Sequence[float]) -> np.ndarray:
+        v = np.asarray(v, dtype=np.float32)
+        if self.similarity == "cosine":
+            v = v / max(float(np.linalg.norm(v)), 1e-12)
+        return v
+
+    def neighbors(self, node: int, layer: int) -> np.ndarray:
+        if layer == 0:
+            nb = self.links0[node]
+            return nb[nb >= 0]
+        return np.asarray(self.upper[layer - 1].get(node, ()), dtype=np.int64)
+
+    def _set_neighbors(self, node: int, layer: int, nbrs: List[int]) -> None:
+        if layer == 0:
+            self.links0[node] = -1
+            self.links0[node, :len(nbrs)] = nbrs
+        else:
+            self.upper[layer - 1][node] = list(nbrs)
+
+    # ---------- graph search ----------
+    def _search_layer(self, q: np.ndarray, eps: List[int], ef: int, layer: int,
+                      allowed: Optional[np.ndarray] = None) -> List[tuple]:
+        """Best-first search from eps; returns up to ef (sim, node) pairs, best first."""
+        visited = set(eps)
+        sims = self.vecs[eps] @ q
+        cand = [(-float(s), e) for s, e in zip(sims, eps)]
+        heapq.heapify(cand)
+        res: List[tuple] = []                    # min-heap of (sim, node) over admissible nodes
+        for s, e in zip(sims, eps):
+            if allowed is None or allowed[e]:
+                heapq.heappush(res, (float(s), e))
+        while len(res) > ef:
+            heapq.heappop(res)
+        while cand:
+            neg, c = heapq.heappop(cand)
+            if len(res) >= ef and -neg < res[0][0]:
+                break
+            nb = [x for x in self.neighbors(c, layer).tolist() if x not in visited]
+            if not nb:
+                continue
+            visited.update(nb)
+            for s, x in zip((self.vecs[nb] @ q).tolist(), nb):
+                if len(res) < ef or s > res[0][0]:
+                    heapq.heappush(cand, (-s, x))
+                    if allowed is None or allowed[x]:
+                        heapq.heappush(res, (s, x))
+                        if len(res) > ef:
+                            heapq.heappop(res)
+        return sorted(res, reverse=True)
+
+    def _select(self, q_sims: List[tuple], k: int) -> List[int]:
+        """Neighbor heuristic: keep a candidate only if it is closer to q than to every kept neighbor."""
+        if len(q_sims) <= k:
+            return [c for _, c in q_sims]
+        ids = [c for _, c in q_sims]
+        gram = (self.vecs[ids] @ self.vecs[ids].T).tolist()      # one matmul instead of one per candidate
+        keep: List[int] = []
+        for i, (s, _) in enumerate(q_sims):
+            if len(keep) == k:
+                break
+            row = gram[i]
+            if all(row[j] < s for j in keep):
+                keep.append(i)
+        if len(keep) < k:                        # top up with the nearest skipped ones
+            chosen = set(keep)
+            keep += [i for i in range(len(ids)) if i not in chosen][:k - len(keep)]
+        return [ids[i] for i in keep]
+
+    def _link(self, node: int, new: int, layer: int, cap: int) -> None:
+        """Back-link node → new; over capacity, re-select node's neighbors with the heuristic."""
+        cur = self.neighbors(node, layer).tolist() + [new]
+        if len(cur) > cap:
+            sims = self.vecs[cur] @ self.vecs[node]
+            cur = self._select([(float(sims[j]), cur[j]) for j in np.argsort(-sims)], cap)
+        self._set_neighbors(node, layer, cur)
+
+    # ---------- inserts ----------
+    def add(self, vectors: Sequence[Sequence[float]], rows: Optional[List[Dict[str, Any]]] = None) -> None:
+        vectors = list(vectors)
+        self._grow(self.n + len(vectors))
+        for i, v in enumerate(vectors):
+            self._insert(self._prep(v))
+            self.rows.append(rows[i] if rows is not None else {})
+
+    def _insert(self, q: np.ndarray) -> None:
+        node = self.n
+        level = int(-math.log(1.0 - self.rng.random()) * self.ml)
+        self.vecs[node], self.levels[node] = q, level
+        self.n += 1
+        while len(self.upper) < level:
+            self.upper.append({})
+        if self.entry < 0:
+            self.entry = node
+            return
+        top = int(self.levels[self.entry])
+        eps = [self.entry]
+        for layer in range(top, level, -1):
+            eps = [self._search_layer(q, eps, 1, layer)[0][1]]
+        for layer in range(min(level, top), -1, -1):
+            found = self._search_layer(q, eps, self.ef_construction, layer)
+            nbrs = self._select(found, self.m)
+            self._set_neighbors(node, layer, nbrs)
+            cap = 2 * self.m if layer == 0 else self.m
+            for nb in nbrs:
+                self._link(nb, node, layer, cap)
+            eps = [c for _, c in found]
+        if level > top:
+            self.entry = node
+
+    # ---------- queries ----------
+    def search(self, qvec: Sequence[float], k: int, ef: Optional[int] = None,
+               allowed: Optional[np.ndarray] = None) -> List[tuple]:
+        """Top-k (sim, node) for one query."""
+        if self.entry < 0:
+            return []
+        q = self._prep(qvec)
+        eps = [self.entry]
+        for layer in range(int(self.levels[self.entry]), 0, -1):
+            eps = [self._search_layer(q, eps, 1, layer)[0][1]]
+        return self._search_layer(q, eps, max(ef or self.ef_search, k), 0, allowed)[:k]
+
+    def search_many(self, qvecs: Sequence[Sequence[float]], limit: int,
+                    where: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                    ef: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        allowed = np.array([bool(where(r)) for r in self.rows[:self.n]]) if where is not None else None
+        out = []
+        for qv in qvecs:
+            hits = self.search(qv, limit, ef, allowed)
+            out.append([{**{f: self.rows[j].get(f) for f in FIELDS}, "score": self.score(s)} for s, j in hits])
+        return out
+
+    def score(self, sim: float) -> float:
+        return (1.0 + sim) / 2.0              # Atlas vectorSearchScore scale (cosine / dotProduct)
+
+    def exact(self, qvec: Sequence[float], k: int) -> List[tuple]:
+        sims = self.vecs[:self.n] @ self._prep(qvec)
+        top = np.argpartition(-sims, min(k, self.n) - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(float(sims[j]), int(j)) for j in top]
+
+    # ---------- persistence ----------
+    def save(self, path: str) -> None:
+        tmp = path.rstrip("/") + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "vectors.npy"), self.vecs[:self.n])
+        np.save(os.path.join(tmp, "levels.npy"), self.levels[:self.n])
+        np.save(os.path.join(tmp, "links0.npy"), self.links0[:self.n])
+        for l, layer in enumerate(self.upper, 1):
+            nodes = np.array(sorted(layer), dtype=np.int32)
+            nbrs = np.full((len(nodes), self.m), -1, dtype=np.int32)
+            for i, node in enumerate(nodes.tolist()):
+                nb = layer[node][:self.m]
+                nbrs[i, :len(nb)] = nb
+            np.save(os.path.join(tmp, f"layer{l}_nodes.npy"), nodes)
+            np.save(os.path.join(tmp, f"layer{l}_links.npy"), nbrs)
+        with open(os.path.join(tmp, "rows.jsonl"), "w", encoding="utf-8") as fh:
+            for r in self.rows:
+                fh.write(json.dumps(r, ensure_ascii=False, default=str) + "\n")
+        meta = {"dim": self.dim, "m": self.m, "ef_construction": self.ef_construction, "ef_search": self.ef_search,
+                "similarity": self.similarity, "n": self.n, "entry": self.entry, "layers": len(self.upper)}
+        with open(os.path.join(tmp, "meta.json"), "w") as fh:
+            json.dump(meta, fh, indent=2)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "HNSWIndex":
+        with open(os.path.join(path, "meta.json")) as fh:
+            meta = json.load(fh)
+        idx = cls(meta["dim"], meta["m"], meta["ef_construction"], meta["ef_search"], meta["similarity"], capacity=1)
+        mode = "r" if mmap else None
+        idx.vecs = np.load(os.path.join(path, "vectors.npy"), mmap_mode=mode)
+        idx.links0 = np.load(os.path.join(path, "links0.npy"), mmap_mode=mode)
+        idx.levels = np.load(os.path.join(path, "levels.npy"))
+        idx.n, idx.entry = meta["n"], meta["entry"]
+        idx.upper = []
+        for l in range(1, meta["layers"] + 1):
+            nodes = np.load(os.path.join(path, f"layer{l}_nodes.npy"))
+            links = np.load(os.path.join(path, f"layer{l}_links.npy"))
+            idx.upper.append({int(n): [int(x) for x in nb if x >= 0] for n, nb in zip(nodes, links)})
+        with open(os.path.join(path, "rows.jsonl"), encoding="utf-8") as fh:
+            idx.rows = [json.loads(line) for line in fh]
+        return idx                                # read-only maps; the first add() copies them into RAM
+
+# ---------- helpers ----------
+def collection_vectors(coll, path: str = "embedding", skip_ids: set = frozenset(), dim: Optional[int] = None):
+    """(rows, vecs) in step; only vectors of length dim (default: the first one seen) are kept."""
+    rows, vecs = [], []
+    for d in coll.find({path: {"$type": "array"}}, projection={**PROJECTION, "_id": 1, path: 1}):
+        if str(d["_id"]) in skip_ids:
+            continue
+        v = d.get(path)
+        if dim is None:
+            dim = len(v)
+        if len(v) != dim:
+            continue
+        rows.append({"_id": str(d["_id"]), **normalize_row(d)})
+        vecs.append(v)
+    return rows, vecs
+
+def measure_recall(idx: HNSWIndex, queries: np.ndarray, k: int, efs: Sequence[int]) -> List[Dict[str, float]]:
+    truth = [{j for _, j in idx.exact(q, k)} for q in queries]
+    t0 = time.perf_counter()
+    for q in queries:
+        idx.exact(q, k)
+    exact_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+    out = []
+    for ef in efs:
+        t0 = time.perf_counter()
+        found = [{j for _, j in idx.search(q, k, ef)} for q in queries]
+        ms = (time.perf_counter() - t0) * 1000 / len(queries)
+        recall = sum(len(f & t) for f, t in zip(found, truth)) / sum(len(t) for t in truth)
+        out.append({"ef": ef, "recall": recall, "ms": ms, "exact_ms": exact_ms})
+    return out
+
+def query_log_vectors(path: str, dim: int, n: int) -> np.ndarray:
+    """The first n distinct queries of a replay.py log, embedded the way a search embeds them."""
+    import embedder
+    from replay import read_log
+    if embedder.vo is None:
+        embedder.connect()
+    texts = list(dict.fromkeys(e["q"] for e in read_log(path)))[:n]
+    vecs = []
+    for i in range(0, len(texts), embedder.BATCH_SIZE):
+        vecs += embedder.vo.embed(texts=texts[i:i + embedder.BATCH_SIZE], model=embedder.VOYAGE_MODEL,
+                                  input_type="query", output_dimension=dim).embeddings
+    return np.asarray(vecs, dtype=np.float32).reshape(-1, dim)
+
+def recall_queries(index_path: str, idx: HNSWIndex, n: int, query_log: Optional[str] = None) -> np.ndarray:
+    """Queries that are not points of the graph (a near-copy of an indexed vector overstates recall)."""
+    if query_log:
+        return query_log_vectors(query_log, idx.dim, n)
+    held = os.path.join(index_path, HOLDOUT_FILE)
+    if os.path.exists(held):
+        return np.load(held)[:n]
+    raise SystemExit(f"{index_path} has no held-out vectors; pass --query-log (replay.py format) to embed real queries")
+
+def build_logged(idx: HNSWIndex, vecs, rows, step: int = 10_000) -> None:
+    t0 = time.perf_counter()
+    for i in range(0, len(vecs), step):
+        idx.add(vecs[i:i + step], rows[i:i + step])
+        print(f"  {idx.n} inserted ({(time.perf_counter() - t0):.1f}s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Local HNSW index: build / update / recall")
+    ap.add_argument("cmd", choices=["build", "update", "recall", "synth"])
+    ap.add_argument("index", help="Index directory")
+    ap.add_argument("--path", default="embedding", help="Vector field in the collection")
+    ap.add_argument("--m", type=int, default=M)
+    ap.add_argument("--ef-construction", type=int, default=EF_CONSTRUCTION)
+    ap.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", type=int, default=HOLDOUT, help="recall: at most this many queries")
+    ap.add_argument("--query-log", help="recall: embed the queries of this replay.py log (JSONL with \"q\")")
+    ap.add_argument("--n", type=int, default=20000, help="synth: vectors")
+    ap.add_argument("--dim", type=int, default=256, help="synth: dimensions")
+    args = ap.parse_args()
+
+    if args.cmd == "synth":
+        rng = np.random.default_rng(SEED)
+        centers = rng.normal(size=(max(1, args.n // 200), args.dim))
+        total = args.n + HOLDOUT
+        vecs = centers[rng.integers(len(centers), size=total)] + 0.5 * rng.normal(size=(total, args.dim))
+        idx = HNSWIndex(args.dim, args.m, args.ef_construction, capacity=args.n)
+        build_logged(idx, vecs[:args.n], [{"code": f"synth{i}"} for i in range(args.n)])
+        idx.save(args.index)
+        np.save(os.path.join(args.index, HOLDOUT_FILE), vecs[args.n:].astype(np.float32))
+        print(f"✅ {args.index}: {idx.n} vectors (+{HOLDOUT} held out for recall), {len(idx.upper) + 1} layers")
+    elif args.cmd in ("build", "update"):
+        import embedder
+        coll = embedder.connect()
+        if args.cmd == "build":
+            rows, vecs = collection_vectors(coll, args.path)
+            if not vecs:
+                raise SystemExit(f"No vectors in {coll.full_name}.{args.path}")
+            idx = HNSWIndex(len(vecs[0]), args.m, args.ef_construction, capacity=len(vecs))
+        else:
+            idx = HNSWIndex.load(args.index, mmap=False)
+            rows, vecs = collection_vectors(coll, args.path, skip_ids={r.get("_id") for r in idx.rows}, dim=idx.dim)
+        build_logged(idx, vecs, rows)
+        idx.save(args.index)
+        print(f"✅ {args.index}: {idx.n} vectors ({len(vecs)} inserted), {len(idx.upper) + 1} layers")
+    else:
+        idx = HNSWIndex.load(args.index)
+        qs = recall_queries(args.index, idx, args.queries, args.query_log)
+        print(f"{args.index}: n={idx.n} dim={idx.dim} M={idx.m} efConstruction={idx.ef_construction}, "
+              f"{len(qs)} {'logged' if args.query_log else 'held-out'} queries")
+        print(f"  {'efSearch':>8} {f'Recall@{args.k}':>10} {'ms/query':>9} {'exact ms':>9}")
+        for r in measure_recall(idx, qs, args.k, args.ef_search):
+            print(f"  {r['ef']:>8} {r['recall']:>10.3f} {r['ms']:>9.2f} {r['exact_ms']:>9.2f}")
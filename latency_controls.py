@@ -0,0 +1,196 @@
+# latency_controls.py — Bounded tail latency for the embed → search → rerank path
+# - Budget: one deadline per request; each stage gets min(its own STAGE_MS, what is left), and
+#   mongo_max_time_ms() turns that into maxTimeMS for coll.aggregate
+# - hedged(): run a call on a pool; if it has not answered after hedge_after_ms, fire one duplicate
+#   and take whichever finishes first; give up at the stage deadline (Voyage calls are idempotent).
+#   At most MAX_HEDGES duplicates run at once, and calls still queued when hedged() returns are cancelled,
+#   so abandoned work cannot fill the pool and eat later stages' deadlines
+# - CircuitBreaker: after FAILURES consecutive failures/timeouts a dependency is skipped for RESET_S,
+#   then one trial call (half-open) decides whether it closes again
+# - guarded(): budget + hedge + breaker in one call; raises Degraded(stage, reason) instead of hanging,
+#   and mark_degraded() stamps the fallback result ("degraded": ["rerank:timeout", ...]).
+#   HEDGE_AFTER_MS is a single request's p95: batch calls pass hedge_after_ms=None (or their own threshold)
+# - count_timeout(): a give-up enforced by the server (maxTimeMS → pymongo ExecutionTimeout) is
+#   counted with the other timeouts; the caller serves its own fallback
+#
+# Usage:
+#   budget = Budget(REQUEST_BUDGET_MS)
+#   try:
+#       rr = guarded("rerank", lambda: vo.rerank(...), budget)
+#   except Degraded as d:
+#       hits = mark_degraded(docs[:k], d)          # ANN order, marked
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+# ---------------- CONFIG ----------------
+REQUEST_BUDGET_MS = 2500
+STAGE_MS          = {"embed": 800, "search": 1000, "rerank": 900}
+HEDGE_AFTER_MS    = {"embed": 300, "rerank": 350}     # ~p95 of the stage; no entry = no hedging
+FAILURES          = 5
+RESET_S           = 30.0
+POOL_WORKERS      = 8
+MAX_HEDGES        = 2                                 # duplicates in flight at once (of POOL_WORKERS)
+# ----------------------------------------
+
+POOL = ThreadPoolExecutor(max_workers=POOL_WORKERS)
+COUNTERS: Dict[str, int] = {"hedges": 0, "hedge_wins": 0, "hedges_capped": 0, "timeouts": 0, "errors": 0,
+                            "short_circuits": 0}
+_counter_lock = threading.Lock()
+_hedge_slots = threading.BoundedSemaphore(MAX_HEDGES)
+STAGE_HEDGE = object()      # guarded(): use HEDGE_AFTER_MS[stage]
+
+def _count(key: str) -> None:
+    with _counter_lock:
+        COUNTERS[key] += 1
+
+class Degraded(Exception):
+    """A stage was skipped or gave up; the caller serves its fallback and marks it."""
+    def __init__(self, stage: str, reason: str, cause: Exception = None):
+        super().__init__(f"{stage}:{reason}")
+        self.stage, self.reason, self.cause = stage, reason, cause
+
+    @property
+    def marker(self) -> str:
+        return f"{self.stage}:{self.reason}"
+
+class Budget:
+    def __init__(self, total_ms: float = REQUEST_BUDGET_MS):
+        self.total_ms = total_ms
+        self.t0 = time.perf_counter()
+
+    def remaining_ms(self) -> float:
+        return max(0.0, self.total_ms - (time.perf_counter() - self.t0) * 1000)
+
+    def stage_ms(self, stage: str) -> float:
+        return min(STAGE_MS.get(stage, self.total_ms), self.remaining_ms())
+
+    def mongo_max_time_ms(self, stage: str = "search") -> int:
+        return max(1, int(self.stage_ms(stage)))
+
+class CircuitBreaker:
+    def __init__(self, name: str, failures: int = FAILURES, reset_s: float = RESET_S):
+        self.name, self.failures, self.reset_s = name, failures, reset_s
+        self.consecutive = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_s else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            st = self.state
+            if st == "closed":
+                return True
+            if st == "half-open" and not self._trial:
+                self._trial = True               # exactly one probe while half-open
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self.consecutive, self.opened_at, self._trial = 0, None, False
+
+    def failure(self) -> None:
+        with self._lock:
+            self.consecutive += 1
+            if self._trial or self.consecutive >= self.failures:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+BREAKERS: Dict[str, CircuitBreaker] = {}
+
+def breaker(name: str) -> CircuitBreaker:
+    if name not in BREAKERS:
+        BREAKERS[name] = CircuitBreaker(name)
+    return BREAKERS[name]
+
+def hedged(fn: Callable[[], Any], timeout_ms: float, hedge_after_ms: Optional[float] = None) -> Any:
+    """First successful result of fn() or its one duplicate; TimeoutError once timeout_ms is spent."""
+    now = time.perf_counter()
+    deadline = now + timeout_ms / 1000
+    hedge_at = now + hedge_after_ms / 1000 if hedge_after_ms is not None and hedge_after_ms < timeout_ms else None
+    primary = POOL.submit(fn)
+    pending, error = {primary}, None
+    try:
+        while pending:
+            wake = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, pending = wait(pending, timeout=max(0.0, wake - time.perf_counter()),
+                                 return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    if f is not primary:
+                        _count("hedge_wins")
+                    return f.result()
+                error = f.exception()
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if hedge_at is not None and (now >= hedge_at or not pending):
+                hedge_at = None
+                if _hedge_slots.acquire(blocking=False):     # slow (or already failed) primary → one duplicate
+                    dup = POOL.submit(fn)
+                    dup.add_done_callback(lambda _: _hedge_slots.release())
+                    pending.add(dup)
+                    _count("hedges")
+                else:
+                    _count("hedges_capped")
+        if pending or error is None:
+            raise TimeoutError(f"no answer in {timeout_ms:.0f}ms")
+        raise error
+    finally:
+        for f in pending:
+            f.cancel()                                   # drops calls still queued; running ones finish alone
+
+def guarded(stage: str, fn: Callable[[], Any], budget: Optional[Budget] = None, name: str = None,
+            timeout_ms: Optional[float] = None, hedge_after_ms: Any = STAGE_HEDGE) -> Any:
+    """
+    fn() under the stage deadline, hedging and the dependency's breaker (name, default stage);
+    Degraded on any give-up. timeout_ms replaces STAGE_MS[stage] for this call (still capped by what is
+    left of budget); hedge_after_ms=None turns hedging off (batch calls: a single-request p95 would
+    duplicate nearly every one of them).
+    """
+    if timeout_ms is None:
+        timeout_ms = budget.stage_ms(stage) if budget is not None else STAGE_MS.get(stage, REQUEST_BUDGET_MS)
+    elif budget is not None:
+        timeout_ms = min(timeout_ms, budget.remaining_ms())
+    if hedge_after_ms is STAGE_HEDGE:
+        hedge_after_ms = HEDGE_AFTER_MS.get(stage)
+    if timeout_ms <= 0:
+        raise Degraded(stage, "budget_exhausted")
+    br = breaker(name or stage)
+    if not br.allow():
+        _count("short_circuits")
+        raise Degraded(stage, "circuit_open")
+    try:
+        out = hedged(fn, timeout_ms, hedge_after_ms)
+    except TimeoutError as ex:
+        br.failure()
+        _count("timeouts")
+        raise Degraded(stage, "timeout", ex)
+    except Exception as ex:
+        br.failure()
+        _count("errors")
+        raise Degraded(stage, "error", ex)
+    br.success()
+    return out
+
+def count_timeout() -> None:
+    _count("timeouts")
+
+def mark_degraded(docs: List[Dict[str, Any]], d: Degraded) -> List[Dict[str, Any]]:
+    return [dict(x, degraded=list(x.get("degraded", [])) + [d.marker]) for x in docs]
+
+def print_counters() -> None:
+    c = COUNTERS
+    states = " ".join(f"{n}={b.state}" for n, b in sorted(BREAKERS.items())) or "-"
+    print(f"Latency controls: hedges={c['hedges']} (won {c['hedge_wins']}, capped {c['hedges_capped']}), "
+          f"timeouts={c['timeouts']}, "
+          f"errors={c['errors']}, short-circuits={c['short_circuits']}; breakers: {states}")
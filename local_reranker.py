@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# local_reranker.py — Small CPU reranker distilled from logged Voyage rerank scores
+# - Training triples (query, candidate, relevance_score) come from past runs:
+#     rerank_outcomes.jsonl (autoEmbeddingVersion, via rerank_policy.log_outcome) and
+#     voyage_eval_result.csv files (chenRun_rerank / NEW_eval_rerank_threshold: query, fields, score, rerank_score,
+#     plus the full candidate list's ANN rank / size / score stats, since the CSV keeps only the top-K rows)
+#   Candidates the reranker cut from its top_k get the lowest score it returned for that query, at half weight
+# - Features are cheap: vector score (raw, gap to top-1, z within the list, ANN rank), query-token coverage
+#   of the rerank text and of each field, token / char-trigram Jaccard, phrase and code matches
+# - Model: ridge regression (closed form, NumPy) on standardized features → predicted relevance_score
+# - Agreement vs Voyage on a held-out query split: top-1 agreement, overlap@k, NDCG@k (Voyage scores as
+#   gains), Spearman, per-query latency; ANN order is reported alongside as the baseline
+# - confident(): predicted top-1/top-2 margin >= min_margin, fitted on the held-out queries so confident ones
+#   keep Voyage's top-1 at least TARGET_AGREEMENT of the time ("auto" mode serves those locally, the rest
+#   go to Voyage); on the training rows the model's own fit would make every margin look trustworthy
+#
+# Usage (autoEmbeddingVersion.LOCAL_RERANK = "replace" | "prefilter" | "auto"):
+#   lr = load_reranker("local_reranker.json")
+#   s = lr.score(query, docs)
+#   hits = lr.rerank(query, docs, top_n, s)              # instead of rerank_with_voyage
+#   docs = lr.prefilter(query, docs, 20, s)              # or: trim candidates before Voyage
+#
+# Run:
+#   python3 local_reranker.py fit --log rerank_outcomes.jsonl --csv voyage_eval_result.csv
+#   python3 local_reranker.py report --log rerank_outcomes.jsonl --model local_reranker.json
+
+import argparse
+import csv
+import hashlib
+import json
+import math
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from embedder import build_rerank_text
+from rerank_policy import OUTCOMES_PATH, read_outcomes
+
+# ---------------- CONFIG ----------------
+MODEL_PATH       = "local_reranker.json"
+ALPHA            = 1.0      # ridge penalty (on standardized features)
+HOLDOUT          = 0.2      # fraction of queries held out for the agreement report (split by query hash)
+CUT_WEIGHT       = 0.5      # sample weight of candidates the reranker cut (imputed label)
+TARGET_AGREEMENT = 0.95     # confident() must keep Voyage's top-1 this often
+MIN_SUPPORT      = 5
+EVAL_K           = 10
+# ----------------------------------------
+
+FEATURES = ["vs", "vs_gap", "vs_z", "ann_rank", "q_cov", "cov_display", "cov_class", "cov_spec",
+            "jaccard", "tri_jaccard", "phrase", "code_match"]
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+CANDIDATE_FIELDS = ("code", "displayName", "classification", "specialization", "score")
+LIST_COLUMNS = ("ann_rank", "n_candidates", "vs_top1", "vs_mean", "vs_sd")   # CSV: full-list context per row
+
+# ---------- features ----------
+def tokens(text: str) -> List[str]:
+    return TOKEN_RE.findall((text or "").lower())
+
+def trigrams(text: str) -> frozenset:
+    s = f"  {' '.join(tokens(text))} "
+    return frozenset(s[i:i + 3] for i in range(len(s) - 2))
+
+@lru_cache(maxsize=65536)
+def _doc_side(text: str) -> tuple:
+    """(tokens, match keys, char trigrams, normalized text) — cached per distinct text.
+    Match keys: the tokens plus their "^"-marked prefixes of >= 4 chars."""
+    toks = tokens(text)
+    keys = frozenset(toks) | {"^" + t[:n] for t in toks for n in range(4, len(t) + 1)}
+    return frozenset(toks), keys, trigrams(text), " ".join(toks)
+
+@lru_cache(maxsize=65536)
+def _rerank_text(code, display, cls, spec) -> str:
+    return build_rerank_text({"code": code, "displayName": display, "classification": cls, "specialization": spec})
+
+def _probes(t: str) -> frozenset:
+    """Keys that mean query token t is in a text: t itself, or a shared prefix of >= 4 chars ("cardio" ~ "cardiology")."""
+    if len(t) < 4:
+        return frozenset([t])
+    return frozenset([t, "^" + t] + [t[:n] for n in range(4, len(t))])
+
+def _coverage(probes: List[frozenset], keys: frozenset) -> float:
+    return sum(not p.isdisjoint(keys) for p in probes) / len(probes) if probes else 0.0
+
+def list_stats(docs: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Vector-score stats of a whole candidate list (what vs_gap / vs_z are relative to)."""
+    vs = [float(d.get("score") or 0.0) for d in docs]
+    n = len(vs)
+    mean = sum(vs) / n if n else 0.0
+    return {"top1": max(vs, default=0.0), "mean": mean,
+            "sd": math.sqrt(sum((x - mean) ** 2 for x in vs) / n) if n > 1 else 0.0}
+
+def list_columns(docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """LIST_COLUMNS for a candidate list in ANN order (DataFrame.assign(**...) before truncating to top-K)."""
+    st = list_stats(docs)
+    return {"ann_rank": list(range(len(docs))), "n_candidates": len(docs),
+            "vs_top1": st["top1"], "vs_mean": st["mean"], "vs_sd": st["sd"]}
+
+def feature_matrix(query: str, docs: List[Dict[str, Any]], ranks: Optional[Sequence[int]] = None,
+                   stats: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """
+    One row per candidate, FEATURES order; docs in ANN order with their vectorSearchScore as 'score'.
+    ranks / stats: ANN ranks and list_stats of the full candidate list when docs are a subset of it.
+    """
+    q_tokens = tokens(query)
+    q_set = frozenset(q_tokens)
+    probes = [_probes(t) for t in q_tokens]
+    q_tri = trigrams(query)
+    q_norm = " ".join(q_tokens)
+    vs = [float(d.get("score") or 0.0) for d in docs]
+    st = stats or list_stats(docs)
+    top1, mean, sd = st["top1"], st["mean"], st["sd"]
+    rows = []
+    for i, d in enumerate(docs):
+        text = d.get("rerank_text") or _rerank_text(d.get("code"), d.get("displayName"), d.get("classification"),
+                                                    d.get("specialization"))
+        d_tok, keys, d_tri, d_norm = _doc_side(text)
+        inter, tri_inter = len(q_set & d_tok), len(q_tri & d_tri)
+        union, tri_union = len(q_set) + len(d_tok) - inter, len(q_tri) + len(d_tri) - tri_inter
+        rows.append((
+            vs[i], vs[i] - top1, (vs[i] - mean) / sd if sd > 0 else 0.0,
+            math.log1p(i if ranks is None else ranks[i]),
+            _coverage(probes, keys),
+            _coverage(probes, _doc_side(d.get("displayName") or "")[1]),
+            _coverage(probes, _doc_side(d.get("classification") or "")[1]),
+            _coverage(probes, _doc_side(d.get("specialization") or "")[1]),
+            inter / union if union else 0.0,
+            tri_inter / tri_union if tri_union else 0.0,
+            float(bool(q_norm) and q_norm in d_norm),
+            float(bool(q_norm) and q_norm == (d.get("code") or "").lower()),
+        ))
+    return np.asarray(rows, dtype=np.float64).reshape(len(docs), len(FEATURES))
+
+# ---------- model ----------
+class LocalReranker:
+    def __init__(self, weights: Sequence[float], bias: float, mean: Sequence[float], std: Sequence[float],
+                 min_margin: float = float("inf"), features: Sequence[str] = FEATURES, metrics: Dict = None):
+        if list(features) != FEATURES:
+            raise ValueError(f"model was trained on features {list(features)}, this code computes {FEATURES}")
+        self.w = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.std = np.asarray(std, dtype=np.float64)
+        self.min_margin = min_margin
+        self.metrics = metrics or {}
+        self.counters = {"scored": 0, "local": 0, "prefiltered": 0, "deferred": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counters[key] += 1
+
+    def score(self, query: str, docs: List[Dict[str, Any]], ranks: Optional[Sequence[int]] = None,
+              stats: Optional[Dict[str, float]] = None) -> np.ndarray:
+        if not docs:
+            return np.zeros(0)
+        self._count("scored")
+        return ((feature_matrix(query, docs, ranks, stats) - self.mean) / self.std) @ self.w + self.bias
+
+    def margin(self, scores: np.ndarray) -> float:
+        if len(scores) < 2:
+            return float("inf")
+        top2 = np.partition(scores, -2)[-2:]
+        return float(top2[1] - top2[0])
+
+    def confident(self, scores: np.ndarray) -> bool:
+        ok = self.margin(scores) >= self.min_margin
+        self._count("local" if ok else "deferred")
+        return ok
+
+    def rerank(self, query: str, docs: List[Dict[str, Any]], top_n: int,
+               scores: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Drop-in for rerank_with_voyage: docs in predicted order with rerank_score / rerank_model."""
+        if not docs or top_n <= 0:
+            return []
+        s = self.score(query, docs) if scores is None else scores
+        order = np.argsort(-s, kind="stable")[:top_n]
+        return [dict(docs[i], rerank_score=float(s[i]), rerank_model="local") for i in order]
+
+    def prefilter(self, query: str, docs: List[Dict[str, Any]], keep: int,
+                  scores: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """The `keep` best candidates by predicted relevance, still in ANN order (what the reranker expects)."""
+        if len(docs) <= keep:
+            return docs
+        s = self.score(query, docs) if scores is None else scores
+        self._count("prefiltered")
+        return [docs[i] for i in sorted(np.argsort(-s, kind="stable")[:keep])]
+
+    # ----- persistence -----
+    def to_dict(self) -> Dict[str, Any]:
+        return {"features": FEATURES, "weights": self.w.tolist(), "bias": self.bias, "mean": self.mean.tolist(),
+                "std": self.std.tolist(),
+                "min_margin": None if self.min_margin == float("inf") else self.min_margin,
+                "metrics": self.metrics}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "LocalReranker":
+        mm = d.get("min_margin")
+        return cls(d["weights"], d["bias"], d["mean"], d["std"], float("inf") if mm is None else float(mm),
+                   d.get("features", FEATURES), d.get("metrics"))
+
+    def save(self, path: str = MODEL_PATH) -> None:
+        with open(path, "w") as fh:
+            json.dump(self.to_dict(), fh, indent=2)
+
+def load_reranker(path: str = MODEL_PATH) -> Optional["LocalReranker"]:
+    """None until a model has been fitted (callers then keep using Voyage)."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as fh:
+        return LocalReranker.from_dict(json.load(fh))
+
+def print_stats(lr: LocalReranker) -> None:
+    c = lr.counters
+    print(f"Local reranker: scored={c['scored']} served locally={c['local']} deferred to Voyage={c['deferred']} "
+          f"prefiltered={c['prefiltered']}")
+
+# ---------- training data ----------
+def groups_from_outcomes(outcomes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One group per logged query: candidates (ANN order) + Voyage score per candidate (None = cut)."""
+    out = []
+    for o in outcomes:
+        if not o.get("candidates") or not o.get("rerank"):
+            continue
+        labels = [None] * len(o["candidates"])
+        for r in o["rerank"]:
+            labels[r["i"]] = r["relevance_score"]
+        out.append({"q": o["q"], "docs": o["candidates"], "labels": labels})
+    return out
+
+def groups_from_csv(path: str) -> List[Dict[str, Any]]:
+    """
+    voyage_eval_result.csv rows → groups; only reranked rows, re-sorted into ANN order. The CSV holds the
+    top-K only, so ann_rank / vs_gap / vs_z come from its LIST_COLUMNS (the full candidate list, as at serve
+    time); files written before those columns existed are skipped rather than trained on truncated lists.
+    """
+    by_q: Dict[str, List[tuple]] = {}
+    with open(path, newline="", encoding="utf-8") as fh:
+        reader = csv.DictReader(fh)
+        missing = [c for c in LIST_COLUMNS if c not in (reader.fieldnames or [])]
+        if missing:
+            print(f"Skipping {path}: no {', '.join(missing)} columns (rerun the script that wrote it)",
+                  file=sys.stderr)
+            return []
+        for r in reader:
+            if any(r.get(k) in (None, "") for k in ("rerank_score", "score") + LIST_COLUMNS):
+                continue
+            doc = {k: (r.get(k) or None) for k in CANDIDATE_FIELDS}
+            doc["score"] = float(r["score"])
+            stats = {"top1": float(r["vs_top1"]), "mean": float(r["vs_mean"]), "sd": float(r["vs_sd"])}
+            by_q.setdefault(r["query"], []).append((doc, float(r["rerank_score"]), int(float(r["ann_rank"])), stats))
+    out, seen = [], set()
+    for q, rows in by_q.items():
+        rows.sort(key=lambda x: x[2])
+        sig = (q.strip().lower(), tuple(d["code"] for d, *_ in rows))
+        if sig in seen:                      # variant spellings that reused one canonical result
+            continue
+        seen.add(sig)
+        out.append({"q": q, "docs": [d for d, *_ in rows], "labels": [s for _, s, *_ in rows],
+                    "ranks": [r for _, _, r, _ in rows], "stats": rows[0][3]})
+    return out
+
+def in_holdout(q: str, frac: float) -> bool:
+    return int(hashlib.md5(q.strip().lower().encode("utf-8")).hexdigest()[:8], 16) % 1000 < frac * 1000
+
+def design(groups: List[Dict[str, Any]], cut_weight: float = CUT_WEIGHT):
+    xs, ys, ws = [], [], []
+    for g in groups:
+        known = [s for s in g["labels"] if s is not None]
+        floor = min(known)
+        xs.append(feature_matrix(g["q"], g["docs"], g.get("ranks"), g.get("stats")))
+        ys += [floor if s is None else s for s in g["labels"]]
+        ws += [cut_weight if s is None else 1.0 for s in g["labels"]]
+    return np.vstack(xs), np.asarray(ys), np.asarray(ws)
+
+def fit_ridge(groups: List[Dict[str, Any]], alpha: float = ALPHA) -> LocalReranker:
+    X, y, w = design(groups)
+    mean = np.average(X, axis=0, weights=w)
+    std = np.sqrt(np.average((X - mean) ** 2, axis=0, weights=w))
+    std[std < 1e-9] = 1.0                    # constant feature → weight stays ~0
+    Z = (X - mean) / std
+    bias = float(np.average(y, weights=w))
+    A = Z.T @ (Z * w[:, None]) + alpha * np.eye(Z.shape[1])
+    coef = np.linalg.solve(A, Z.T @ (w * (y - bias)))
+    return LocalReranker(coef, bias, mean, std)
+
+# ---------- agreement vs Voyage ----------
+def _ndcg(order: Sequence[int], gains: Sequence[float], k: int) -> float:
+    dcg = sum(gains[i] / math.log2(r + 2) for r, i in enumerate(order[:k]))
+    ideal = sum(g / math.log2(r + 2) for r, g in enumerate(sorted(gains, reverse=True)[:k]))
+    return dcg / ideal if ideal > 0 else 1.0
+
+def _spearman(a: Sequence[float], b: Sequence[float]) -> Optional[float]:
+    if len(a) < 3:
+        return None
+    ra = np.argsort(np.argsort(a)).astype(float)
+    rb = np.argsort(np.argsort(b)).astype(float)
+    if ra.std() == 0 or rb.std() == 0:
+        return None
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+def query_rows(lr: LocalReranker, groups: List[Dict[str, Any]], k: int = EVAL_K) -> List[Dict[str, Any]]:
+    rows = []
+    for g in groups:
+        t0 = time.perf_counter()
+        s = lr.score(g["q"], g["docs"], g.get("ranks"), g.get("stats"))
+        us = (time.perf_counter() - t0) * 1e6
+        gains = [x or 0.0 for x in g["labels"]]
+        voyage = sorted((i for i, x in enumerate(g["labels"]) if x is not None), key=lambda i: -g["labels"][i])
+        kk = min(k, len(voyage))
+        local = list(np.argsort(-s, kind="stable"))
+        ann = list(range(len(g["docs"])))
+        labeled = [i for i in range(len(gains)) if g["labels"][i] is not None]
+        rows.append({
+            "us": us, "margin": lr.margin(s),
+            "top1": local[0] == voyage[0], "ann_top1": (g["ranks"][voyage[0]] if g.get("ranks") else voyage[0]) == 0,
+            "overlap": len(set(local[:kk]) & set(voyage[:kk])) / kk,
+            "ann_overlap": len(set(ann[:kk]) & set(voyage[:kk])) / kk,
+            "ndcg": _ndcg(local, gains, kk), "ann_ndcg": _ndcg(ann, gains, kk),
+            "spearman": _spearman([s[i] for i in labeled], [gains[i] for i in labeled]),
+        })
+    return rows
+
+def fit_min_margin(rows: List[Dict[str, Any]], target: float = TARGET_AGREEMENT,
+                   min_support: int = MIN_SUPPORT) -> float:
+    """Smallest predicted margin t such that queries with margin >= t keep Voyage's top-1 `target` of the time."""
+    best = float("inf")
+    for t in sorted({r["margin"] for r in rows if r["margin"] != float("inf")}, reverse=True):
+        sel = [r for r in rows if r["margin"] >= t]
+        if len(sel) >= min_support and sum(r["top1"] for r in sel) / len(sel) >= target:
+            best = t
+        elif len(sel) >= min_support:
+            break
+    return best
+
+def agreement(lr: LocalReranker, groups: List[Dict[str, Any]], k: int = EVAL_K) -> Dict[str, Any]:
+    rows = query_rows(lr, groups, k)
+    if not rows:
+        return {"queries": 0}
+    mean = lambda key: statistics.fmean(r[key] for r in rows)
+    sp = [r["spearman"] for r in rows if r["spearman"] is not None]
+    conf = [r for r in rows if r["margin"] >= lr.min_margin]
+    us = sorted(r["us"] for r in rows)
+    return {
+        "queries": len(rows),
+        "top1": mean("top1"), "ann_top1": mean("ann_top1"),
+        f"overlap@{k}": mean("overlap"), f"ann_overlap@{k}": mean("ann_overlap"),
+        f"ndcg@{k}": mean("ndcg"), f"ann_ndcg@{k}": mean("ann_ndcg"),
+        "spearman": statistics.fmean(sp) if sp else None,
+        "local_coverage": len(conf) / len(rows),
+        "local_top1": sum(r["top1"] for r in conf) / len(conf) if conf else None,
+        "p50_us": us[len(us) // 2], "p99_us": us[min(len(us) - 1, int(0.99 * (len(us) - 1) + 0.5))],
+    }
+
+def print_agreement(title: str, m: Dict[str, Any], k: int = EVAL_K) -> None:
+    if not m.get("queries"):
+        print(f"{title}: no queries")
+        return
+    f = lambda x: "-" if x is None else f"{x:.3f}"
+    print(f"{title}: {m['queries']} queries")
+    print(f"  {'':14} {'local':>7} {'ANN':>7}")
+    print(f"  {'top-1 agree':14} {m['top1']:7.1%} {m['ann_top1']:7.1%}")
+    print(f"  {f'overlap@{k}':14} {m[f'overlap@{k}']:7.3f} {m[f'ann_overlap@{k}']:7.3f}")
+    print(f"  {f'NDCG@{k}':14} {m[f'ndcg@{k}']:7.3f} {m[f'ann_ndcg@{k}']:7.3f}")
+    print(f"  Spearman (reranked candidates): {f(m['spearman'])}")
+    print(f"  Confident → local: {m['local_coverage']:.0%} of queries, top-1 agreement there {f(m['local_top1'])}")
+    print(f"  Latency per query: p50={m['p50_us']:.0f}µs p99={m['p99_us']:.0f}µs")
+
+def load_groups(log_paths: List[str], csv_paths: List[str]) -> List[Dict[str, Any]]:
+    groups = []
+    for p in log_paths:
+        if os.path.exists(p):
+            groups += groups_from_outcomes(read_outcomes(p))
+    for p in csv_paths:
+        groups += groups_from_csv(p)
+    return groups
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Fit / report the distilled local reranker")
+    ap.add_argument("cmd", choices=["fit", "report"])
+    ap.add_argument("--log", nargs="*", default=[OUTCOMES_PATH], help="rerank_outcomes.jsonl file(s)")
+    ap.add_argument("--csv", nargs="*", default=[], help="voyage_eval_result.csv file(s)")
+    ap.add_argument("--model", default=MODEL_PATH)
+    ap.add_argument("--out", default=MODEL_PATH)
+    ap.add_argument("--alpha", type=float, default=ALPHA)
+    ap.add_argument("--holdout", type=float, default=HOLDOUT)
+    ap.add_argument("--target", type=float, default=TARGET_AGREEMENT)
+    ap.add_argument("--k", type=int, default=EVAL_K)
+    args = ap.parse_args()
+
+    groups = load_groups(args.log, args.csv)
+    if not groups:
+        raise SystemExit("No training data: run autoEmbeddingVersion.py (LOG_RERANK_OUTCOMES) or pass --csv")
+    if args.cmd == "fit":
+        test = [g for g in groups if in_holdout(g["q"], args.holdout)]
+        train = [g for g in groups if not in_holdout(g["q"], args.holdout)] or groups
+        lr = fit_ridge(train, args.alpha)
+        lr.min_margin = fit_min_margin(query_rows(lr, test or train, args.k), args.target)
+        print(f"{len(groups)} queries ({sum(len(g['docs']) for g in groups)} candidates): "
+              f"train {len(train)}, held out {len(test)}")
+        if not test:
+            print("  ⚠️  no held-out queries: min_margin is fitted on the training rows (optimistic)")
+        print_agreement("Train", agreement(lr, train, args.k), args.k)
+        m = agreement(lr, test, args.k)
+        print_agreement("Held out", m, args.k)
+        lr.metrics = {"train_queries": len(train), "heldout": m, "alpha": args.alpha}
+        lr.save(args.out)
+        print("  weights: " + ", ".join(f"{n}={w:+.3f}" for n, w in zip(FEATURES, lr.w)))
+        print(f"✅ Wrote {args.out} (min_margin={lr.to_dict()['min_margin']})")
+    else:
+        lr = load_reranker(args.model)
+        if lr is None:
+            raise SystemExit(f"{args.model} not found (run: python3 local_reranker.py fit)")
+        print_agreement("All logged queries", agreement(lr, groups, args.k), args.k)
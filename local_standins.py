@@ -0,0 +1,1000 @@
+#!/usr/bin/env python3
+# local_standins.py — Offline stand-ins for Voyage and Atlas, so every script runs without credentials
+# - Voyage: a local HTTP server speaking the /v1/embeddings and /v1/rerank wire format.
+#   Embeddings are deterministic (hashed word + char-trigram features projected onto seeded Gaussian
+#   vectors), Matryoshka-style: the first d components of a bigger vector, so every output_dimension agrees.
+#   Rerank scores are query/document cosine. Latency, jitter, error rate and 429 rate are configurable.
+# - Atlas: LocalClient / LocalCollection, an in-process store with the subset of the pymongo API the
+#   scripts use (find, aggregate, bulk_write, update_many, count_documents, create_search_index ...).
+#   aggregate() emulates $vectorSearch (queryVector or auto-embedded query, filter, limit, exact,
+#   vectorSearchScore), $geoNear (spherical, query + maxDistance), $project/$match/$group/$sort/$limit/
+#   $set/$unionWith/$bucketAuto and $listSearchIndexes.
+#   Collections persist as JSONL under LOCAL_STORE_DIR.
+# - run: patches pymongo.MongoClient and voyageai.Client, then executes a script unchanged
+#   (a real local mongod / Atlas Local can be used instead with --mongo-uri)
+#
+# Run:
+#   python3 local_standins.py seed                          # sample NUCC rows + stub vectors + indexes
+#   python3 local_standins.py run autoEmbeddingVersion.py
+#   python3 local_standins.py run --latency-ms 80 --throttle-rate 0.05 autoEmbeddingVersion.py --sweep
+#   python3 local_standins.py run --loose-dims chenRun.py   # chenRun* / accuracy2 query 1024-d vs the 2048-d seed
+# Stand-in flags go BEFORE the script name; everything after it is passed to the script.
+#   python3 local_standins.py run --auto-embed-ms 25 bench_query_paths.py   # charge $vectorSearch.query an embed
+#   python3 local_standins.py serve --port 8765             # Voyage stub only (base_url http://127.0.0.1:8765/v1)
+
+import argparse
+import atexit
+import copy
+import glob
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import runpy
+import sys
+import threading
+import time
+import types
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from bson import ObjectId, json_util
+
+# ---------------- CONFIG ----------------
+STUB_HOST, STUB_PORT = "127.0.0.1", 0     # 0 → pick a free port
+LATENCY_MS        = 30.0    # base latency per request
+LATENCY_PER_ITEM  = 0.2     # extra ms per text / document
+JITTER_MS         = 10.0
+ERROR_RATE        = 0.0     # fraction of requests answered with HTTP 500
+THROTTLE_RATE     = 0.0     # fraction of requests answered with HTTP 429
+STUB_SEED         = 0
+DEFAULT_DIM       = 1024
+MODEL_DIMS        = {"voyage-3-large": 1024, "voyage-3.5": 1024, "voyage-3.5-lite": 1024,
+                     "voyage-4-large": 1024, "voyage-4": 1024, "voyage-4-lite": 1024}
+
+LOCAL_STORE_DIR   = "local_store"
+STRICT_DIMS       = True    # like Atlas, a query/index dimension mismatch is an error (--loose-dims: compare
+                            # the shared prefix of the prefix-stable stub vectors instead)
+AUTO_EMBED_MS     = 0.0     # simulated server-side embedding time for $vectorSearch.query
+SEED_DB, SEED_COLL = "NUCC", "taxonomy251"
+SEED_MODEL, SEED_DIM = "voyage-4-large", 2048
+# Index names the scripts query; all on "embedding" (cosine)
+SEED_INDEXES      = ["nucc", "default", "vector_idx"]
+# ----------------------------------------
+
+# =====================================================================
+# Deterministic embeddings
+# =====================================================================
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+def features(text: str) -> Dict[str, float]:
+    feats: Dict[str, float] = {}
+    for w in WORD_RE.findall((text or "").lower()):
+        feats["w:" + w] = feats.get("w:" + w, 0.0) + 1.0
+        padded = f"#{w}#"
+        for i in range(len(padded) - 2):
+            g = "g:" + padded[i:i + 3]
+            feats[g] = feats.get(g, 0.0) + 0.3
+    return feats
+
+@lru_cache(maxsize=50000)
+def _feature_vec(feat: str, dim: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.blake2b(feat.encode(), digest_size=8).digest(), "little")
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)   # prefix-stable in dim
+
+def stub_embedding(text: str, dim: int = DEFAULT_DIM) -> List[float]:
+    v = np.zeros(dim, dtype=np.float32)
+    for f, w in features(text).items():
+        v += w * _feature_vec(f, dim)
+    n = float(np.linalg.norm(v))
+    if n == 0:
+        v[0], n = 1.0, 1.0
+    return (v / n).tolist()
+
+def count_tokens(texts: Iterable[str]) -> int:
+    return sum(len(re.findall(r"\w+|[^\w\s]", t or "")) for t in texts)
+
+# =====================================================================
+# Voyage HTTP stub
+# =====================================================================
+class StubConfig:
+    def __init__(self, latency_ms=LATENCY_MS, per_item_ms=LATENCY_PER_ITEM, jitter_ms=JITTER_MS,
+                 error_rate=ERROR_RATE, throttle_rate=THROTTLE_RATE, seed=STUB_SEED):
+        self.latency_ms, self.per_item_ms, self.jitter_ms = latency_ms, per_item_ms, jitter_ms
+        self.error_rate, self.throttle_rate = error_rate, throttle_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {"embeddings": 0, "rerank": 0, "errors": 0, "throttled": 0}
+
+    def roll(self) -> Optional[int]:
+        with self.lock:
+            r = self.rng.random()
+        if r < self.throttle_rate:
+            return 429
+        if r < self.throttle_rate + self.error_rate:
+            return 500
+        return None
+
+    def sleep(self, items: int) -> None:
+        with self.lock:
+            jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(0.0, self.latency_ms + self.per_item_ms * items + jitter) / 1000)
+
+def make_handler(cfg: StubConfig):
+    class VoyageStubHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code: int, body: Dict[str, Any]) -> None:
+            raw = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_POST(self):
+            path = self.path.rstrip("/").rsplit("/", 1)[-1]
+            if path not in ("embeddings", "rerank"):
+                return self._send(404, {"detail": f"stub does not implement {self.path}"})
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            items = req.get("input") if path == "embeddings" else req.get("documents")
+            items = [items] if isinstance(items, str) else (items or [])
+            cfg.sleep(len(items))
+            fail = cfg.roll()
+            with cfg.lock:
+                cfg.counters[path] += 1
+                if fail == 429:
+                    cfg.counters["throttled"] += 1
+                elif fail:
+                    cfg.counters["errors"] += 1
+            if fail == 429:
+                return self._send(429, {"detail": "Rate limit exceeded (stub)"})
+            if fail:
+                return self._send(500, {"detail": "Injected server error (stub)"})
+            if path == "embeddings":
+                dim = req.get("output_dimension") or MODEL_DIMS.get(req.get("model"), DEFAULT_DIM)
+                data = [{"object": "embedding", "embedding": stub_embedding(t, dim), "index": i}
+                        for i, t in enumerate(items)]
+                tokens = count_tokens(items)
+            else:
+                q = np.asarray(stub_embedding(req.get("query", ""), 256))
+                scores = [(float(q @ np.asarray(stub_embedding(d, 256))) + 1) / 2 for d in items]
+                order = sorted(range(len(items)), key=lambda i: -scores[i])[:req.get("top_k") or len(items)]
+                data = [{"index": i, "relevance_score": scores[i]} for i in order]
+                if req.get("return_documents"):
+                    for d in data:
+                        d["document"] = items[d["index"]]
+                tokens = count_tokens(items) + count_tokens([req.get("query", "")]) * len(items)
+            self._send(200, {"object": "list", "data": data, "model": req.get("model"),
+                             "usage": {"total_tokens": tokens}})
+    return VoyageStubHandler
+
+def start_voyage_stub(cfg: StubConfig = None, host: str = STUB_HOST, port: int = STUB_PORT):
+    """Start the stub in a daemon thread. Returns (server, base_url)."""
+    srv = ThreadingHTTPServer((host, port), make_handler(cfg or StubConfig()))
+    srv.stub_config = cfg
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://{host}:{srv.server_address[1]}/v1"
+
+# =====================================================================
+# Query language (the subset the scripts use)
+# =====================================================================
+_MISSING = object()
+
+def get_path(doc: Any, path: str) -> Any:
+    cur = doc
+    for part in path.split("."):
+        if isinstance(cur, dict):
+            cur = cur.get(part, _MISSING)
+        elif isinstance(cur, list) and part.isdigit() and int(part) < len(cur):
+            cur = cur[int(part)]
+        else:
+            return _MISSING
+        if cur is _MISSING:
+            return _MISSING
+    return cur
+
+def set_path(doc: Dict[str, Any], path: str, value: Any) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+def unset_path(doc: Dict[str, Any], path: str) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+_BSON_TYPES = {"array": list, "string": str, "object": dict, "bool": bool, "double": float,
+               "int": int, "long": int, "objectId": ObjectId, "null": type(None)}
+
+def _cmp(op: str, val: Any, arg: Any) -> bool:
+    try:
+        if op == "$gt":  return val > arg
+        if op == "$gte": return val >= arg
+        if op == "$lt":  return val < arg
+        if op == "$lte": return val <= arg
+    except TypeError:
+        return False
+    raise ValueError(f"unsupported operator {op}")
+
+def _match_value(val: Any, cond: Any) -> bool:
+    if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+        for op, arg in cond.items():
+            if op == "$exists":
+                if (val is not _MISSING) != bool(arg):
+                    return False
+            elif op == "$eq":
+                if not _match_value(val, arg):
+                    return False
+            elif op == "$ne":
+                if _match_value(val, arg):
+                    return False
+            elif op == "$in":
+                if not any(_match_value(val, a) for a in arg):
+                    return False
+            elif op == "$nin":
+                if any(_match_value(val, a) for a in arg):
+                    return False
+            elif op == "$size":
+                if not (isinstance(val, list) and len(val) == arg):
+                    return False
+            elif op == "$type":
+                if not isinstance(val, _BSON_TYPES.get(arg, ())) or (arg in ("int", "long", "double") and isinstance(val, bool)):
+                    return False
+            elif op == "$not":
+                if _match_value(val, arg):
+                    return False
+            elif op == "$regex":
+                if not (isinstance(val, str) and re.search(arg, val, re.I if "i" in cond.get("$options", "") else 0)):
+                    return False
+            elif op == "$options":
+                continue
+            else:
+                if val is _MISSING:
+                    return False
+                if isinstance(val, list):
+                    if not any(_cmp(op, v, arg) for v in val):
+                        return False
+                elif not _cmp(op, val, arg):
+                    return False
+        return True
+    if val is _MISSING:
+        return cond is None
+    if isinstance(val, list) and not isinstance(cond, list):
+        return cond in val
+    return val == cond
+
+def match(doc: Dict[str, Any], flt: Optional[Dict[str, Any]]) -> bool:
+    for key, cond in (flt or {}).items():
+        if key == "$and":
+            if not all(match(doc, f) for f in cond):
+                return False
+        elif key == "$or":
+            if not any(match(doc, f) for f in cond):
+                return False
+        elif key == "$nor":
+            if any(match(doc, f) for f in cond):
+                return False
+        elif not _match_value(get_path(doc, key), cond):
+            return False
+    return True
+
+def evaluate(expr: Any, doc: Dict[str, Any], meta: Dict[str, Any] = None) -> Any:
+    """Aggregation expressions: field paths, literals and a handful of operators."""
+    if isinstance(expr, str) and expr.startswith("$"):
+        v = get_path(doc, expr[1:])
+        return None if v is _MISSING else v
+    if isinstance(expr, list):
+        return [evaluate(e, doc, meta) for e in expr]
+    if not isinstance(expr, dict) or not expr:
+        return expr
+    op, arg = next(iter(expr.items()))
+    if not op.startswith("$"):
+        return {k: evaluate(v, doc, meta) for k, v in expr.items()}
+    args = arg if isinstance(arg, list) else [arg]
+    if op == "$literal":
+        return arg
+    if op == "$meta":
+        return (meta or {}).get(arg)
+    if op == "$ifNull":
+        for a in args:
+            v = evaluate(a, doc, meta)
+            if v is not None:
+                return v
+        return None
+    if op == "$cond":
+        c, t, f = (arg["if"], arg["then"], arg["else"]) if isinstance(arg, dict) else args
+        return evaluate(t if evaluate(c, doc, meta) else f, doc, meta)
+    if op == "$isArray":
+        return isinstance(evaluate(args[0], doc, meta), list)
+    if op == "$size":
+        return len(evaluate(args[0], doc, meta) or [])
+    if op == "$concat":
+        vals = [evaluate(a, doc, meta) for a in args]
+        return None if any(v is None for v in vals) else "".join(vals)
+    if op == "$toString":
+        v = evaluate(args[0], doc, meta)
+        return None if v is None else str(v)
+    if op in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte"):
+        a, b = (evaluate(x, doc, meta) for x in args)
+        return a == b if op == "$eq" else a != b if op == "$ne" else _cmp(op, a, b)
+    if op == "$and":
+        return all(evaluate(a, doc, meta) for a in args)
+    if op == "$or":
+        return any(evaluate(a, doc, meta) for a in args)
+    if op == "$not":
+        return not evaluate(args[0], doc, meta)
+    if op == "$in":
+        v, arr = (evaluate(x, doc, meta) for x in args)
+        return v in (arr or [])
+    if op in ("$add", "$multiply"):
+        vals = [evaluate(a, doc, meta) or 0 for a in args]
+        out = 0 if op == "$add" else 1
+        for v in vals:
+            out = out + v if op == "$add" else out * v
+        return out
+    if op == "$subtract":
+        a, b = (evaluate(x, doc, meta) for x in args)
+        return a - b
+    if op == "$divide":
+        a, b = (evaluate(x, doc, meta) for x in args)
+        return a / b if b else None
+    raise NotImplementedError(f"local stand-in: expression operator {op} not supported")
+
+def project(doc: Dict[str, Any], spec: Dict[str, Any], meta: Dict[str, Any] = None) -> Dict[str, Any]:
+    spec = dict(spec)
+    include_id = spec.pop("_id", 1)
+    exclusion = spec and all(v in (0, False) for v in spec.values())
+    if exclusion or (not spec and include_id in (0, False)):
+        out = copy.deepcopy(doc)
+        for k in spec:
+            unset_path(out, k)
+        if include_id in (0, False):
+            out.pop("_id", None)
+        return out
+    out: Dict[str, Any] = {}
+    if include_id not in (0, False) and "_id" in doc:
+        out["_id"] = doc["_id"] if include_id in (1, True) else evaluate(include_id, doc, meta)
+    for k, v in spec.items():
+        if v in (1, True):
+            val = get_path(doc, k)
+            if val is not _MISSING:
+                set_path(out, k, copy.deepcopy(val))
+        else:
+            set_path(out, k, evaluate(v, doc, meta))
+    return out
+
+def apply_update(doc: Dict[str, Any], update: Any, inserting: bool = False) -> None:
+    if isinstance(update, list):                       # pipeline-style update
+        for stage in update:
+            (op, spec), = stage.items()
+            if op in ("$set", "$addFields"):
+                new = {k: evaluate(v, doc) for k, v in spec.items()}
+                for k, v in new.items():
+                    set_path(doc, k, v)
+            elif op == "$unset":
+                for k in ([spec] if isinstance(spec, str) else spec):
+                    unset_path(doc, k)
+            else:
+                raise NotImplementedError(f"local stand-in: update stage {op} not supported")
+        return
+    for op, spec in update.items():
+        if op == "$set" or (op == "$setOnInsert" and inserting):
+            for k, v in spec.items():
+                set_path(doc, k, copy.deepcopy(v))
+        elif op == "$unset":
+            for k in spec:
+                unset_path(doc, k)
+        elif op == "$inc":
+            for k, v in spec.items():
+                cur = get_path(doc, k)
+                set_path(doc, k, (0 if cur is _MISSING else cur) + v)
+        elif op == "$setOnInsert":
+            continue
+        else:
+            raise NotImplementedError(f"local stand-in: update operator {op} not supported")
+
+def _sort_key(spec: Dict[str, int]):
+    def key(d):
+        out = []
+        for k, _ in spec.items():
+            v = get_path(d, k)
+            out.append((v is _MISSING or v is None, v if v is not _MISSING else None))
+        return out
+    return key
+
+def _sorted(docs: List[Dict[str, Any]], spec: Dict[str, int]) -> List[Dict[str, Any]]:
+    for k, direction in reversed(list(spec.items())):
+        docs = sorted(docs, key=_sort_key({k: direction}), reverse=direction < 0)
+    return docs
+
+def _bucket_auto(docs: List[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """$bucketAuto with the default {count} output; like MongoDB, each bucket's max is the next one's min."""
+    vals = sorted(v for v in (evaluate(spec["groupBy"], d) for d in docs) if v is not None)
+    n, k = len(vals), min(spec["buckets"], len(vals))
+    out, start = [], 0
+    for b in range(k):
+        if start >= n:
+            break
+        end = max(start + 1, round(n * (b + 1) / k))
+        while end < n and vals[end] == vals[end - 1]:   # equal values stay in one bucket
+            end += 1
+        out.append({"_id": {"min": vals[start], "max": vals[end] if end < n else vals[-1]}, "count": end - start})
+        start = end
+    return out
+
+# =====================================================================
+# In-process Atlas stand-in
+# =====================================================================
+class LocalCursor:
+    def __init__(self, docs: List[Dict[str, Any]]):
+        self._docs = docs
+
+    def __iter__(self):
+        return iter(self._docs)
+
+    def sort(self, key, direction=1):
+        spec = dict(key) if isinstance(key, list) else {key: direction}
+        self._docs = _sorted(self._docs, spec)
+        return self
+
+    def limit(self, n: int):
+        if n:
+            self._docs = self._docs[:n]
+        return self
+
+    def skip(self, n: int):
+        self._docs = self._docs[n:]
+        return self
+
+    def batch_size(self, n: int):
+        return self
+
+    def close(self) -> None:
+        pass
+
+class LocalCollection:
+    def __init__(self, database: "LocalDatabase", name: str):
+        self.database, self.name = database, name
+        self.full_name = f"{database.name}.{name}"
+        self.docs: List[Dict[str, Any]] = []
+        self.search_indexes: List[Dict[str, Any]] = []
+        self.embed_dim_for_query = None
+        self._lock = threading.RLock()
+        self._version = 0          # bumped on every write; invalidates cached vector matrices
+        self._matrices: Dict[Any, Any] = {}
+        self._dirty = False
+        self._load()
+
+    # ----- persistence -----
+    def _paths(self):
+        base = os.path.join(self.database.client.store_dir, self.full_name)
+        return base + ".jsonl", base + ".indexes.json"
+
+    def _load(self) -> None:
+        docs_path, idx_path = self._paths()
+        if os.path.exists(docs_path):
+            with open(docs_path, encoding="utf-8") as fh:
+                self.docs = [json_util.loads(line) for line in fh if line.strip()]
+        if os.path.exists(idx_path):
+            with open(idx_path) as fh:
+                self.search_indexes = json.load(fh)
+
+    def save(self) -> None:
+        if not self._dirty or not self.database.client.store_dir:
+            return
+        os.makedirs(self.database.client.store_dir, exist_ok=True)
+        docs_path, idx_path = self._paths()
+        with self._lock:
+            with open(docs_path + ".tmp", "w", encoding="utf-8") as fh:
+                for d in self.docs:
+                    fh.write(json_util.dumps(d) + "\n")
+            os.replace(docs_path + ".tmp", docs_path)
+            with open(idx_path, "w") as fh:
+                json.dump(self.search_indexes, fh, indent=2)
+            self._dirty = False
+
+    def _touch(self) -> None:
+        self._version += 1
+        self._dirty = True
+
+    # ----- reads -----
+    def find(self, filter: Dict[str, Any] = None, projection: Dict[str, Any] = None, **kwargs) -> LocalCursor:
+        with self._lock:
+            docs = [d for d in self.docs if match(d, filter)]
+        if isinstance(projection, list):
+            projection = {k: 1 for k in projection}
+        return LocalCursor([project(d, projection) if projection else copy.deepcopy(d) for d in docs])
+
+    def find_one(self, filter: Dict[str, Any] = None, projection: Dict[str, Any] = None, **kwargs):
+        for d in self.find(filter, projection):
+            return d
+        return None
+
+    def count_documents(self, filter: Dict[str, Any], limit: int = 0, **kwargs) -> int:
+        with self._lock:
+            n = sum(1 for d in self.docs if match(d, filter))
+        return min(n, limit) if limit else n
+
+    def estimated_document_count(self, **kwargs) -> int:
+        return len(self.docs)
+
+    def distinct(self, key: str, filter: Dict[str, Any] = None) -> List[Any]:
+        out = []
+        for d in self.find(filter):
+            v = get_path(d, key)
+            for x in (v if isinstance(v, list) else [v]):
+                if x is not _MISSING and x not in out:
+                    out.append(x)
+        return out
+
+    # ----- writes -----
+    def insert_one(self, doc: Dict[str, Any]):
+        return types.SimpleNamespace(inserted_id=self.insert_many([doc]).inserted_ids[0])
+
+    def insert_many(self, docs: Iterable[Dict[str, Any]], ordered: bool = True):
+        ids = []
+        with self._lock:
+            for d in docs:
+                d.setdefault("_id", ObjectId())
+                self.docs.append(copy.deepcopy(d))
+                ids.append(d["_id"])
+            self._touch()
+        return types.SimpleNamespace(inserted_ids=ids, acknowledged=True)
+
+    def _update(self, filter, update, upsert=False, multi=False, replace=False):
+        matched = modified = 0
+        upserted_id = None
+        with self._lock:
+            for d in self.docs:
+                if not match(d, filter):
+                    continue
+                matched += 1
+                before = json_util.dumps(d)
+                if replace:
+                    _id = d["_id"]
+                    d.clear()
+                    d.update(copy.deepcopy(update), _id=_id)
+                else:
+                    apply_update(d, update)
+                modified += int(json_util.dumps(d) != before)
+                if not multi:
+                    break
+            if not matched and upsert:
+                new = {k: v for k, v in (filter or {}).items() if not k.startswith("$") and not isinstance(v, dict)}
+                if replace:
+                    new.update(copy.deepcopy(update))
+                else:
+                    apply_update(new, update, inserting=True)
+                new.setdefault("_id", ObjectId())
+                self.docs.append(new)
+                upserted_id = new["_id"]
+            if modified or upserted_id is not None:
+                self._touch()
+        return types.SimpleNamespace(matched_count=matched, modified_count=modified,
+                                     upserted_id=upserted_id, acknowledged=True)
+
+    def update_one(self, filter, update, upsert=False, **kwargs):
+        return self._update(filter, update, upsert=upsert)
+
+    def update_many(self, filter, update, upsert=False, **kwargs):
+        return self._update(filter, update, upsert=upsert, multi=True)
+
+    def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        return self._update(filter, replacement, upsert=upsert, replace=True)
+
+    def delete_one(self, filter):
+        with self._lock:
+            for i, d in enumerate(self.docs):
+                if match(d, filter):
+                    del self.docs[i]
+                    self._touch()
+                    return types.SimpleNamespace(deleted_count=1)
+        return types.SimpleNamespace(deleted_count=0)
+
+    def delete_many(self, filter):
+        with self._lock:
+            keep = [d for d in self.docs if not match(d, filter)]
+            n = len(self.docs) - len(keep)
+            self.docs = keep
+            if n:
+                self._touch()
+        return types.SimpleNamespace(deleted_count=n)
+
+    def bulk_write(self, requests: List[Any], ordered: bool = True, **kwargs):
+        res = {"inserted_count": 0, "matched_count": 0, "modified_count": 0, "upserted_count": 0,
+               "deleted_count": 0}
+        for op in requests:
+            kind = type(op).__name__
+            if kind == "InsertOne":
+                self.insert_many([op._doc])
+                res["inserted_count"] += 1
+                continue
+            if kind in ("DeleteOne", "DeleteMany"):
+                delete = self.delete_one if kind == "DeleteOne" else self.delete_many
+                res["deleted_count"] += delete(op._filter).deleted_count
+                continue
+            r = self._update(op._filter, op._doc, upsert=bool(op._upsert),
+                             multi=kind == "UpdateMany", replace=kind == "ReplaceOne")
+            res["matched_count"] += r.matched_count
+            res["modified_count"] += r.modified_count
+            res["upserted_count"] += int(r.upserted_id is not None)
+        return types.SimpleNamespace(acknowledged=True, **res)
+
+    def create_index(self, keys, **kwargs) -> str:
+        return kwargs.get("name") or "_".join(str(k) for k in (keys if isinstance(keys, list) else [keys]))
+
+    # ----- search indexes -----
+    def create_search_index(self, model) -> str:
+        doc = getattr(model, "document", model)
+        name = doc.get("name", "default")
+        with self._lock:
+            self.search_indexes = [i for i in self.search_indexes if i["name"] != name]
+            self.search_indexes.append({"name": name, "type": doc.get("type", "search"),
+                                        "definition": doc.get("definition", {})})
+            self._dirty = True
+        return name
+
+    def list_search_indexes(self, name: str = None) -> LocalCursor:
+        return LocalCursor([{"id": i["name"], "name": i["name"], "type": i["type"], "status": "READY",
+                             "queryable": True, "latestDefinition": i["definition"],
+                             "latestDefinitionVersion": {"version": 0}}
+                            for i in self.search_indexes if name in (None, i["name"])])
+
+    def _index_vector_field(self, index: str, path: str) -> Dict[str, Any]:
+        for i in self.search_indexes:
+            if i["name"] == index:
+                for f in i["definition"].get("fields", []):
+                    if f.get("type") in ("vector", "autoEmbed") and f.get("path") == path:
+                        return f
+        return {"path": path, "similarity": "cosine"}   # lenient: unknown index → exact cosine on path
+
+    def _matrix(self, path: str):
+        """(ids, unit float32 matrix, dim) for docs holding a vector at path; cached until the next write."""
+        key = (path, self._version)
+        hit = self._matrices.get(key)
+        if hit is None:
+            rows, vecs = [], []
+            with self._lock:
+                for i, d in enumerate(self.docs):
+                    v = get_path(d, path)
+                    if isinstance(v, list) and v and isinstance(v[0], (int, float)):
+                        rows.append(i)
+                        vecs.append(v)
+            dims = {len(v) for v in vecs}
+            dim = max(dims, key=lambda x: sum(len(v) == x for v in vecs)) if dims else 0
+            keep = [k for k, v in enumerate(vecs) if len(v) == dim]
+            mat = np.asarray([vecs[k] for k in keep], dtype=np.float32).reshape(len(keep), dim)
+            hit = ([rows[k] for k in keep], mat, dim)
+            self._matrices = {key: hit}
+        return hit
+
+    def _vector_search(self, spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+        path = spec["path"]
+        fld = self._index_vector_field(spec.get("index", "default"), path)
+        rows, mat, dim = self._matrix(path)
+        if "queryVector" in spec:
+            q = np.asarray(spec["queryVector"], dtype=np.float32)
+        else:                                               # auto-embedding index: embed the text locally
+            q = np.asarray(stub_embedding(spec["query"], dim or DEFAULT_DIM), dtype=np.float32)
+            if AUTO_EMBED_MS:
+                time.sleep(AUTO_EMBED_MS / 1000)
+        if not rows:
+            return []
+        if q.shape[0] != dim:
+            if STRICT_DIMS:
+                raise ValueError(f"$vectorSearch: query has {q.shape[0]} dims, '{path}' holds {dim}")
+            d = min(q.shape[0], dim)                        # stub vectors are prefix-stable → compare prefixes
+            q, mat = q[:d], mat[:, :d]
+        sim = fld.get("similarity", "cosine")
+        if sim == "euclidean":
+            scores = 1.0 / (1.0 + np.linalg.norm(mat - q, axis=1))
+        else:
+            qn = q / (np.linalg.norm(q) or 1.0)
+            mn = mat / np.maximum(np.linalg.norm(mat, axis=1, keepdims=True), 1e-12)
+            scores = (1.0 + mn @ qn) / 2.0
+        flt = spec.get("filter")
+        order = np.argsort(-scores, kind="stable")
+        out = []
+        with self._lock:
+            for j in order:
+                d = self.docs[rows[j]]
+                if flt and not match(d, flt):
+                    continue
+                out.append((d, float(scores[j])))
+                if len(out) >= spec.get("limit", 10):
+                    break
+        return [dict(copy.deepcopy(d), __score=s) for d, s in out]
+
+    def _geo_near(self, spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """$geoNear over GeoJSON Points (spherical, metres), with query + maxDistance; nearest first."""
+        lon0, lat0 = (math.radians(c) for c in spec["near"]["coordinates"])
+        out = []
+        with self._lock:
+            for d in self.docs:
+                pt = get_path(d, spec.get("key", "location"))
+                if not isinstance(pt, dict) or not match(d, spec.get("query")):
+                    continue
+                lon, lat = (math.radians(c) for c in pt["coordinates"])
+                a = math.sin((lat - lat0) / 2) ** 2 + math.cos(lat0) * math.cos(lat) * math.sin((lon - lon0) / 2) ** 2
+                dist = 2 * 6_371_008.8 * math.asin(math.sqrt(min(a, 1.0)))
+                if dist <= spec.get("maxDistance", float("inf")):
+                    out.append((dist, d))
+        out.sort(key=lambda x: x[0])
+        return [dict(copy.deepcopy(d), **{spec["distanceField"]: dist}) for dist, d in out]
+
+    # ----- aggregation -----
+    def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs) -> LocalCursor:
+        docs: Optional[List[Dict[str, Any]]] = None
+        for stage in pipeline:
+            (op, spec), = stage.items()
+            if op == "$vectorSearch":
+                docs = self._vector_search(spec)
+                continue
+            if op == "$geoNear":
+                docs = self._geo_near(spec)
+                continue
+            if op == "$listSearchIndexes":
+                docs = list(self.list_search_indexes((spec or {}).get("name")))
+                continue
+            if docs is None:
+                with self._lock:
+                    docs = [dict(d) for d in self.docs]
+            meta = lambda d: {"vectorSearchScore": d.get("__score"), "searchScore": d.get("__score")}
+            if op == "$match":
+                docs = [d for d in docs if match(d, spec)]
+            elif op == "$project":
+                docs = [dict(project(d, spec, meta(d)), **({"__score": d["__score"]} if "__score" in d else {}))
+                        for d in docs]
+            elif op in ("$set", "$addFields"):
+                for d in docs:
+                    for k, v in spec.items():
+                        set_path(d, k, evaluate(v, d, meta(d)))
+            elif op == "$unset":
+                for d in docs:
+                    for k in ([spec] if isinstance(spec, str) else spec):
+                        unset_path(d, k)
+            elif op == "$limit":
+                docs = docs[:spec]
+            elif op == "$skip":
+                docs = docs[spec:]
+            elif op == "$sort":
+                docs = _sorted(docs, spec)
+            elif op == "$count":
+                docs = [{spec: len(docs)}]
+            elif op == "$bucketAuto":
+                docs = _bucket_auto(docs, spec)
+            elif op == "$group":
+                groups: Dict[str, Dict[str, Any]] = {}
+                for d in docs:
+                    gid = evaluate(spec["_id"], d, meta(d))
+                    g = groups.setdefault(json_util.dumps(gid), {"_id": gid})
+                    for k, acc in spec.items():
+                        if k == "_id":
+                            continue
+                        (aop, aexpr), = acc.items()
+                        v = evaluate(aexpr, d, meta(d))
+                        if aop == "$sum":
+                            g[k] = g.get(k, 0) + (v or 0)
+                        elif aop == "$push":
+                            g.setdefault(k, []).append(v)
+                        elif aop == "$first":
+                            g.setdefault(k, v)
+                        elif aop == "$max":
+                            g[k] = v if k not in g else max(g[k], v)
+                        elif aop == "$min":
+                            g[k] = v if k not in g else min(g[k], v)
+                        else:
+                            raise NotImplementedError(f"local stand-in: accumulator {aop} not supported")
+                docs = list(groups.values())
+            elif op == "$unionWith":
+                other = self.database[spec["coll"]] if isinstance(spec, dict) else self.database[spec]
+                docs = docs + list(other.aggregate(spec.get("pipeline", []) if isinstance(spec, dict) else []))
+            else:
+                raise NotImplementedError(f"local stand-in: stage {op} not supported")
+        return LocalCursor([{k: v for k, v in d.items() if k != "__score"} for d in (docs or [])])
+
+    def watch(self, *args, **kwargs):
+        raise NotImplementedError("change streams need a replica set: use --mongo-uri with a local mongod")
+
+class LocalDatabase:
+    def __init__(self, client: "LocalClient", name: str):
+        self.client, self.name = client, name
+        self._colls: Dict[str, LocalCollection] = {}
+
+    def __getitem__(self, name: str) -> LocalCollection:
+        if name not in self._colls:
+            self._colls[name] = LocalCollection(self, name)
+        return self._colls[name]
+
+    def __getattr__(self, name: str) -> LocalCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def list_collection_names(self) -> List[str]:
+        names = set(self._colls)
+        for p in glob.glob(os.path.join(self.client.store_dir, f"{self.name}.*.jsonl")):
+            names.add(os.path.basename(p)[len(self.name) + 1:-len(".jsonl")])
+        return sorted(names)
+
+    def command(self, cmd, value=None, **kwargs) -> Dict[str, Any]:
+        name = next(iter(cmd)) if isinstance(cmd, dict) else cmd
+        if name == "ping":
+            return {"ok": 1.0}
+        if name == "collStats":
+            c = self[value if value is not None else cmd[name]]
+            sizes = [len(json_util.dumps(d)) for d in c.docs]
+            return {"ns": c.full_name, "count": len(sizes), "size": sum(sizes),
+                    "avgObjSize": sum(sizes) / len(sizes) if sizes else 0, "totalIndexSize": 0, "ok": 1.0}
+        if name == "explain":
+            inner = cmd["explain"]
+            t0 = time.perf_counter()
+            n = len(list(self[inner["aggregate"]].aggregate(inner["pipeline"])))
+            ms = (time.perf_counter() - t0) * 1000
+            return {"stages": [{"$localStandIn": {"explain": {"note": "in-process emulation"}},
+                                "nReturned": n, "executionTimeMillisEstimate": round(ms, 2)}], "ok": 1.0}
+        raise NotImplementedError(f"local stand-in: command {name} not supported")
+
+class LocalClient:
+    """pymongo.MongoClient look-alike; the URI is ignored, data lives under store_dir."""
+    def __init__(self, uri: str = None, *args, store_dir: str = LOCAL_STORE_DIR, **kwargs):
+        self.store_dir = store_dir
+        self._dbs: Dict[str, LocalDatabase] = {}
+        self.admin = LocalDatabase(self, "admin")
+        atexit.register(self.close)
+
+    def __getitem__(self, name: str) -> LocalDatabase:
+        if name not in self._dbs:
+            self._dbs[name] = LocalDatabase(self, name)
+        return self._dbs[name]
+
+    def get_database(self, name: str) -> LocalDatabase:
+        return self[name]
+
+    def close(self) -> None:
+        for db in self._dbs.values():
+            for c in db._colls.values():
+                c.save()
+
+# =====================================================================
+# Patching + seeding
+# =====================================================================
+def stub_voyage_client(base_url: str):
+    import voyageai
+
+    class StubVoyageClient(voyageai.Client):
+        def __init__(self, api_key: str = None, max_retries: int = 0, timeout: float = None, **kwargs):
+            super().__init__(api_key="stub-key", max_retries=max_retries, timeout=timeout, base_url=base_url)
+
+        def tokenize(self, texts: List[str], model: str = None):
+            return [re.findall(r"\w+|[^\w\s]", t or "") for t in texts]
+    return StubVoyageClient
+
+def install(base_url: str, mongo_uri: str = None, store_dir: str = LOCAL_STORE_DIR) -> None:
+    """Point voyageai.Client at the stub and (unless a real mongo_uri is given) pymongo at LocalClient."""
+    import pymongo
+    import voyageai
+    voyageai.Client = stub_voyage_client(base_url)
+    if mongo_uri:
+        real = pymongo.MongoClient
+        pymongo.MongoClient = lambda uri=None, *a, **k: real(mongo_uri, *a, **k)
+    else:
+        shared = LocalClient(store_dir=store_dir)        # one store per process, like one cluster
+        pymongo.MongoClient = lambda uri=None, *a, **k: shared
+
+# A small, realistic slice of the NUCC taxonomy (enough for the eval queries)
+SAMPLE_ROWS = [
+    ("207RC0000X", "Allopathic & Osteopathic Physicians", "Internal Medicine", "Cardiovascular Disease", "Cardiovascular Disease Physician"),
+    ("2080P0202X", "Allopathic & Osteopathic Physicians", "Pediatrics", "Pediatric Cardiology", "Pediatric Cardiology Physician"),
+    ("207RN0300X", "Allopathic & Osteopathic Physicians", "Internal Medicine", "Nephrology", "Nephrology Physician"),
+    ("207N00000X", "Allopathic & Osteopathic Physicians", "Dermatology", "", "Dermatology Physician"),
+    ("207K00000X", "Allopathic & Osteopathic Physicians", "Allergy & Immunology", "", "Allergy & Immunology Physician"),
+    ("207V00000X", "Allopathic & Osteopathic Physicians", "Obstetrics & Gynecology", "", "Obstetrics & Gynecology Physician"),
+    ("207Y00000X", "Allopathic & Osteopathic Physicians", "Otolaryngology", "", "Otolaryngology Physician"),
+    ("207Q00000X", "Allopathic & Osteopathic Physicians", "Family Medicine", "", "Family Medicine Physician"),
+    ("207R00000X", "Allopathic & Osteopathic Physicians", "Internal Medicine", "", "Internal Medicine Physician"),
+    ("208000000X", "Allopathic & Osteopathic Physicians", "Pediatrics", "", "Pediatrics Physician"),
+    ("207RG0100X", "Allopathic & Osteopathic Physicians", "Internal Medicine", "Gastroenterology", "Gastroenterology Physician"),
+    ("2084N0400X", "Allopathic & Osteopathic Physicians", "Psychiatry & Neurology", "Neurology", "Neurology Physician"),
+    ("2084P0800X", "Allopathic & Osteopathic Physicians", "Psychiatry & Neurology", "Psychiatry", "Psychiatry Physician"),
+    ("207X00000X", "Allopathic & Osteopathic Physicians", "Orthopaedic Surgery", "", "Orthopaedic Surgery Physician"),
+    ("207W00000X", "Allopathic & Osteopathic Physicians", "Ophthalmology", "", "Ophthalmology Physician"),
+    ("207RE0101X", "Allopathic & Osteopathic Physicians", "Internal Medicine", "Endocrinology, Diabetes & Metabolism", "Endocrinology, Diabetes & Metabolism Physician"),
+    ("207RP1001X", "Allopathic & Osteopathic Physicians", "Internal Medicine", "Pulmonary Disease", "Pulmonary Disease Physician"),
+    ("207RH0003X", "Allopathic & Osteopathic Physicians", "Internal Medicine", "Hematology & Oncology", "Hematology & Oncology Physician"),
+    ("208800000X", "Allopathic & Osteopathic Physicians", "Urology", "", "Urology Physician"),
+    ("1223G0001X", "Dental Providers", "Dentist", "General Practice", "General Practice Dentist"),
+    ("363L00000X", "Physician Assistants & Advanced Practice Nursing Providers", "Nurse Practitioner", "", "Nurse Practitioner"),
+    ("225100000X", "Respiratory, Developmental, Rehabilitative and Restorative Service Providers", "Physical Therapist", "", "Physical Therapist"),
+    ("152W00000X", "Eye and Vision Services Providers", "Optometrist", "", "Optometrist"),
+    ("111N00000X", "Chiropractic Providers", "Chiropractor", "", "Chiropractor"),
+]
+
+def seed(store_dir: str = LOCAL_STORE_DIR, dim: int = SEED_DIM, snapshot: str = None) -> int:
+    """(Re)create the sample collection with stub vectors and the search indexes the scripts query."""
+    from embedder import RERANK_TEXT_FIELD, build_embedding_text, build_rerank_text, text_hash
+    if snapshot:
+        with open(snapshot, encoding="utf-8") as fh:
+            rows = [json.loads(line) for line in fh if line.strip()]
+    else:
+        rows = [{"code": c, "grouping": g, "classification": cl, "specialization": sp, "displayName": dn,
+                 "section": "Individual"} for c, g, cl, sp, dn in SAMPLE_ROWS]
+    client = LocalClient(store_dir=store_dir)
+    coll = client[SEED_DB][SEED_COLL]
+    coll.delete_many({})
+    for r in rows:
+        text = build_embedding_text(r)
+        r.update(embedding=stub_embedding(text, dim), embedding_model=SEED_MODEL,
+                 embedding_text_hash=text_hash(text), **{RERANK_TEXT_FIELD: build_rerank_text(r)})
+    coll.insert_many(rows)
+    fields = [{"type": "vector", "path": "embedding", "numDimensions": dim, "similarity": "cosine"}] + \
+             [{"type": "filter", "path": f} for f in ("code", "classification", "specialization", "section")]
+    for name in SEED_INDEXES:
+        coll.create_search_index({"name": name, "type": "vectorSearch", "definition": {"fields": fields}})
+    client.close()
+    return len(rows)
+
+def stub_config_from(args) -> StubConfig:
+    return StubConfig(args.latency_ms, args.per_item_ms, args.jitter_ms, args.error_rate, args.throttle_rate, args.seed)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Offline Voyage / Atlas stand-ins")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("serve", "run"):
+        p = sub.add_parser(name)
+        p.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+        p.add_argument("--per-item-ms", type=float, default=LATENCY_PER_ITEM)
+        p.add_argument("--jitter-ms", type=float, default=JITTER_MS)
+        p.add_argument("--error-rate", type=float, default=ERROR_RATE)
+        p.add_argument("--throttle-rate", type=float, default=THROTTLE_RATE)
+        p.add_argument("--seed", type=int, default=STUB_SEED)
+    sub.choices["serve"].add_argument("--port", type=int, default=8765)
+    run_p = sub.choices["run"]
+    run_p.add_argument("--store", default=LOCAL_STORE_DIR)
+    run_p.add_argument("--mongo-uri", help="Use a real (local) mongod instead of the in-process store")
+    run_p.add_argument("--auto-embed-ms", type=float, default=AUTO_EMBED_MS,
+                       help="Server-side embedding time charged to $vectorSearch.query")
+    run_p.add_argument("--loose-dims", action="store_true",
+                       help="Truncate mismatched query / index dims to a shared prefix instead of failing")
+    run_p.add_argument("script")
+    run_p.add_argument("script_args", nargs=argparse.REMAINDER)
+    seed_p = sub.add_parser("seed")
+    seed_p.add_argument("--store", default=LOCAL_STORE_DIR)
+    seed_p.add_argument("--dim", type=int, default=SEED_DIM)
+    seed_p.add_argument("--snapshot", help="JSONL rows (e.g. fastpath.py --export) instead of the built-in sample")
+    args = ap.parse_args()
+
+    if args.cmd == "seed":
+        n = seed(args.store, args.dim, args.snapshot)
+        print(f"✅ Seeded {n} docs ({args.dim}-dim stub vectors) into {args.store}/{SEED_DB}.{SEED_COLL}")
+    elif args.cmd == "serve":
+        srv, url = start_voyage_stub(stub_config_from(args), port=args.port)
+        print(f"Voyage stub listening on {url}  (Ctrl-C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            srv.shutdown()
+    else:
+        srv, url = start_voyage_stub(stub_config_from(args))
+        AUTO_EMBED_MS = args.auto_embed_ms
+        STRICT_DIMS = not args.loose_dims
+        install(url, args.mongo_uri, args.store)
+        sys.argv = [args.script] + args.script_args
+        sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+        try:
+            runpy.run_path(args.script, run_name="__main__")
+        finally:
+            c = srv.stub_config.counters
+            print(f"\n[stub] embeddings={c['embeddings']} rerank={c['rerank']} "
+                  f"errors={c['errors']} throttled={c['throttled']}", file=sys.stderr)
@@ -0,0 +1,114 @@
+# multi_search.py — Many $vectorSearch queries in a handful of round-trips
+# - search_many(): N $vectorSearch specs → N result lists. Specs are packed UNION_BATCH per aggregate:
+#   the first is the leading $vectorSearch, the rest ride along as $unionWith sub-pipelines on the same
+#   collection. Every branch stamps its query id (_qid) so the flat cursor is split back apart.
+#   (Atlas supports $vectorSearch inside $unionWith from 6.0.10 / 7.0.2.)
+# - LocalVectorIndex: the same contract served from an in-memory float32 matrix — one matmul per batch,
+#   exact (ENN) scores on the Atlas vectorSearchScore scale
+#
+# Usage:
+#   specs = [vector_spec(INDEX, "embedding", qvec=v, limit=10, num_candidates=500) for v in qvecs]
+#   results = search_many(coll, specs, stages=[PROJECT_STAGE])      # results[i] ↔ qvecs[i]
+#   gated = search_many(coll, specs, stages=[PROJECT_STAGE, *min_score_stages(0.7)])   # gate in Atlas
+
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from fastpath import FIELDS, PROJECTION, normalize_row
+
+# ---------------- CONFIG ----------------
+UNION_BATCH = 25         # $vectorSearch branches per aggregate (keep the response well under 16MB)
+QID_FIELD = "_qid"
+# ----------------------------------------
+
+COUNTERS = {"queries": 0, "aggregates": 0}
+
+def vector_spec(index: str, path: str, qvec: Sequence[float] = None, query: str = None, limit: int = 10,
+                num_candidates: int = 100, filter: Dict[str, Any] = None) -> Dict[str, Any]:
+    """$vectorSearch body for a client-side vector (qvec) or an auto-embedding index (query text)."""
+    spec = {"index": index, "path": path, "numCandidates": num_candidates, "limit": limit}
+    if qvec is not None:
+        spec["queryVector"] = list(qvec)
+    else:
+        spec["query"] = query
+    if filter:
+        spec["filter"] = filter
+    return spec
+
+def min_score_stages(threshold: Optional[float], field: str = "score") -> List[Dict[str, Any]]:
+    """Server-side score gate; goes after a $project that exposes {field: {$meta: "vectorSearchScore"}}."""
+    return [] if threshold is None else [{"$match": {field: {"$gte": threshold}}}]
+
+def _branch(spec: Dict[str, Any], stages: Sequence[Dict[str, Any]], qid: int) -> List[Dict[str, Any]]:
+    return [{"$vectorSearch": spec}, *stages, {"$addFields": {QID_FIELD: qid}}]
+
+def search_many(coll, specs: List[Dict[str, Any]], stages: Sequence[Dict[str, Any]] = (),
+                batch: int = UNION_BATCH, max_time_ms: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+    """
+    Run every spec (+ the same trailing stages, e.g. $match / $project) and return one list per spec,
+    in ANN order. ceil(N / batch) aggregates instead of N. max_time_ms caps each aggregate (maxTimeMS).
+    """
+    opts = {"maxTimeMS": max_time_ms} if max_time_ms else {}
+    out: List[List[Dict[str, Any]]] = [[] for _ in specs]
+    for start in range(0, len(specs), batch):
+        group = range(start, min(start + batch, len(specs)))
+        pipeline = _branch(specs[group[0]], stages, group[0])
+        for i in group[1:]:
+            pipeline.append({"$unionWith": {"coll": coll.name, "pipeline": _branch(specs[i], stages, i)}})
+        # One cursor batch for the whole union, so there is no getMore round-trip
+        rows = sum(specs[i].get("limit", 10) for i in group)
+        for d in coll.aggregate(pipeline, batchSize=rows, **opts):
+            out[d.pop(QID_FIELD)].append(d)
+        COUNTERS["aggregates"] += 1
+        COUNTERS["queries"] += len(group)
+    return out
+
+def print_counters() -> None:
+    c = COUNTERS
+    print(f"Multi-search: {c['queries']} queries in {c['aggregates']} aggregates")
+
+class LocalVectorIndex:
+    """Exact search over a snapshot of the collection's vectors; search_many() is one matmul."""
+    def __init__(self, rows: List[Dict[str, Any]], vectors: np.ndarray, similarity: str = "cosine"):
+        self.rows = rows
+        self.similarity = similarity
+        self.mat = np.asarray(vectors, dtype=np.float32)
+        if similarity == "cosine":
+            self.mat = self.mat / np.maximum(np.linalg.norm(self.mat, axis=1, keepdims=True), 1e-12)
+
+    @classmethod
+    def from_collection(cls, coll, path: str = "embedding", similarity: str = "cosine") -> "LocalVectorIndex":
+        rows, vecs = [], []
+        for d in coll.find({path: {"$type": "array"}}, projection={**PROJECTION, path: 1}):
+            v = d.get(path)
+            if vecs and len(v) != len(vecs[0]):
+                continue                                  # mixed dimensions: keep the first seen
+            rows.append(normalize_row(d))
+            vecs.append(v)
+        dim = len(vecs[0]) if vecs else 0
+        return cls(rows, np.asarray(vecs, dtype=np.float32).reshape(len(vecs), dim), similarity)
+
+    def search_many(self, qvecs: Sequence[Sequence[float]], limit: int,
+                    where: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[List[Dict[str, Any]]]:
+        if not len(self.rows) or not len(qvecs):
+            return [[] for _ in qvecs]
+        q = np.asarray(qvecs, dtype=np.float32)
+        if self.similarity == "euclidean":
+            d2 = (q ** 2).sum(1)[:, None] - 2 * q @ self.mat.T + (self.mat ** 2).sum(1)[None, :]
+            scores = 1.0 / (1.0 + np.sqrt(np.maximum(d2, 0.0)))
+        else:
+            if self.similarity == "cosine":
+                q = q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+            scores = (1.0 + q @ self.mat.T) / 2.0         # Atlas vectorSearchScore scale
+        if where is not None:
+            scores[:, [not where(r) for r in self.rows]] = -np.inf
+        k = min(limit, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        out = []
+        for i, idx in enumerate(top):
+            idx = idx[np.argsort(-scores[i, idx], kind="stable")]
+            out.append([{**{f: self.rows[j][f] for f in FIELDS}, "score": float(scores[i, j])}
+                        for j in idx if scores[i, j] > -np.inf])
+        COUNTERS["queries"] += len(qvecs)
+        return out
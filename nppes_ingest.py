@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# nppes_ingest.py — Load the monthly NPPES provider file into a provider collection keyed by taxonomy code
+# - The multi-GB npidata_pfile CSV is split into CHUNK_BYTES byte ranges (aligned to line starts) and
+#   parsed by a process pool; each worker keeps only NPI, name, taxonomy codes, practice address + phone
+# - Location = ZIP centroid (Census ZCTA gazetteer) as a GeoJSON Point, since NPPES has no coordinates
+# - Output: MongoDB (ReplaceOne upserts by NPI, unordered bulk batches of BULK_SIZE, compound
+#   {taxonomy_codes: 1, location: "2dsphere"} index built after the load) or, with --out-dir,
+#   a local columnar store (one .npz of column arrays per chunk)
+# - Deactivated NPIs (and rows left with no taxonomy code) are deleted by NPI, so a monthly reload
+#   removes providers loaded by an earlier file; the columnar store is rewritten whole
+# - Resumable: finished chunks are recorded in a checkpoint file tied to the input's size + mtime;
+#   a rerun skips them (upserts make a half-finished chunk safe to redo)
+#
+# Run:
+#   python3 nppes_ingest.py npidata_pfile_20250101-20250131.csv --zips 2023_Gaz_zcta_national.txt
+#   python3 nppes_ingest.py npidata.csv --zips zcta.txt --workers 8 --out-dir providers_store
+#   python3 nppes_ingest.py npidata.csv --zips zcta.txt --restart        # ignore the checkpoint
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from pymongo import ASCENDING, DeleteOne, MongoClient, ReplaceOne
+
+# ---------------- CONFIG ----------------
+MONGODB_URI    = ""
+DB             = "NUCC"
+PROVIDERS_COLL = "providers"
+CHUNK_BYTES    = 64 * 1024 * 1024     # ~64MB of CSV per task
+BULK_SIZE      = 5000                 # ops per unordered bulk_write
+WORKERS        = os.cpu_count() or 4
+MAX_TAXONOMIES = 15                   # NPPES carries Healthcare Provider Taxonomy Code_1 … _15
+CHECKPOINT_SUFFIX = ".nppes_ckpt.json"
+# ----------------------------------------
+
+COL_NPI      = "NPI"
+COL_ENTITY   = "Entity Type Code"
+COL_ORG      = "Provider Organization Name (Legal Business Name)"
+COL_LAST     = "Provider Last Name (Legal Name)"
+COL_FIRST    = "Provider First Name"
+COL_CRED     = "Provider Credential Text"
+COL_LINE1    = "Provider First Line Business Practice Location Address"
+COL_CITY     = "Provider Business Practice Location Address City Name"
+COL_STATE    = "Provider Business Practice Location Address State Name"
+COL_ZIP      = "Provider Business Practice Location Address Postal Code"
+COL_PHONE    = "Provider Business Practice Location Address Telephone Number"
+COL_DEACT    = "NPI Deactivation Date"
+COL_REACT    = "NPI Reactivation Date"
+COL_TAX      = "Healthcare Provider Taxonomy Code_{}"
+COL_PRIMARY  = "Healthcare Provider Primary Taxonomy Switch_{}"
+
+# ---------- ZIP centroids ----------
+def load_zip_centroids(path: str) -> Dict[str, Tuple[float, float]]:
+    """Census ZCTA gazetteer (tab-separated: GEOID … INTPTLAT INTPTLONG) → zip5 → (lon, lat)."""
+    out = {}
+    with open(path, encoding="utf-8") as fh:
+        header = [h.strip() for h in fh.readline().split("\t")]
+        i_zip, i_lat, i_lon = header.index("GEOID"), header.index("INTPTLAT"), header.index("INTPTLONG")
+        for line in fh:
+            p = line.rstrip("\n").split("\t")
+            try:
+                out[p[i_zip].strip()] = (float(p[i_lon]), float(p[i_lat]))
+            except (IndexError, ValueError):
+                continue
+    return out
+
+# ---------- chunking ----------
+def read_header(path: str) -> Tuple[List[str], int]:
+    with open(path, "rb") as fh:
+        line = fh.readline()
+    return next(csv.reader([line.decode("utf-8-sig")])), len(line)
+
+def plan_chunks(path: str, data_start: int, chunk_bytes: int = CHUNK_BYTES) -> List[Tuple[int, int]]:
+    """[start, end) byte ranges; each chunk owns the lines that *start* inside it."""
+    size = os.path.getsize(path)
+    return [(s, min(s + chunk_bytes, size)) for s in range(data_start, size, chunk_bytes)]
+
+def iter_lines(path: str, start: int, end: int):
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        if start:
+            fh.seek(start - 1)
+            if fh.read(1) != b"\n":
+                fh.readline()                     # partial line belongs to the previous chunk
+        while fh.tell() < end:
+            line = fh.readline()
+            if not line:
+                break
+            yield line.decode("utf-8", errors="replace")
+
+# ---------- parsing ----------
+def column_index(header: List[str]) -> Dict[str, int]:
+    idx = {h: i for i, h in enumerate(header)}
+    wanted = [COL_NPI, COL_ENTITY, COL_ORG, COL_LAST, COL_FIRST, COL_CRED, COL_LINE1, COL_CITY, COL_STATE,
+              COL_ZIP, COL_PHONE, COL_DEACT, COL_REACT]
+    wanted += [c.format(k) for k in range(1, MAX_TAXONOMIES + 1) for c in (COL_TAX, COL_PRIMARY)]
+    missing = [c for c in (COL_NPI, COL_TAX.format(1), COL_ZIP) if c not in idx]
+    if missing:
+        raise SystemExit(f"Not an NPPES provider file (missing {missing})")
+    return {c: idx[c] for c in wanted if c in idx}
+
+def parse_row(row: List[str], col: Dict[str, int], zips: Dict[str, Tuple[float, float]]) -> Optional[Dict[str, Any]]:
+    """Provider doc, or None if the NPI should not be in the collection (the loader deletes it)."""
+    get = lambda c: row[col[c]].strip() if c in col and col[c] < len(row) else ""
+    if get(COL_DEACT) and not get(COL_REACT):
+        return None                               # deactivated NPI
+    codes, primary = [], None
+    for k in range(1, MAX_TAXONOMIES + 1):
+        code = get(COL_TAX.format(k))
+        if code and code not in codes:
+            codes.append(code)
+            if get(COL_PRIMARY.format(k)) == "Y":
+                primary = code
+    if not codes:
+        return None
+    if get(COL_ENTITY) == "2":
+        name = get(COL_ORG)
+    else:
+        name = " ".join(p for p in (get(COL_FIRST), get(COL_LAST)) if p)
+    zip5 = get(COL_ZIP)[:5]
+    doc = {
+        "_id": get(COL_NPI), "npi": get(COL_NPI), "entity_type": int(get(COL_ENTITY) or 0),
+        "name": name, "credential": get(COL_CRED),
+        "taxonomy_codes": codes, "primary_taxonomy": primary or codes[0],
+        "address": {"line1": get(COL_LINE1), "city": get(COL_CITY), "state": get(COL_STATE), "zip": zip5},
+        "phone": get(COL_PHONE),
+    }
+    if zip5 in zips:
+        doc["location"] = {"type": "Point", "coordinates": list(zips[zip5])}
+    return doc
+
+# ---------- sinks ----------
+def write_mongo(coll, docs: List[Dict[str, Any]], deletes: List[str]) -> None:
+    ops = [ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs] + [DeleteOne({"_id": n}) for n in deletes]
+    for i in range(0, len(ops), BULK_SIZE):
+        coll.bulk_write(ops[i:i + BULK_SIZE], ordered=False)
+
+def write_columnar(out_dir: str, chunk_no: int, docs: List[Dict[str, Any]]) -> None:
+    loc = [d.get("location", {}).get("coordinates", [np.nan, np.nan]) for d in docs]
+    cols = {
+        "npi": np.array([int(d["npi"]) for d in docs], dtype=np.int64),
+        "lon": np.array([c[0] for c in loc], dtype=np.float32),
+        "lat": np.array([c[1] for c in loc], dtype=np.float32),
+        "taxonomy_codes": np.array(["|".join(d["taxonomy_codes"]) for d in docs]),
+        "primary_taxonomy": np.array([d["primary_taxonomy"] for d in docs]),
+        "name": np.array([d["name"] for d in docs]),
+        "city": np.array([d["address"]["city"] for d in docs]),
+        "state": np.array([d["address"]["state"] for d in docs]),
+        "zip": np.array([d["address"]["zip"] for d in docs]),
+    }
+    tmp = os.path.join(out_dir, f"chunk_{chunk_no:05d}.tmp.npz")
+    np.savez(tmp, **cols)
+    os.replace(tmp, os.path.join(out_dir, f"chunk_{chunk_no:05d}.npz"))
+
+# ---------- workers ----------
+_W: Dict[str, Any] = {}
+
+def init_worker(zip_path: str, out_dir: Optional[str]) -> None:
+    _W["zips"] = load_zip_centroids(zip_path)
+    _W["out_dir"] = out_dir
+    if not out_dir:
+        _W["coll"] = MongoClient(MONGODB_URI)[DB][PROVIDERS_COLL]   # one client per process
+
+def load_chunk(path: str, col: Dict[str, int], chunk_no: int, start: int, end: int) -> Dict[str, int]:
+    t0 = time.perf_counter()
+    docs, deletes, rows, deleted = [], [], 0, 0
+    for row in csv.reader(iter_lines(path, start, end)):
+        rows += 1
+        doc = parse_row(row, col, _W["zips"])
+        if doc is not None:
+            docs.append(doc)
+        elif col[COL_NPI] < len(row) and row[col[COL_NPI]].strip():
+            deletes.append(row[col[COL_NPI]].strip())
+        if not _W["out_dir"] and len(docs) + len(deletes) >= BULK_SIZE:
+            write_mongo(_W["coll"], docs, deletes)
+            docs, deleted, deletes = [], deleted + len(deletes), []
+    if _W["out_dir"]:
+        write_columnar(_W["out_dir"], chunk_no, docs)
+    elif docs or deletes:
+        write_mongo(_W["coll"], docs, deletes)
+    deleted += len(deletes)
+    return {"chunk": chunk_no, "rows": rows, "deleted": deleted, "ms": int((time.perf_counter() - t0) * 1000)}
+
+# ---------- checkpoint ----------
+def load_checkpoint(ckpt_path: str, fingerprint: Dict[str, Any]) -> set:
+    if os.path.exists(ckpt_path):
+        with open(ckpt_path) as fh:
+            state = json.load(fh)
+        if state.get("fingerprint") == fingerprint:
+            return set(state.get("done", []))
+    return set()
+
+def save_checkpoint(ckpt_path: str, fingerprint: Dict[str, Any], done: set) -> None:
+    with open(ckpt_path + ".tmp", "w") as fh:
+        json.dump({"fingerprint": fingerprint, "done": sorted(done)}, fh)
+    os.replace(ckpt_path + ".tmp", ckpt_path)
+
+def ensure_indexes(coll) -> None:
+    # The only geo index on the collection, so $geoNear picks it without a "key" (taxonomy $in prefix)
+    coll.create_index([("taxonomy_codes", ASCENDING), ("location", "2dsphere")], name="taxonomy_location")
+
+def run(path: str, zip_path: str, workers: int = WORKERS, out_dir: Optional[str] = None,
+        restart: bool = False, chunk_bytes: int = CHUNK_BYTES) -> None:
+    header, data_start = read_header(path)
+    col = column_index(header)
+    chunks = plan_chunks(path, data_start, chunk_bytes)
+    st = os.stat(path)
+    fingerprint = {"size": st.st_size, "mtime": int(st.st_mtime), "chunk_bytes": chunk_bytes, "out_dir": out_dir}
+    ckpt_path = (os.path.join(out_dir, os.path.basename(path)) if out_dir else path) + CHECKPOINT_SUFFIX
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    done = set() if restart else load_checkpoint(ckpt_path, fingerprint)
+    todo = [(i, s, e) for i, (s, e) in enumerate(chunks) if i not in done]
+    print(f"{len(chunks)} chunks of ≤{chunk_bytes >> 20}MB; {len(done)} already done, {len(todo)} to load "
+          f"with {workers} worker(s)", file=sys.stderr)
+
+    t0, rows, deleted = time.perf_counter(), 0, 0
+    def finished(res):
+        nonlocal rows, deleted
+        done.add(res["chunk"])
+        rows += res["rows"]
+        deleted += res["deleted"]
+        save_checkpoint(ckpt_path, fingerprint, done)
+        el = time.perf_counter() - t0
+        print(f"  chunk {res['chunk']:>4} ({res['ms']}ms)  {len(done)}/{len(chunks)} chunks, "
+              f"{rows} rows, {rows / el:,.0f} rows/s", file=sys.stderr)
+
+    if workers <= 1:
+        init_worker(zip_path, out_dir)
+        for i, s, e in todo:
+            finished(load_chunk(path, col, i, s, e))
+    else:
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(zip_path, out_dir)) as pool:
+            futs = [pool.submit(load_chunk, path, col, i, s, e) for i, s, e in todo]
+            for f in as_completed(futs):
+                finished(f.result())
+
+    if out_dir:
+        for name in os.listdir(out_dir):                  # chunks past the end of a shorter file
+            if name.startswith("chunk_") and name.endswith(".npz") and not name.endswith(".tmp.npz") \
+                    and int(name[6:-4]) >= len(chunks):
+                os.remove(os.path.join(out_dir, name))
+    else:
+        ensure_indexes(MongoClient(MONGODB_URI)[DB][PROVIDERS_COLL])
+    print(f"✅ Loaded {rows} rows ({deleted} inactive NPIs removed) in {time.perf_counter() - t0:.1f}s → "
+          f"{out_dir or f'{DB}.{PROVIDERS_COLL}'}", file=sys.stderr)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Parallel, resumable NPPES provider loader")
+    ap.add_argument("csv", help="npidata_pfile_*.csv")
+    ap.add_argument("--zips", required=True, help="Census ZCTA gazetteer file (ZIP centroids)")
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--out-dir", help="Write a local columnar store (.npz per chunk) instead of MongoDB")
+    ap.add_argument("--chunk-mb", type=int, default=CHUNK_BYTES >> 20)
+    ap.add_argument("--restart", action="store_true", help="Ignore the checkpoint and reload everything")
+    args = ap.parse_args()
+    run(args.csv, args.zips, args.workers, args.out_dir, args.restart, args.chunk_mb << 20)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# nucc_ingest.py — Load the official NUCC taxonomy CSV in one streaming pass: clean, embed, upsert
+# - Streams the CSV row by row (csv.DictReader), CHUNK_ROWS at a time, so memory stays bounded
+# - Fields are stored camelCase; Definition/Notes go through embedder.strip_markup
+# - Embedding text = embedder.build_embedding_text; rows whose text hash matches the stored
+#   embedding_text_hash and come from embedder.py's model at EMBED_DIM keep their vector (reruns only
+#   embed what changed, or everything after a model / dimension change); rerank_text is stored too
+# - Texts needing vectors are packed into embed calls by count (BATCH_SIZE) and estimated tokens
+# - Upserts by code with unordered bulk_write; --prune removes codes missing from the CSV
+#
+# Run:
+#   python3 nucc_ingest.py nucc_taxonomy_251.csv                   # into embedder's DB/collection
+#   python3 nucc_ingest.py nucc_taxonomy_252.csv --release 252     # into taxonomy252 (see nucc_release.py)
+#   python3 nucc_ingest.py nucc_taxonomy_252.csv --release 252 --no-embed   # load only
+
+import argparse
+import csv
+import sys
+from typing import Any, Dict, Iterator, List
+
+from pymongo import UpdateOne
+
+import embedder
+from embedder import RERANK_TEXT_FIELD, build_embedding_text, build_rerank_text, strip_markup, text_hash
+from nucc_release import is_current, release_coll_name
+
+# ---------------- CONFIG ----------------
+CHUNK_ROWS           = 500        # CSV rows per hash lookup / bulk_write
+MAX_TOKENS_PER_BATCH = 100_000    # stay under Voyage's per-request token limit
+CHARS_PER_TOKEN      = 4          # rough estimate used for packing
+CSV_ENCODING         = "utf-8-sig"
+# ----------------------------------------
+
+# Official CSV header → stored field
+COLUMNS = {
+    "Code": "code", "Grouping": "grouping", "Classification": "classification",
+    "Specialization": "specialization", "Definition": "definition", "Notes": "notes",
+    "Display Name": "displayName", "Section": "section",
+}
+MARKUP_FIELDS = ("definition", "notes")
+
+def read_rows(path: str, encoding: str = CSV_ENCODING) -> Iterator[Dict[str, str]]:
+    with open(path, newline="", encoding=encoding, errors="replace") as fh:
+        for raw in csv.DictReader(fh):
+            row = {}
+            for col, fld in COLUMNS.items():
+                v = (raw.get(col) or "").strip()
+                row[fld] = strip_markup(v) if fld in MARKUP_FIELDS else " ".join(v.split())
+            if row["code"]:
+                yield row
+
+def chunked(it: Iterator[Dict[str, str]], n: int) -> Iterator[List[Dict[str, str]]]:
+    chunk = []
+    for x in it:
+        chunk.append(x)
+        if len(chunk) == n:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def packed(items: List[Dict[str, Any]], max_n: int, max_tokens: int) -> Iterator[List[Dict[str, Any]]]:
+    """Group rows into embed calls bounded by count and estimated tokens."""
+    batch, tokens = [], 0
+    for it in items:
+        t = len(it["text"]) // CHARS_PER_TOKEN + 1
+        if batch and (len(batch) == max_n or tokens + t > max_tokens):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(it)
+        tokens += t
+    if batch:
+        yield batch
+
+def ingest(coll, path: str, embed: bool = True, prune: bool = False) -> Dict[str, int]:
+    coll.create_index("code", unique=True)
+    stats = {"rows": 0, "embedded": 0, "kept_vectors": 0, "upserted": 0, "modified": 0, "pruned": 0}
+    seen = set()
+    for chunk in chunked(read_rows(path), CHUNK_ROWS):
+        codes = [r["code"] for r in chunk]
+        seen.update(codes)
+        stored = {d["code"]: d for d in coll.aggregate([
+            {"$match": {"code": {"$in": codes}}},
+            {"$project": {"code": 1, "embedding_text_hash": 1, "embedding_model": 1,
+                          "dim": {"$size": {"$ifNull": ["$embedding", []]}}}}])}
+        items = []
+        for r in chunk:
+            text = build_embedding_text(r)
+            prev = stored.get(r["code"], {})
+            fresh = prev.get("embedding_text_hash") == text_hash(text) and \
+                is_current(prev.get("embedding_model"), prev.get("dim"))
+            items.append({"row": r, "text": text, "hash": text_hash(text), "needs_vector": embed and not fresh})
+        vectors = {}
+        for batch in packed([i for i in items if i["needs_vector"]], embedder.BATCH_SIZE, MAX_TOKENS_PER_BATCH):
+            for it, vec in zip(batch, embedder.embed_texts([i["text"] for i in batch])):
+                vectors[it["row"]["code"]] = vec
+        ops = []
+        for it in items:
+            fields = dict(it["row"])
+            fields[RERANK_TEXT_FIELD] = build_rerank_text(fields)
+            code = fields["code"]
+            if code in vectors:
+                fields.update(embedding=vectors[code], embedding_model=embedder.VOYAGE_MODEL,
+                              embedding_text_hash=it["hash"])
+            ops.append(UpdateOne({"code": code}, {"$set": fields}, upsert=True))
+        res = coll.bulk_write(ops, ordered=False)
+        stats["rows"] += len(chunk)
+        stats["embedded"] += len(vectors)
+        stats["kept_vectors"] += sum(1 for i in items if embed and not i["needs_vector"])
+        stats["upserted"] += res.upserted_count
+        stats["modified"] += res.modified_count
+        print(f"{stats['rows']} rows, {stats['embedded']} embedded", file=sys.stderr)
+    if prune and seen:
+        stats["pruned"] = coll.delete_many({"code": {"$nin": sorted(seen)}}).deleted_count
+    return stats
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Stream the NUCC taxonomy CSV into MongoDB (clean + embed + upsert)")
+    ap.add_argument("csv")
+    ap.add_argument("--release", help="Load into taxonomy<release> instead of embedder's collection")
+    ap.add_argument("--no-embed", action="store_true", help="Load fields only; embed later")
+    ap.add_argument("--prune", action="store_true", help="Delete codes that are not in the CSV")
+    args = ap.parse_args()
+
+    coll = embedder.connect()
+    if args.release:
+        coll = coll.database[release_coll_name(args.release)]
+    st = ingest(coll, args.csv, embed=not args.no_embed, prune=args.prune)
+    print(f"✅ {coll.full_name}: {st['rows']} rows ({st['upserted']} new, {st['modified']} updated, "
+          f"{st['pruned']} pruned); embedded {st['embedded']}, kept {st['kept_vectors']} vectors")
+    embedder.vo.print_summary()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# nucc_release.py — Several NUCC taxonomy releases side by side, with diff-based incremental embedding
+# - Each release lives in its own collection "taxonomy<release>" (taxonomy251, taxonomy252, ...)
+# - diff compares two releases by code: added / changed (embedding text differs) / deprecated / unchanged
+# - apply copies vectors (legacy "embedding" + every versioned emb_* field) from the previous release for
+#   unchanged codes and embeds only added + changed codes, so a rollout costs a few dozen embeds, not ~880
+# - Releases are registered in NUCC.nucc_releases; {_id: "current"} points at the default release.
+#   Search scripts resolve a pinned release (--release 252) or the current one via release_collection()
+#
+# Run:
+#   python3 nucc_release.py list
+#   python3 nucc_release.py diff 251 252
+#   python3 nucc_release.py apply 251 252 [--dry-run] [--create-index]
+#   python3 nucc_release.py promote 252
+
+import argparse
+import datetime
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.operations import SearchIndexModel
+
+import embedder
+from embedder import PROJECTION, build_embedding_text, clean_fields, text_hash
+from embedding_versions import FILTER_FIELDS, VERSIONS, version_config
+
+# ---------------- CONFIG ----------------
+COLL_PREFIX     = "taxonomy"        # release "251" → collection "taxonomy251"
+CONTROL_COLL    = "nucc_releases"
+DEFAULT_RELEASE = "251"             # used when no release is pinned and nothing is registered yet
+INDEX           = "nucc"            # search index name created on each release collection
+CURRENT_CACHE_SECONDS = 30.0
+# ----------------------------------------
+
+# Vector + bookkeeping fields copied for unchanged codes
+CARRY_FIELDS = ["embedding", "embedding_model", "embedding_text_hash"] + \
+               [f for v in VERSIONS for f in (version_config(v)["path"], version_config(v)["hash_field"])]
+
+def release_coll_name(release: str) -> str:
+    return f"{COLL_PREFIX}{release}"
+
+_current_memo: Dict[str, Any] = {}
+
+def current_release(db) -> str:
+    now = time.monotonic()
+    if _current_memo and now - _current_memo["at"] < CURRENT_CACHE_SECONDS:
+        return _current_memo["release"]
+    ptr = db[CONTROL_COLL].find_one({"_id": "current"}) or {}
+    release = ptr.get("release") or DEFAULT_RELEASE
+    _current_memo.update(at=now, release=release)
+    return release
+
+def release_collection(db, release: Optional[str] = None):
+    """Collection for a pinned release ("252"), else ("current" / None) the current one."""
+    if release in (None, "current"):
+        release = current_release(db)
+    return db[release_coll_name(release)]
+
+# ---------- diff ----------
+def code_of(doc: Dict[str, Any]) -> Optional[str]:
+    return doc.get("code") or doc.get("Code")
+
+def release_state(coll) -> Dict[str, Dict[str, Any]]:
+    """code → {_id, hash of the (cleaned) embedding text, stored vector hash / model / dims}."""
+    dims = {d["_id"]: d["dim"] for d in coll.aggregate([
+        {"$match": {"embedding": {"$type": "array"}}},
+        {"$project": {"_id": 1, "dim": {"$size": "$embedding"}}}])}
+    state = {}
+    for d in coll.find({}, projection={**PROJECTION, "embedding_text_hash": 1, "embedding_model": 1}):
+        code = code_of(d)
+        if not code:
+            continue
+        text = build_embedding_text({**d, **clean_fields(d)})
+        state[code] = {"_id": d["_id"], "hash": text_hash(text), "text": text,
+                       "stored_hash": d.get("embedding_text_hash"), "model": d.get("embedding_model"),
+                       "dim": dims.get(d["_id"]), "has_vector": d["_id"] in dims}
+    return state
+
+def is_current(model: Optional[str], dim: Optional[int]) -> bool:
+    """A stored vector is reusable only if it comes from embedder.py's model at its dimensions."""
+    return model == embedder.VOYAGE_MODEL and dim == embedder.EMBED_DIM
+
+def vector_matches(s: Dict[str, Any]) -> bool:
+    """Vector present, current model / dims, and made from exactly this text."""
+    return s["has_vector"] and is_current(s["model"], s["dim"]) and s["stored_hash"] == s["hash"]
+
+def diff_releases(old: Dict[str, Dict[str, Any]], new: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+    return {
+        "added":      sorted(c for c in new if c not in old),
+        "deprecated": sorted(c for c in old if c not in new),
+        "changed":    sorted(c for c in new if c in old and new[c]["hash"] != old[c]["hash"]),
+        "unchanged":  sorted(c for c in new if c in old and new[c]["hash"] == old[c]["hash"]),
+    }
+
+def print_diff(d: Dict[str, List[str]], old_rel: str, new_rel: str, show: int = 20) -> None:
+    print(f"Release {old_rel} → {new_rel}: " + ", ".join(f"{len(v)} {k}" for k, v in d.items()))
+    for kind in ("added", "changed", "deprecated"):
+        if d[kind]:
+            more = f" … +{len(d[kind]) - show}" if len(d[kind]) > show else ""
+            print(f"  {kind:10} {' '.join(d[kind][:show])}{more}")
+
+# ---------- apply ----------
+def carry_vectors(old_coll, new_coll, old, new, codes: List[str]) -> int:
+    """
+    Copy vector fields old → new for codes whose text is unchanged. Returns docs updated.
+    The legacy embedding trio is only copied when it is from the current model / dims.
+    """
+    ids = {old[c]["_id"]: c for c in codes}
+    ops, n = [], 0
+    proj = {f: 1 for f in CARRY_FIELDS}
+    for d in old_coll.find({"_id": {"$in": list(ids)}}, projection=proj):
+        legacy = is_current(d.get("embedding_model"), len(d.get("embedding") or []))
+        fields = {f: d[f] for f in CARRY_FIELDS
+                  if f in d and (legacy or f not in ("embedding", "embedding_model", "embedding_text_hash"))}
+        if fields:
+            ops.append(UpdateOne({"_id": new[ids[d["_id"]]]["_id"]}, {"$set": fields}))
+        if len(ops) >= 500:
+            n += new_coll.bulk_write(ops, ordered=False).modified_count
+            ops.clear()
+    if ops:
+        n += new_coll.bulk_write(ops, ordered=False).modified_count
+    return n
+
+def embed_codes(new_coll, new, codes: List[str]) -> int:
+    """Embed codes in the new release (legacy "embedding" field, embedder's model/dims)."""
+    ops, n = [], 0
+    for i in range(0, len(codes), embedder.BATCH_SIZE):
+        batch = codes[i:i + embedder.BATCH_SIZE]
+        vectors = embedder.embed_texts([new[c]["text"] for c in batch])
+        for c, vec in zip(batch, vectors):
+            ops.append(UpdateOne({"_id": new[c]["_id"]}, {
+                "$set": {"embedding": vec, "embedding_model": embedder.VOYAGE_MODEL,
+                         "embedding_text_hash": new[c]["hash"]},
+                # versioned fields belong to the old text; embedding_versions.py backfill re-creates them
+                "$unset": {f: "" for f in CARRY_FIELDS if f.startswith("emb_")}}))
+        new_coll.bulk_write(ops, ordered=False)
+        n += len(batch)
+        ops.clear()
+        print(f"Embedded {n}/{len(codes)}", file=sys.stderr)
+    return n
+
+def create_index(coll) -> None:
+    for _ in coll.aggregate([{"$listSearchIndexes": {"name": INDEX}}]):
+        print(f"Index {INDEX} already exists on {coll.name}")
+        return
+    fields = [{"type": "vector", "path": "embedding", "numDimensions": embedder.EMBED_DIM, "similarity": "cosine"}]
+    fields += [{"type": "filter", "path": f} for f in FILTER_FIELDS]
+    coll.create_search_index(SearchIndexModel(definition={"fields": fields}, name=INDEX, type="vectorSearch"))
+    print(f"✅ Created vectorSearch index {INDEX} on {coll.name}")
+
+def apply(db, old_rel: str, new_rel: str, dry_run: bool = False, with_index: bool = False) -> None:
+    old_coll, new_coll = db[release_coll_name(old_rel)], db[release_coll_name(new_rel)]
+    old, new = release_state(old_coll), release_state(new_coll)
+    if not new:
+        raise SystemExit(f"{new_coll.name} is empty; load the release first (nucc_ingest.py --release {new_rel})")
+    d = diff_releases(old, new)
+    print_diff(d, old_rel, new_rel)
+    # Copy only vectors that really belong to the unchanged text and to embedder.py's model / dims (stale,
+    # missing, unlabelled or other-model ones are re-embedded, so the index never mixes vector spaces);
+    # codes already done by an earlier run are skipped, so apply can be rerun after a failure
+    done = {c for c in new if vector_matches(new[c])}
+    reusable = [c for c in d["unchanged"] if c not in done and vector_matches(old[c])]
+    keep = set(reusable)
+    to_embed = [c for c in d["added"] + d["changed"] + d["unchanged"] if c not in keep and c not in done]
+    print(f"Plan: copy vectors for {len(reusable)} codes, embed {len(to_embed)} codes")
+    if dry_run:
+        return
+    copied = carry_vectors(old_coll, new_coll, old, new, reusable)
+    embedded = embed_codes(new_coll, new, to_embed)
+    db[CONTROL_COLL].update_one({"_id": new_rel}, {"$set": {
+        "coll": new_coll.name, "parent": old_rel, "applied_at": datetime.datetime.now(datetime.timezone.utc),
+        "counts": {k: len(v) for k, v in d.items()}, "copied": copied, "embedded": embedded}}, upsert=True)
+    if with_index:
+        create_index(new_coll)
+    print(f"✅ {new_coll.name}: copied {copied}, embedded {embedded}")
+    embedder.vo.print_summary()
+
+def promote(db, release: str) -> None:
+    coll = db[release_coll_name(release)]
+    n = coll.estimated_document_count()
+    with_vec = coll.count_documents({"embedding": {"$exists": True}, "embedding_model": embedder.VOYAGE_MODEL})
+    if not n or with_vec < n:
+        raise SystemExit(f"Refusing to promote {release}: {with_vec}/{n} docs have {embedder.VOYAGE_MODEL} vectors")
+    prev = current_release(db)
+    db[CONTROL_COLL].update_one({"_id": "current"}, {"$set": {
+        "release": release, "previous": prev, "switched_at": datetime.datetime.now(datetime.timezone.utc)}},
+        upsert=True)
+    _current_memo.clear()
+    print(f"✅ Current NUCC release: {prev} → {release}")
+
+def list_releases(db) -> None:
+    cur = current_release(db)
+    names = sorted(n for n in db.list_collection_names() if n.startswith(COLL_PREFIX))
+    meta = {r["_id"]: r for r in db[CONTROL_COLL].find({"_id": {"$ne": "current"}})}
+    for name in names:
+        rel = name[len(COLL_PREFIX):]
+        m = meta.get(rel, {})
+        coll = db[name]
+        print(f"  {'*' if rel == cur else ' '} {rel:6} {name:16} docs={coll.estimated_document_count():<5} "
+              f"vectors={coll.count_documents({'embedding': {'$exists': True}}):<5} "
+              f"parent={m.get('parent', '-')} embedded={m.get('embedded', '-')}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="NUCC releases: diff, incremental embedding, promote")
+    ap.add_argument("cmd", choices=["list", "diff", "apply", "promote"])
+    ap.add_argument("releases", nargs="*", help="diff/apply: OLD NEW; promote: RELEASE")
+    ap.add_argument("--dry-run", action="store_true", help="apply: print the plan only")
+    ap.add_argument("--create-index", action="store_true", help="apply: create the vector index on NEW")
+    args = ap.parse_args()
+
+    db = embedder.connect().database
+    need = {"diff": 2, "apply": 2, "promote": 1, "list": 0}[args.cmd]
+    if len(args.releases) != need:
+        ap.error(f"{args.cmd} needs {need} release(s)")
+    if args.cmd == "list":
+        list_releases(db)
+    elif args.cmd == "diff":
+        old_rel, new_rel = args.releases
+        print_diff(diff_releases(release_state(db[release_coll_name(old_rel)]),
+                                 release_state(db[release_coll_name(new_rel)])), old_rel, new_rel)
+    elif args.cmd == "apply":
+        apply(db, *args.releases, dry_run=args.dry_run, with_index=args.create_index)
+    else:
+        promote(db, args.releases[0])
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# provider_search.py — From a free-text need to nearby providers: taxonomy hits joined to NPPES at query time
+# - Step 1: vector_search_with_rerank (autoEmbeddingVersion) → top TOP_CODES taxonomy codes + relevance
+# - Step 2: ONE $geoNear over the provider collection (nppes_ingest.py), filtered by taxonomy_codes $in
+#   those codes and bounded by radius + MAX_PROVIDERS (nearest first), so a dense metro area costs the
+#   same as a rural one; served by the compound {taxonomy_codes, location: 2dsphere} index
+# - Step 3: merge: score = RELEVANCE_WEIGHT * code relevance (best matching code, normalized to the top
+#   hit) + (1 - RELEVANCE_WEIGHT) * distance score (1 at the point, 0 at the radius); paginate in memory
+# - LocalGeoIndex: the same join over an in-memory snapshot (collection or nppes_ingest --out-dir
+#   .npz files) with vectorized haversine distances, for offline runs
+#
+# Run:
+#   python3 provider_search.py "pediatric heart doctor" --lat 40.7506 --lon -73.9972 --radius-km 10
+#   python3 provider_search.py "skin doctor" --zip 10026 --zips 2023_Gaz_zcta_national.txt --page 2
+#   python3 provider_search.py "allergy shots" --zip 10026 --zips zcta.txt --providers-dir providers_store
+
+import argparse
+import glob
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+import autoEmbeddingVersion as ae
+from nppes_ingest import DB as PROVIDERS_DB, PROVIDERS_COLL, load_zip_centroids
+from nucc_release import release_collection
+
+# ---------------- CONFIG ----------------
+TOP_CODES        = 5          # taxonomy codes carried into the join
+MIN_CODE_REL     = 0.5        # drop codes scoring below this fraction of the top code
+RADIUS_KM        = 25.0
+MAX_PROVIDERS    = 500        # $geoNear bound: nearest N matching providers, whatever the density
+RELEVANCE_WEIGHT = 0.6        # vs. distance
+PAGE_SIZE        = 20
+MAX_TIME_MS      = 2000
+EARTH_RADIUS_M   = 6_371_008.8
+# ----------------------------------------
+
+PROVIDER_FIELDS = {"_id": 0, "npi": 1, "name": 1, "credential": 1, "taxonomy_codes": 1, "primary_taxonomy": 1,
+                   "address": 1, "phone": 1, "distance_m": 1}
+
+# ---------- step 1: taxonomy relevance ----------
+def code_relevance(hits: List[Dict[str, Any]], top_codes: int = TOP_CODES,
+                   min_rel: float = MIN_CODE_REL) -> Dict[str, float]:
+    """code → relevance in (0, 1], the best hit = 1 (rerank score when present, else vector score)."""
+    rel: Dict[str, float] = {}
+    for h in hits:
+        code = h.get("code")
+        s = float(h.get("rerank_score", h.get("score", 0.0)) or 0.0)
+        if code and code not in rel:
+            rel[code] = s
+        if len(rel) == top_codes:
+            break
+    top = max(rel.values(), default=0.0)
+    if top <= 0:
+        return {c: 1.0 for c in rel}
+    return {c: s / top for c, s in rel.items() if s / top >= min_rel}
+
+# ---------- step 2: bounded geo join ----------
+def geo_pipeline(codes: Sequence[str], lon: float, lat: float, radius_m: float,
+                 limit: int = MAX_PROVIDERS) -> List[Dict[str, Any]]:
+    return [
+        {"$geoNear": {
+            "near": {"type": "Point", "coordinates": [lon, lat]},
+            "distanceField": "distance_m",
+            "maxDistance": radius_m,
+            "query": {"taxonomy_codes": {"$in": list(codes)}},
+            "spherical": True,
+        }},
+        {"$limit": limit},
+        {"$project": PROVIDER_FIELDS},
+    ]
+
+def providers_near(coll, codes: Sequence[str], lon: float, lat: float, radius_m: float,
+                   limit: int = MAX_PROVIDERS) -> List[Dict[str, Any]]:
+    if not codes:
+        return []
+    return list(coll.aggregate(geo_pipeline(codes, lon, lat, radius_m, limit),
+                               batchSize=limit, maxTimeMS=MAX_TIME_MS))
+
+def haversine_m(lon: float, lat: float, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    lon1, lat1 = math.radians(lon), math.radians(lat)
+    lon2, lat2 = np.radians(lons), np.radians(lats)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+class LocalGeoIndex:
+    """In-memory $geoNear + taxonomy $in: code → row ids, then one vectorized distance pass."""
+    def __init__(self, rows: List[Dict[str, Any]], lons: Sequence[float], lats: Sequence[float]):
+        self.rows = rows
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        by_code: Dict[str, List[int]] = {}
+        for i, r in enumerate(rows):
+            for c in r["taxonomy_codes"]:
+                by_code.setdefault(c, []).append(i)
+        self.by_code = {c: np.asarray(ix, dtype=np.int64) for c, ix in by_code.items()}
+
+    @classmethod
+    def from_collection(cls, coll) -> "LocalGeoIndex":
+        rows, lons, lats = [], [], []
+        proj = {k: v for k, v in PROVIDER_FIELDS.items() if k != "distance_m"}
+        for d in coll.find({"location": {"$exists": True}}, projection={**proj, "location": 1}):
+            lon, lat = d.pop("location")["coordinates"]
+            rows.append(d)
+            lons.append(lon)
+            lats.append(lat)
+        return cls(rows, lons, lats)
+
+    @classmethod
+    def from_npz(cls, out_dir: str) -> "LocalGeoIndex":
+        """Columnar store written by nppes_ingest.py --out-dir."""
+        rows, lons, lats = [], [], []
+        for path in sorted(glob.glob(os.path.join(out_dir, "chunk_*.npz"))):
+            z = np.load(path)
+            keep = ~np.isnan(z["lon"])
+            for i in np.flatnonzero(keep):
+                rows.append({"npi": str(z["npi"][i]), "name": str(z["name"][i]),
+                             "taxonomy_codes": str(z["taxonomy_codes"][i]).split("|"),
+                             "primary_taxonomy": str(z["primary_taxonomy"][i]),
+                             "address": {"city": str(z["city"][i]), "state": str(z["state"][i]),
+                                         "zip": str(z["zip"][i])}})
+            lons.extend(z["lon"][keep].tolist())
+            lats.extend(z["lat"][keep].tolist())
+        return cls(rows, lons, lats)
+
+    def near(self, codes: Sequence[str], lon: float, lat: float, radius_m: float,
+             limit: int = MAX_PROVIDERS) -> List[Dict[str, Any]]:
+        parts = [self.by_code[c] for c in codes if c in self.by_code]
+        if not parts:
+            return []
+        ix = np.unique(np.concatenate(parts))
+        dist = haversine_m(lon, lat, self.lons[ix], self.lats[ix])
+        inside = dist <= radius_m
+        ix, dist = ix[inside], dist[inside]
+        order = np.argsort(dist, kind="stable")[:limit]
+        return [{**self.rows[ix[j]], "distance_m": float(dist[j])} for j in order]
+
+# ---------- step 3: merge + paginate ----------
+def rank_providers(providers: List[Dict[str, Any]], rel: Dict[str, float], radius_m: float,
+                   relevance_weight: float = RELEVANCE_WEIGHT) -> List[Dict[str, Any]]:
+    ranked = []
+    for p in providers:
+        matched = max((c for c in p["taxonomy_codes"] if c in rel), key=rel.get, default=None)
+        if matched is None:
+            continue
+        dist_score = max(0.0, 1.0 - p["distance_m"] / radius_m) if radius_m > 0 else 0.0
+        ranked.append({**p, "matched_code": matched, "code_relevance": rel[matched], "distance_score": dist_score,
+                       "score": relevance_weight * rel[matched] + (1 - relevance_weight) * dist_score})
+    ranked.sort(key=lambda p: (-p["score"], p["distance_m"]))
+    return ranked
+
+def paginate(ranked: List[Dict[str, Any]], page: int, page_size: int) -> Dict[str, Any]:
+    pages = max(1, math.ceil(len(ranked) / page_size))
+    start = (page - 1) * page_size
+    return {"page": page, "page_size": page_size, "pages": pages, "total": len(ranked),
+            "results": ranked[start:start + page_size]}
+
+def search_providers(query: str, lon: float, lat: float, radius_km: float = RADIUS_KM, page: int = 1,
+                     page_size: int = PAGE_SIZE, top_codes: int = TOP_CODES,
+                     geo_index: Optional[LocalGeoIndex] = None, providers=None) -> Dict[str, Any]:
+    """Taxonomy search → bounded geo join → one merged, paginated list."""
+    t0 = time.perf_counter()
+    hits = ae.vector_search_with_rerank(query, final_k=top_codes)
+    rel = code_relevance(hits, top_codes)
+    t1 = time.perf_counter()
+    radius_m = radius_km * 1000.0
+    if geo_index is not None:
+        found = geo_index.near(list(rel), lon, lat, radius_m)
+    else:
+        found = providers_near(providers if providers is not None else ae.client[PROVIDERS_DB][PROVIDERS_COLL],
+                               list(rel), lon, lat, radius_m)
+    t2 = time.perf_counter()
+    out = paginate(rank_providers(found, rel, radius_m), page, page_size)
+    out.update(codes=rel, truncated=len(found) >= MAX_PROVIDERS,
+               taxonomy_ms=(t1 - t0) * 1000, geo_ms=(t2 - t1) * 1000)
+    return out
+
+def print_page(query: str, out: Dict[str, Any]) -> None:
+    codes = ", ".join(f"{c} ({r:.2f})" for c, r in out["codes"].items())
+    print(f"\n{query!r} → codes: {codes or '-'}")
+    more = " (capped at MAX_PROVIDERS)" if out["truncated"] else ""
+    print(f"Page {out['page']}/{out['pages']} of {out['total']} providers{more}  "
+          f"[taxonomy {out['taxonomy_ms']:.0f}ms, geo {out['geo_ms']:.0f}ms]")
+    for i, p in enumerate(out["results"], (out["page"] - 1) * out["page_size"] + 1):
+        a = p.get("address", {})
+        print(f"{i:>3}. {p['score']:.3f}  {p['distance_m'] / 1000:5.1f}km  {p['matched_code']}  "
+              f"{p.get('name', '')}  — {a.get('city', '')}, {a.get('state', '')} {a.get('zip', '')}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Free-text need + location → ranked, paginated nearby providers")
+    ap.add_argument("query")
+    ap.add_argument("--lat", type=float)
+    ap.add_argument("--lon", type=float)
+    ap.add_argument("--zip", help="Search around this ZIP's centroid (needs --zips)")
+    ap.add_argument("--zips", help="Census ZCTA gazetteer file")
+    ap.add_argument("--radius-km", type=float, default=RADIUS_KM)
+    ap.add_argument("--page", type=int, default=1)
+    ap.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    ap.add_argument("--top-codes", type=int, default=TOP_CODES)
+    ap.add_argument("--local-geo", action="store_true", help="Join in memory (LocalGeoIndex) instead of $geoNear")
+    ap.add_argument("--providers-dir", help="LocalGeoIndex over nppes_ingest.py --out-dir files")
+    ap.add_argument("--no-rerank", action="store_true")
+    ap.add_argument("--release", type=str, help='Pin a NUCC release ("252", or "current")')
+    args = ap.parse_args()
+
+    if args.zip:
+        if not args.zips:
+            ap.error("--zip needs --zips")
+        centroids = load_zip_centroids(args.zips)
+        if args.zip[:5] not in centroids:
+            ap.error(f"unknown ZIP {args.zip}")
+        args.lon, args.lat = centroids[args.zip[:5]]
+    if args.lat is None or args.lon is None:
+        ap.error("give --lat/--lon or --zip")
+    if args.no_rerank:
+        ae.USE_RERANK = False
+    if args.release:
+        ae.coll = release_collection(ae.client[ae.DB], args.release)
+
+    geo = None
+    if args.providers_dir:
+        geo = LocalGeoIndex.from_npz(args.providers_dir)
+    elif args.local_geo:
+        geo = LocalGeoIndex.from_collection(ae.client[PROVIDERS_DB][PROVIDERS_COLL])
+    out = search_providers(args.query, args.lon, args.lat, args.radius_km, args.page, args.page_size,
+                           args.top_codes, geo_index=geo)
+    print_page(args.query, out)
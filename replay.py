@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# replay.py — Query-log replay + load generator for any search entry point
+#
+# Query-log format (JSONL, one query per line; only "q" is required):
+#   {"ts": 1760870400.125, "q": "heart doctor", "params": {"final_k": 10}, "session": "a1", "source": "web"}
+#     ts      - arrival time (epoch seconds or any monotonic offset); used by --mode recorded
+#     q       - raw query text exactly as the user typed it
+#     params  - extra keyword arguments for the entry point (optional)
+#     session, source - free-form tags, carried through to the results CSV
+#
+# Modes:
+#   fixed    - constant inter-arrival gap (1/QPS)
+#   poisson  - open-loop Poisson arrivals at --qps (exponential gaps, seeded)
+#   recorded - the log's own ts gaps (sorted by ts), sped up by --speed; --loop plays the log back to back
+# Arrivals are open-loop: a slow backend queues work instead of slowing the schedule,
+# and latency is measured from the scheduled arrival (queueing included).
+#
+# Run:
+#   python3 replay.py --log query_log.jsonl --target autoEmbeddingVersion:vector_search_with_rerank --qps 20
+#   python3 replay.py --log query_log.jsonl --mode poisson --qps 50 --concurrency 16 --duration 60
+#   python3 replay.py --log query_log.jsonl --warm          # warm caches from real traffic before a deploy
+
+import argparse
+import csv
+import importlib
+import json
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# ---------------- CONFIG ----------------
+LOG_PATH    = "query_log.jsonl"
+TARGET      = "autoEmbeddingVersion:vector_search_with_rerank"
+QPS         = 10.0
+CONCURRENCY = 8
+OUT_CSV     = "replay_results.csv"
+# ----------------------------------------
+
+CACHE_SOURCES = ("fastpath", "semantic_cache", "fixture")
+
+def read_log(path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    entries = []
+    with open(path, encoding="utf-8") as fh:
+        for n, line in enumerate(fh, 1):
+            line = line.strip()
+            if not line:
+                continue
+            e = json.loads(line)
+            if not isinstance(e.get("q"), str):
+                raise ValueError(f"{path}:{n}: every entry needs a string 'q'")
+            entries.append(e)
+            if limit and len(entries) >= limit:
+                break
+    return entries
+
+def write_log_entry(fh, q: str, params: Optional[Dict[str, Any]] = None, **tags) -> None:
+    """Append one entry in the query-log format (for search entry points that want to log traffic)."""
+    e = {"ts": round(time.time(), 3), "q": q}
+    if params:
+        e["params"] = params
+    e.update(tags)
+    fh.write(json.dumps(e, ensure_ascii=False) + "\n")
+
+def load_target(spec: str) -> Callable:
+    """'module:function' → callable, e.g. 'accuracy1:vector_search'."""
+    mod_name, _, fn_name = spec.partition(":")
+    if not fn_name:
+        raise ValueError(f"target must look like module:function, got {spec!r}")
+    return getattr(importlib.import_module(mod_name), fn_name)
+
+def by_arrival(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Entries sorted by ts (stable), for --mode recorded; every entry needs a ts."""
+    if any(e.get("ts") is None for e in entries):
+        raise ValueError("--mode recorded needs 'ts' on every log entry")
+    return sorted(entries, key=lambda e: e["ts"])
+
+def schedule(entries: List[Dict[str, Any]], mode: str, qps: float, speed: float,
+             seed: int, duration: Optional[float], loops: int = 1) -> List[float]:
+    """
+    Arrival offsets (seconds from start) for entries * loops, truncated to duration.
+    recorded: entries must be in ts order (by_arrival); each loop starts one mean gap after the
+    previous one ends, so looping lengthens the run instead of stacking passes on the same offsets.
+    """
+    rng = random.Random(seed)
+    offsets, t = [], 0.0
+    if mode == "recorded":
+        ts = [e["ts"] for e in entries]
+        if not ts:
+            return []
+        span = ts[-1] - ts[0]
+        period = span + (span / (len(ts) - 1) if len(ts) > 1 else 1.0 / qps * speed)
+        offsets = [max(0.0, (x - ts[0] + n * period) / speed) for n in range(loops) for x in ts]
+    else:
+        for _ in range(len(entries) * loops):
+            offsets.append(t)
+            t += rng.expovariate(qps) if mode == "poisson" else 1.0 / qps
+    if duration is not None:
+        offsets = [o for o in offsets if o <= duration]
+    return offsets
+
+def cache_label(result: Any) -> str:
+    """'fastpath' / 'semantic_cache' / ... if the entry point marked its results, else 'backend'."""
+    if isinstance(result, list) and result and isinstance(result[0], dict):
+        src = result[0].get("source")
+        if src in CACHE_SOURCES:
+            return src
+    return "backend"
+
+def percentile(xs: List[float], p: float) -> float:
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    i = min(len(xs) - 1, max(0, int(round(p / 100.0 * (len(xs) - 1)))))
+    return xs[i]
+
+def replay(fn: Callable, entries: List[Dict[str, Any]], offsets: List[float],
+           concurrency: int) -> List[Dict[str, Any]]:
+    rows: List[Optional[Dict[str, Any]]] = [None] * len(offsets)
+
+    def run_one(i: int, scheduled: float, t0: float) -> None:
+        e = entries[i]
+        start = time.perf_counter()
+        row = {"idx": i, "q": e["q"], "session": e.get("session"), "source": e.get("source"),
+               "scheduled_s": round(scheduled, 4), "start_s": round(start - t0, 4)}
+        try:
+            res = fn(e["q"], **(e.get("params") or {}))
+            row.update(ok=True, error="", cache=cache_label(res),
+                       n_results=len(res) if hasattr(res, "__len__") else None)
+        except Exception as ex:
+            row.update(ok=False, error=f"{type(ex).__name__}: {ex}"[:200], cache="", n_results=None)
+        end = time.perf_counter()
+        row["service_ms"] = round((end - start) * 1000, 3)
+        row["latency_ms"] = round((end - (t0 + scheduled)) * 1000, 3)
+        rows[i] = row
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        t0 = time.perf_counter()
+        for i, off in enumerate(offsets):
+            delay = t0 + off - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(run_one, i, off, t0)
+    return [r for r in rows if r is not None]
+
+def warm(fn: Callable, entries: List[Dict[str, Any]]) -> None:
+    """Call each distinct query once, most frequent first, to populate caches."""
+    counts = Counter(e["q"] for e in entries)
+    params = {e["q"]: e.get("params") or {} for e in entries}
+    ok = 0
+    t0 = time.perf_counter()
+    for q, _ in counts.most_common():
+        try:
+            fn(q, **params[q])
+            ok += 1
+        except Exception as ex:
+            print(f"  warm '{q}': {type(ex).__name__}: {ex}", file=sys.stderr)
+    print(f"Warmed {ok}/{len(counts)} distinct queries in {time.perf_counter() - t0:.1f}s")
+
+def summarize(rows: List[Dict[str, Any]], wall: float) -> None:
+    lat = [r["latency_ms"] for r in rows if r["ok"]]
+    svc = [r["service_ms"] for r in rows if r["ok"]]
+    errors = sum(1 for r in rows if not r["ok"])
+    caches = Counter(r["cache"] for r in rows if r["ok"])
+    print(f"\nRequests: {len(rows)} in {wall:.1f}s  ({len(rows) / wall if wall else 0:.1f} QPS achieved)")
+    print(f"  Errors: {errors} ({errors / len(rows):.1%})" if rows else "  Errors: 0")
+    if lat:
+        print(f"  Latency ms  p50={percentile(lat, 50):.1f}  p90={percentile(lat, 90):.1f}  "
+              f"p99={percentile(lat, 99):.1f}  max={max(lat):.1f}  mean={statistics.fmean(lat):.1f}")
+        print(f"  Service ms  p50={percentile(svc, 50):.1f}  p99={percentile(svc, 99):.1f}")
+    if caches:
+        print("  Served by: " + ", ".join(f"{k}={v} ({v / sum(caches.values()):.0%})"
+                                          for k, v in caches.most_common()))
+
+def write_csv(rows: List[Dict[str, Any]], path: str) -> None:
+    cols = ["idx", "q", "session", "source", "scheduled_s", "start_s", "latency_ms", "service_ms",
+            "ok", "error", "cache", "n_results"]
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        w = csv.DictWriter(fh, fieldnames=cols)
+        w.writeheader()
+        for r in sorted(rows, key=lambda r: r["idx"]):
+            w.writerow({c: r.get(c) for c in cols})
+
+def sleep_target(q: str, mean_ms: float = 20.0) -> List[Dict[str, Any]]:
+    """Stand-in entry point for dry runs: log-normal service time, no backends."""
+    time.sleep(random.lognormvariate(0, 0.5) * mean_ms / 1000.0)
+    return [{"code": None, "score": 0.0}]
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Replay a query log against a search entry point")
+    ap.add_argument("--log", default=LOG_PATH)
+    ap.add_argument("--target", default=TARGET, help="module:function called as fn(q, **params)")
+    ap.add_argument("--mode", choices=["fixed", "poisson", "recorded"], default="fixed")
+    ap.add_argument("--qps", type=float, default=QPS)
+    ap.add_argument("--speed", type=float, default=1.0, help="Time compression for --mode recorded")
+    ap.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    ap.add_argument("--duration", type=float, help="Stop scheduling after this many seconds")
+    ap.add_argument("--limit", type=int, help="Only read the first N log entries")
+    ap.add_argument("--loop", type=int, default=1, help="Repeat the log N times")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--warm", action="store_true", help="Warm caches (each distinct query once) and exit")
+    ap.add_argument("--out", default=OUT_CSV)
+    args = ap.parse_args()
+
+    entries = read_log(args.log, args.limit)
+    fn = load_target(args.target)
+    if args.warm:
+        warm(fn, entries)
+        sys.exit(0)
+
+    if args.mode == "recorded":
+        entries = by_arrival(entries)
+    loops = max(1, args.loop)
+    offsets = schedule(entries, args.mode, args.qps, args.speed, args.seed, args.duration, loops)
+    entries = entries * loops
+    print(f"Replaying {len(offsets)} queries → {args.target}  mode={args.mode} "
+          f"qps={args.qps if args.mode != 'recorded' else 'log'} concurrency={args.concurrency}")
+    t0 = time.perf_counter()
+    rows = replay(fn, entries, offsets, args.concurrency)
+    summarize(rows, time.perf_counter() - t0)
+    write_csv(rows, args.out)
+    print(f"✅ Wrote {len(rows)} rows to {args.out}")
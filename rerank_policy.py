@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# rerank_policy.py — Skip the cross-encoder when the ANN order is already confident
+# - Features from the gated vectorSearchScore list: top-1/top-2 margin and top-1 z-score
+# - should_skip(): margin >= min_margin OR z >= min_z (and top-1 >= min_top1)
+# - Thresholds are learned from logged rerank outcomes (rerank_outcomes.jsonl): the loosest thresholds
+#   whose skipped queries still kept the reranker's top-1 at least TARGET_AGREEMENT of the time
+#
+# Run:
+#   python3 rerank_policy.py fit --log rerank_outcomes.jsonl --out rerank_policy.json
+#   python3 rerank_policy.py report --log rerank_outcomes.jsonl --policy rerank_policy.json
+
+import argparse
+import json
+import os
+import statistics
+import threading
+from typing import Any, Dict, List, Sequence
+
+# ---------------- CONFIG ----------------
+OUTCOMES_PATH    = "rerank_outcomes.jsonl"
+POLICY_PATH      = "rerank_policy.json"
+TARGET_AGREEMENT = 0.95   # skipped queries must keep the reranker's top-1 this often
+MIN_SUPPORT      = 5      # don't trust a threshold backed by fewer skipped queries
+# ----------------------------------------
+
+def score_features(scores: Sequence[float]) -> Dict[str, float]:
+    s = sorted((float(x) for x in scores), reverse=True)
+    if not s:
+        return {"top1": 0.0, "margin": 0.0, "z": 0.0}
+    if len(s) == 1:
+        return {"top1": s[0], "margin": float("inf"), "z": float("inf")}
+    sd = statistics.pstdev(s)
+    return {"top1": s[0], "margin": s[0] - s[1],
+            "z": (s[0] - statistics.fmean(s)) / sd if sd > 0 else 0.0}
+
+class RerankSkipPolicy:
+    def __init__(self, min_margin: float = float("inf"), min_z: float = float("inf"), min_top1: float = 0.0):
+        self.min_margin = min_margin      # inf → never skip on that feature
+        self.min_z = min_z
+        self.min_top1 = min_top1
+        self.counters = {"decisions": 0, "skipped": 0}
+        self._lock = threading.Lock()
+
+    def decide(self, f: Dict[str, float]) -> bool:
+        return f["top1"] >= self.min_top1 and (f["margin"] >= self.min_margin or f["z"] >= self.min_z)
+
+    def should_skip(self, scores: Sequence[float]) -> bool:
+        skip = self.decide(score_features(scores))
+        with self._lock:
+            self.counters["decisions"] += 1
+            self.counters["skipped"] += int(skip)
+        return skip
+
+    def skip_rate(self) -> float:
+        c = self.counters
+        return c["skipped"] / c["decisions"] if c["decisions"] else 0.0
+
+    # ----- persistence -----
+    def to_dict(self) -> Dict[str, Any]:
+        enc = lambda x: None if x == float("inf") else x
+        return {"min_margin": enc(self.min_margin), "min_z": enc(self.min_z), "min_top1": self.min_top1}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "RerankSkipPolicy":
+        dec = lambda x: float("inf") if x is None else float(x)
+        return cls(dec(d.get("min_margin")), dec(d.get("min_z")), float(d.get("min_top1", 0.0)))
+
+    def save(self, path: str = POLICY_PATH) -> None:
+        with open(path, "w") as fh:
+            json.dump(self.to_dict(), fh, indent=2)
+
+    @classmethod
+    def load(cls, path: str = POLICY_PATH) -> "RerankSkipPolicy":
+        if not os.path.exists(path):
+            return cls()                  # never skip until a policy has been fitted
+        with open(path) as fh:
+            return cls.from_dict(json.load(fh))
+
+# ----- outcome log -----
+_log_lock = threading.Lock()
+
+def log_outcome(query: str, docs: List[Dict[str, Any]], results: List[Any], path: str = OUTCOMES_PATH) -> None:
+    """Append one reranked query: candidates (ANN order, with vector score) + reranker index/score pairs."""
+    rec = {
+        "q": query,
+        "candidates": [{k: d.get(k) for k in ("code", "displayName", "classification", "specialization", "score")}
+                       for d in docs],
+        "rerank": [{"i": int(r.index), "relevance_score": float(r.relevance_score)} for r in results],
+    }
+    with _log_lock, open(path, "a", encoding="utf-8") as fh:
+        fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+def read_outcomes(path: str = OUTCOMES_PATH) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+def outcome_rows(outcomes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Per query: score features + whether the reranker kept the ANN top-1."""
+    rows = []
+    for o in outcomes:
+        if not o.get("candidates") or not o.get("rerank"):
+            continue
+        f = score_features([c["score"] or 0.0 for c in o["candidates"]])
+        f["agree"] = o["rerank"][0]["i"] == 0
+        rows.append(f)
+    return rows
+
+def _fit_one(rows: List[Dict[str, Any]], key: str, target: float, min_support: int) -> float:
+    """Smallest threshold t such that rows with feature >= t agree at least `target` of the time."""
+    best = float("inf")
+    for t in sorted({r[key] for r in rows if r[key] != float("inf")}, reverse=True):
+        sel = [r for r in rows if r[key] >= t]
+        if len(sel) >= min_support and sum(r["agree"] for r in sel) / len(sel) >= target:
+            best = t
+        elif len(sel) >= min_support:
+            break
+    return best
+
+def fit(outcomes: List[Dict[str, Any]], target: float = TARGET_AGREEMENT,
+        min_support: int = MIN_SUPPORT) -> RerankSkipPolicy:
+    rows = outcome_rows(outcomes)
+    policy = RerankSkipPolicy(_fit_one(rows, "margin", target, min_support),
+                              _fit_one(rows, "z", target, min_support))
+    # The OR of two individually safe rules can still dip below target; fall back to margin only
+    if evaluate(policy, outcomes)["agreement"] < target:
+        policy.min_z = float("inf")
+    return policy
+
+def evaluate(policy: RerankSkipPolicy, outcomes: List[Dict[str, Any]]) -> Dict[str, float]:
+    rows = outcome_rows(outcomes)
+    skipped = [r for r in rows if policy.decide(r)]
+    return {"queries": len(rows), "skipped": len(skipped),
+            "skip_rate": len(skipped) / len(rows) if rows else 0.0,
+            "agreement": sum(r["agree"] for r in skipped) / len(skipped) if skipped else 1.0}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Fit / report the adaptive rerank-skip policy")
+    ap.add_argument("cmd", choices=["fit", "report"])
+    ap.add_argument("--log", default=OUTCOMES_PATH)
+    ap.add_argument("--policy", default=POLICY_PATH)
+    ap.add_argument("--out", default=POLICY_PATH)
+    ap.add_argument("--target", type=float, default=TARGET_AGREEMENT)
+    args = ap.parse_args()
+
+    outcomes = read_outcomes(args.log)
+    if args.cmd == "fit":
+        policy = fit(outcomes, args.target)
+        policy.save(args.out)
+        print(f"✅ Wrote {args.out}: {policy.to_dict()}")
+    else:
+        policy = RerankSkipPolicy.load(args.policy)
+    ev = evaluate(policy, outcomes)
+    print(f"On {ev['queries']} logged queries: skip {ev['skipped']} ({ev['skip_rate']:.0%}), "
+          f"top-1 kept on skipped {ev['agreement']:.0%}")
@@ -0,0 +1,142 @@
+# semantic_cache.py — Near-duplicate query result cache keyed by query embeddings
+# - Recent query vectors live in one preallocated float32 NumPy matrix (unit-normalized)
+# - get(): a single matmul against the matrix; cosine >= EPSILON returns the cached final results
+#   (no $vectorSearch, no rerank round-trip)
+# - TTL expiry + LRU eviction; optional scope (e.g. k / filter) so different result shapes don't mix
+# - Invalidated wholesale when the embedding model or the search index version changes
+#
+# Usage (inside a search function):
+#   cache = SemanticResultCache(DIM, epsilon=0.97, ttl=600)
+#   cache.ensure_version(MODEL, search_index_version(coll, INDEX))
+#   hits = cache.get(qvec, scope=k)
+#   if hits is None:
+#       hits = run_search(...); cache.put(qvec, hits, scope=k)
+
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# ---------------- CONFIG ----------------
+CAPACITY = 1024        # cached queries (matrix rows)
+EPSILON = 0.97         # cosine similarity needed to reuse a cached result
+TTL_SECONDS = 600.0    # cached results expire after this long
+VERSION_MAX_AGE = 60.0 # re-read the search index definition version at most this often
+# ----------------------------------------
+
+class SemanticResultCache:
+    def __init__(self, dim: int, capacity: int = CAPACITY, epsilon: float = EPSILON,
+                 ttl: float = TTL_SECONDS, model: str = "", index_version: str = ""):
+        self.dim = dim
+        self.capacity = capacity
+        self.epsilon = epsilon
+        self.ttl = ttl
+        self.model = model
+        self.index_version = index_version
+        self.mat = np.zeros((capacity, dim), dtype=np.float32)
+        self.expires = np.zeros(capacity, dtype=np.float64)    # 0 → empty slot
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.scope_ids = np.full(capacity, -1, dtype=np.int32)
+        self.results: List[Optional[List[Dict[str, Any]]]] = [None] * capacity
+        self._scopes: Dict[Any, int] = {}
+        self.counters = {"hits": 0, "misses": 0, "puts": 0, "evictions": 0, "invalidations": 0}
+
+    # ----- versioning -----
+    def ensure_version(self, model: str, index_version: str, dim: Optional[int] = None) -> bool:
+        """Clear everything if the model or index version changed. Returns True if cleared."""
+        if (model, index_version) == (self.model, self.index_version):
+            return False
+        had_entries = bool((self.expires > 0).any())
+        if dim is not None and dim != self.dim:
+            self.dim = dim
+            self.mat = np.zeros((self.capacity, dim), dtype=np.float32)
+        self.clear()
+        self.model, self.index_version = model, index_version
+        if had_entries:
+            self.counters["invalidations"] += 1
+        return True
+
+    def clear(self) -> None:
+        self.mat[:] = 0.0
+        self.expires[:] = 0.0
+        self.last_used[:] = 0.0
+        self.scope_ids[:] = -1
+        self.results = [None] * self.capacity
+
+    # ----- lookups -----
+    def _unit(self, vec: Sequence[float]) -> Optional[np.ndarray]:
+        v = np.asarray(vec, dtype=np.float32)
+        if v.shape != (self.dim,):
+            raise ValueError(f"query vector has shape {v.shape}, cache expects ({self.dim},)")
+        n = float(np.linalg.norm(v))
+        return v / n if n > 0 else None
+
+    def _scope_id(self, scope: Any) -> int:
+        sid = self._scopes.get(scope)
+        if sid is None:
+            sid = self._scopes[scope] = len(self._scopes)
+        return sid
+
+    def get(self, vec: Sequence[float], scope: Any = None) -> Optional[List[Dict[str, Any]]]:
+        v = self._unit(vec)
+        now = time.monotonic()
+        if v is not None:
+            sims = self.mat @ v
+            live = (self.expires > now) & (self.scope_ids == self._scope_id(scope))
+            sims[~live] = -np.inf
+            i = int(np.argmax(sims))
+            if sims[i] >= self.epsilon:
+                self.last_used[i] = now
+                self.counters["hits"] += 1
+                return self.results[i]
+        self.counters["misses"] += 1
+        return None
+
+    def put(self, vec: Sequence[float], results: List[Dict[str, Any]], scope: Any = None) -> None:
+        v = self._unit(vec)
+        if v is None:
+            return
+        now = time.monotonic()
+        free = np.flatnonzero(self.expires <= now)
+        if free.size:
+            i = int(free[0])
+        else:
+            i = int(np.argmin(self.last_used))   # LRU
+            self.counters["evictions"] += 1
+        self.mat[i] = v
+        self.expires[i] = now + self.ttl
+        self.last_used[i] = now
+        self.scope_ids[i] = self._scope_id(scope)
+        self.results[i] = [{**r, "source": "semantic_cache"} for r in results]
+        self.counters["puts"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        c = dict(self.counters)
+        lookups = c["hits"] + c["misses"]
+        c["hit_rate"] = c["hits"] / lookups if lookups else 0.0
+        c["size"] = int((self.expires > time.monotonic()).sum())
+        return c
+
+_version_memo: Dict[Any, Any] = {}
+
+def search_index_version(coll, index_name: str, max_age: float = VERSION_MAX_AGE) -> str:
+    """
+    '<index>@<definition version>' from $listSearchIndexes, memoized for max_age seconds.
+    Falls back to the bare index name if the server does not report a version.
+    """
+    key = (coll.full_name, index_name)
+    hit = _version_memo.get(key)
+    now = time.monotonic()
+    if hit and now - hit[0] < max_age:
+        return hit[1]
+    version = index_name
+    for idx in coll.aggregate([{"$listSearchIndexes": {"name": index_name}}]):
+        ldv = idx.get("latestDefinitionVersion") or {}
+        version = f"{index_name}@{ldv.get('version', 0)}:{ldv.get('createdAt', '')}"
+    _version_memo[key] = (now, version)
+    return version
+
+def print_cache_stats(cache: SemanticResultCache) -> None:
+    s = cache.stats()
+    print(f"Semantic cache: {s['hits']} hits / {s['hits'] + s['misses']} lookups ({s['hit_rate']:.0%}), "
+          f"size={s['size']}, evictions={s['evictions']}, invalidations={s['invalidations']}")
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# typeahead.py — Keystroke autocomplete over taxonomy names, served from memory
+# - Completions: displayName, classification, specialization (from the collection or a JSONL snapshot)
+#   and the fast-path alias table; one completion per normalized text, pointing at its codes
+# - Index: a sorted array of keys (every completion text + each word-start suffix, so "cardio" also finds
+#   "Pediatric Cardiology") with a parallel weight array. A prefix is one bisect → a key range, and the
+#   top-N come out of a sparse table (range-argmax) + heap: O(N log N) per keystroke whatever the range size
+# - Weight = kind weight (displayName > alias > classification > specialization) + log-popularity of the
+#   text and of its codes in a query log (replay.py format), minus a penalty for mid-text (suffix) matches
+# - Auto-rebuild: at most every REFRESH_SECONDS a suggest() call compares a cheap signature (snapshot
+#   size + mtime, or the resolved release collection + collStats count / size); on a change the index is
+#   rebuilt on a background thread and swapped in, so keystrokes never wait for a rebuild
+#
+# Usage:
+#   ta = Typeahead(coll=coll, query_log="query_log.jsonl")
+#   ta.suggest("pedi card", n=8)     # [{"text": "Pediatric Cardiology", "kind": "specialization", "code": ...}, ...]
+#
+# Run:
+#   python3 typeahead.py card "ped ca" ob derm
+#   python3 typeahead.py --snapshot taxonomy_snapshot.jsonl --log query_log.jsonl --bench
+
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from fastpath import ALIASES, load_rows, normalize_key
+
+# ---------------- CONFIG ----------------
+MONGODB_URI     = ""
+DB, COLL        = "NUCC", "taxonomy251"
+TOP_N           = 8
+KIND_WEIGHT     = {"displayName": 3.0, "alias": 2.5, "classification": 2.0, "specialization": 1.5}
+TEXT_POP_WEIGHT = 1.0      # × log1p(times the exact text was searched)
+CODE_POP_WEIGHT = 0.5      # × log1p(times any text of its codes was searched)
+SUFFIX_PENALTY  = 0.75     # match starts at a later word ("card" → "Pediatric Cardiology")
+SKIP_WORDS      = {"&", "/", "and", "of", "the", "or", "for", "in"}   # no suffix keys starting here
+MAX_SCAN        = 2000     # multi-word fallback: keys examined at most
+REFRESH_SECONDS = 30.0
+# ----------------------------------------
+
+_END = "\U0010ffff"
+
+def completions_from(rows: List[Dict[str, Any]], aliases: Dict[str, List[str]] = None) -> List[Dict[str, Any]]:
+    """One completion per normalized text: {text, kind, codes}; the strongest kind wins a shared text."""
+    by_text: Dict[str, Dict[str, Any]] = {}
+    by_code = {r["code"]: r for r in rows if r.get("code")}
+    def add(text: str, kind: str, code: str) -> None:
+        key = normalize_key(text)
+        if not key or key == "none":
+            return
+        c = by_text.setdefault(key, {"key": key, "text": text.strip(), "kind": kind, "codes": []})
+        if KIND_WEIGHT[kind] > KIND_WEIGHT[c["kind"]]:
+            c.update(text=text.strip(), kind=kind)
+        if code not in c["codes"]:
+            c["codes"].append(code)
+    for r in sorted(rows, key=lambda r: (r.get("specialization") not in (None, "", "None"), r.get("code") or "")):
+        for kind in ("displayName", "classification", "specialization"):
+            if r.get(kind) and r.get("code"):
+                add(r[kind], kind, r["code"])
+    for alias, codes in (ALIASES if aliases is None else aliases).items():
+        for code in codes:
+            if code in by_code:
+                add(alias, "alias", code)
+    for c in by_text.values():
+        row = by_code[c["codes"][0]]
+        c["displayName"] = row.get("displayName")
+    return list(by_text.values())
+
+def popularity(query_log: Optional[str]) -> Counter:
+    """normalized query text → count, from a replay.py-format JSONL log."""
+    counts: Counter = Counter()
+    if query_log and os.path.exists(query_log):
+        with open(query_log, encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    counts[normalize_key(json.loads(line).get("q") or "")] += 1
+    return counts
+
+class PrefixIndex:
+    """Immutable sorted-array prefix index; build once, query from many threads."""
+    def __init__(self, completions: List[Dict[str, Any]], counts: Counter = None):
+        counts = counts or Counter()
+        code_pop: Counter = Counter()
+        for c in completions:
+            for code in c["codes"]:
+                code_pop[code] += counts.get(c["key"], 0)
+        entries: List[Tuple[str, float, int]] = []
+        for cid, c in enumerate(completions):
+            base = (KIND_WEIGHT[c["kind"]] + TEXT_POP_WEIGHT * math.log1p(counts.get(c["key"], 0))
+                    + CODE_POP_WEIGHT * math.log1p(max(code_pop[x] for x in c["codes"]))
+                    - 1e-4 * len(c["key"]))                     # ties → shorter text first
+            c["weight"] = round(base, 4)
+            words = c["key"].split()
+            for i in range(len(words)):
+                if i and words[i] in SKIP_WORDS:
+                    continue
+                entries.append((" ".join(words[i:]), base - (SUFFIX_PENALTY if i else 0.0), cid))
+        entries.sort()
+        self.completions = completions
+        self.keys = [e[0] for e in entries]
+        self.weights = [e[1] for e in entries]
+        self.ids = [e[2] for e in entries]
+        self.table = self._sparse_table(np.asarray(self.weights, dtype=np.float64))
+
+    @staticmethod
+    def _sparse_table(w: np.ndarray) -> List[List[int]]:
+        """table[j][i] = argmax of w over [i, i + 2^j)."""
+        cur = np.arange(len(w))
+        table = [cur.tolist()]
+        j = 1
+        while (1 << j) <= len(w):
+            a, b = cur[:len(w) - (1 << j) + 1], cur[(1 << (j - 1)):len(w) - (1 << (j - 1)) + 1]
+            cur = np.where(w[a] >= w[b], a, b)
+            table.append(cur.tolist())
+            j += 1
+        return table
+
+    def _argmax(self, lo: int, hi: int) -> int:
+        j = (hi - lo).bit_length() - 1
+        a, b = self.table[j][lo], self.table[j][hi - (1 << j)]
+        return a if self.weights[a] >= self.weights[b] else b
+
+    def _ranked(self, lo: int, hi: int):
+        """Positions in [lo, hi) by descending weight, lazily (heap of sub-ranges, one range-argmax each)."""
+        heap = [(-self.weights[m], m, lo, hi) for m in ([self._argmax(lo, hi)] if lo < hi else [])]
+        while heap:
+            _, m, a, b = heapq.heappop(heap)
+            yield m
+            for x, y in ((a, m), (m + 1, b)):
+                if x < y:
+                    k = self._argmax(x, y)
+                    heapq.heappush(heap, (-self.weights[k], k, x, y))
+
+    def top(self, prefix: str, n: int = TOP_N) -> List[Dict[str, Any]]:
+        """
+        Best n completions whose text (or a word-start suffix of it) starts with prefix. If that finds
+        fewer than n, each query word is also matched as a prefix of consecutive words ("ped ca" →
+        "Pediatric Cardiology"), walking the first word's range best-first for at most MAX_SCAN keys.
+        """
+        p = normalize_key(prefix)
+        if not p:
+            return []
+        out, seen = [], set()
+        def take(m: int) -> None:
+            cid = self.ids[m]
+            if cid not in seen:
+                seen.add(cid)
+                c = self.completions[cid]
+                out.append({"text": c["text"], "kind": c["kind"], "code": c["codes"][0], "codes": c["codes"],
+                            "displayName": c["displayName"], "score": round(self.weights[m], 4)})
+        lo = bisect_left(self.keys, p)
+        for m in self._ranked(lo, bisect_left(self.keys, p + _END, lo)):
+            take(m)
+            if len(out) >= n:
+                return out
+        words = p.split()
+        if len(words) > 1:
+            lo = bisect_left(self.keys, words[0])
+            for i, m in enumerate(self._ranked(lo, bisect_left(self.keys, words[0] + _END, lo))):
+                if i >= MAX_SCAN or len(out) >= n:
+                    break
+                kw = self.keys[m].split()
+                if len(kw) >= len(words) and all(k.startswith(w) for k, w in zip(kw, words)):
+                    take(m)
+        return out
+
+    def __len__(self) -> int:
+        return len(self.completions)
+
+class Typeahead:
+    """PrefixIndex over a collection (optionally a NUCC release) or a snapshot, rebuilt when the source changes."""
+    def __init__(self, coll=None, snapshot: Optional[str] = None, db=None, release: Optional[str] = None,
+                 query_log: Optional[str] = None, refresh_s: float = REFRESH_SECONDS):
+        if coll is None and snapshot is None and db is None:
+            raise ValueError("Typeahead needs a collection, a db (+ release) or a snapshot path")
+        self.coll, self.snapshot, self.db, self.release = coll, snapshot, db, release
+        self.query_log, self.refresh_s = query_log, refresh_s
+        self.counters = {"suggests": 0, "rebuilds": 0, "checks": 0}
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        self._checked = time.monotonic()
+        self.signature = self._signature()
+        self.index = self._build()
+
+    def _source(self):
+        if self.db is not None:
+            from nucc_release import release_collection
+            return release_collection(self.db, self.release)
+        return self.coll
+
+    def _signature(self) -> Tuple:
+        if self.snapshot:
+            st = os.stat(self.snapshot)
+            sig: Tuple = ("snapshot", self.snapshot, st.st_size, int(st.st_mtime_ns))
+        else:
+            coll = self._source()
+            stats = coll.database.command("collStats", coll.name)
+            sig = ("collection", coll.full_name, stats.get("count"), stats.get("size"))
+        if self.query_log and os.path.exists(self.query_log):
+            sig += (os.stat(self.query_log).st_mtime_ns,)
+        return sig
+
+    def _build(self) -> PrefixIndex:
+        rows = load_rows(snapshot_path=self.snapshot) if self.snapshot else load_rows(coll=self._source())
+        return PrefixIndex(completions_from(rows), popularity(self.query_log))
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rebuild (on the calling thread) if the source changed; True if a new index was swapped in."""
+        self.counters["checks"] += 1
+        sig = self._signature()
+        if not force and sig == self.signature:
+            return False
+        index = self._build()
+        with self._lock:
+            self.index, self.signature = index, sig
+            self.counters["rebuilds"] += 1
+        return True
+
+    def _background_refresh(self) -> None:
+        try:
+            self.refresh()
+        finally:
+            self._rebuilding = False
+
+    def suggest(self, prefix: str, n: int = TOP_N) -> List[Dict[str, Any]]:
+        self.counters["suggests"] += 1
+        now = time.monotonic()
+        if now - self._checked >= self.refresh_s and not self._rebuilding:
+            self._checked, self._rebuilding = now, True
+            threading.Thread(target=self._background_refresh, daemon=True).start()
+        return self.index.top(prefix, n)
+
+def bench(index: PrefixIndex, n: int = TOP_N, samples: int = 20000, seed: int = 7) -> None:
+    """Latency of random 1–8 char prefixes of real completion texts."""
+    rng = random.Random(seed)
+    texts = [c["key"] for c in index.completions]
+    prefixes = [t[:rng.randint(1, min(8, len(t)))] for t in (rng.choice(texts) for _ in range(samples))]
+    us = []
+    for p in prefixes:
+        t0 = time.perf_counter()
+        index.top(p, n)
+        us.append((time.perf_counter() - t0) * 1e6)
+    us.sort()
+    print(f"{samples} prefixes, top-{n}: p50={us[len(us) // 2]:.1f}µs  p99={us[int(len(us) * 0.99)]:.1f}µs  "
+          f"max={us[-1]:.1f}µs")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Prefix autocomplete over taxonomy names")
+    ap.add_argument("prefixes", nargs="*")
+    ap.add_argument("--snapshot", help="Build from a JSONL snapshot (fastpath.py --export) instead of the collection")
+    ap.add_argument("--release", help='NUCC release ("252", or "current")')
+    ap.add_argument("--log", help="Query log (replay.py format) for popularity weights")
+    ap.add_argument("-n", type=int, default=TOP_N)
+    ap.add_argument("--bench", action="store_true", help="Time random prefixes")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    if args.snapshot:
+        ta = Typeahead(snapshot=args.snapshot, query_log=args.log)
+    else:
+        from pymongo import MongoClient
+        db = MongoClient(MONGODB_URI)[DB]
+        ta = (Typeahead(db=db, release=args.release, query_log=args.log) if args.release
+              else Typeahead(coll=db[COLL], query_log=args.log))
+    print(f"Indexed {len(ta.index)} completions ({len(ta.index.keys)} keys) in "
+          f"{(time.perf_counter() - t0) * 1000:.0f}ms")
+    for p in args.prefixes:
+        t0 = time.perf_counter()
+        hits = ta.suggest(p, args.n)
+        us = (time.perf_counter() - t0) * 1e6
+        print(f"\n'{p}'  ({us:.1f}µs)")
+        for h in hits:
+            print(f"  {h['score']:6.3f}  {h['text']:<45} [{h['kind']}] {h['code']}")
+    if args.bench:
+        bench(ta.index, args.n)
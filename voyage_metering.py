@@ -0,0 +1,144 @@
+# voyage_metering.py — Token / cost / throughput accounting for Voyage embed + rerank calls
+# - MeteredVoyage wraps a voyageai.Client; embed() and rerank() record model, input tokens,
+#   documents, latency and failures (429s counted separately), everything else is passed through
+# - summary() prints per-model tokens/sec, docs/sec, p95 call latency and a dollar estimate
+# - estimate_tokens() counts tokens locally (vo.count_tokens) for a pre-flight cost estimate,
+#   before any paid call is made
+#
+# Usage:
+#   vo = MeteredVoyage(voyageai.Client(api_key=VOYAGE_API_KEY))
+#   ... vo.embed(...) / vo.rerank(...) as before ...
+#   vo.print_summary()
+
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+# ---------------- CONFIG ----------------
+# USD per 1M input tokens (list prices; edit to match your contract)
+PRICE_PER_M_TOKENS = {
+    "voyage-4-large":  0.12,
+    "voyage-3-large":  0.18,
+    "voyage-3.5":      0.06,
+    "voyage-3.5-lite": 0.02,
+    "rerank-2.5":      0.05,
+    "rerank-2.5-lite": 0.02,
+    "rerank-2":        0.05,
+    "rerank-2-lite":   0.02,
+}
+COUNT_TOKENS_CHUNK = 1000   # texts per count_tokens call in estimate_tokens
+# ----------------------------------------
+
+def _pct(xs: List[float], p: float) -> float:
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))]
+
+def _is_throttle(ex: Exception) -> bool:
+    return type(ex).__name__ == "RateLimitError" or "429" in str(ex)
+
+def cost_usd(model: str, tokens: int) -> Optional[float]:
+    price = PRICE_PER_M_TOKENS.get(model)
+    return None if price is None else tokens * price / 1e6
+
+class MeteredVoyage:
+    def __init__(self, client):
+        self._vo = client
+        self._lock = threading.Lock()
+        self.stats: Dict[tuple, Dict[str, Any]] = defaultdict(lambda: {
+            "calls": 0, "errors": 0, "throttled": 0, "tokens": 0, "docs": 0,
+            "latency_ms": [], "first": None, "last": None})
+
+    def __getattr__(self, name):
+        return getattr(self._vo, name)      # count_tokens, tokenize, ...
+
+    def _record(self, kind: str, model: str, t0: float, docs: int,
+                tokens: Optional[int] = None, ex: Exception = None) -> None:
+        t1 = time.perf_counter()
+        with self._lock:
+            s = self.stats[(kind, model)]
+            s["calls"] += 1
+            s["latency_ms"].append((t1 - t0) * 1000)
+            s["first"] = t0 if s["first"] is None else min(s["first"], t0)
+            s["last"] = t1 if s["last"] is None else max(s["last"], t1)
+            if ex is not None:
+                s["errors"] += 1
+                s["throttled"] += int(_is_throttle(ex))
+                return
+            s["docs"] += docs
+            s["tokens"] += int(tokens or 0)
+
+    def embed(self, texts: List[str], model: str = None, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            res = self._vo.embed(texts=texts, model=model, **kwargs)
+        except Exception as ex:
+            self._record("embed", model, t0, len(texts), ex=ex)
+            raise
+        self._record("embed", model, t0, len(texts), getattr(res, "total_tokens", None))
+        return res
+
+    def rerank(self, query: str, documents: List[str], model: str, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            res = self._vo.rerank(query=query, documents=documents, model=model, **kwargs)
+        except Exception as ex:
+            self._record("rerank", model, t0, len(documents), ex=ex)
+            raise
+        self._record("rerank", model, t0, len(documents), getattr(res, "total_tokens", None))
+        return res
+
+    def summary(self) -> List[Dict[str, Any]]:
+        rows = []
+        with self._lock:
+            for (kind, model), s in sorted(self.stats.items(), key=lambda kv: (kv[0][0], str(kv[0][1]))):
+                wall = (s["last"] - s["first"]) if s["first"] is not None else 0.0
+                busy = sum(s["latency_ms"]) / 1000
+                rows.append({
+                    "kind": kind, "model": model, "calls": s["calls"], "errors": s["errors"],
+                    "throttled": s["throttled"], "docs": s["docs"], "tokens": s["tokens"],
+                    "tokens_per_s": s["tokens"] / wall if wall else 0.0,
+                    "docs_per_s": s["docs"] / wall if wall else 0.0,
+                    "busy_s": busy,
+                    "p50_ms": _pct(s["latency_ms"], 50), "p95_ms": _pct(s["latency_ms"], 95),
+                    "usd": cost_usd(model, s["tokens"]),
+                })
+        return rows
+
+    def print_summary(self) -> None:
+        rows = self.summary()
+        if not rows:
+            return
+        print("\nVoyage usage:")
+        total = 0.0
+        for r in rows:
+            usd = "n/a" if r["usd"] is None else f"${r['usd']:.4f}"
+            total += r["usd"] or 0.0
+            print(f"  {r['kind']:6} {r['model'] or '(default)':16} calls={r['calls']:<5} err={r['errors']} "
+                  f"429={r['throttled']}  docs={r['docs']:<7} tokens={r['tokens']:<9} "
+                  f"{r['tokens_per_s']:9.0f} tok/s {r['docs_per_s']:7.1f} docs/s  "
+                  f"p50={r['p50_ms']:.0f}ms p95={r['p95_ms']:.0f}ms  {usd}")
+        print(f"  estimated total: ${total:.4f}")
+
+def estimate_tokens(vo, texts: Iterable[str], model: str) -> Dict[str, Any]:
+    """Pre-flight: count tokens locally for a planned embed run (no paid calls)."""
+    n_texts = tokens = 0
+    chunk: List[str] = []
+    for t in texts:
+        chunk.append(t)
+        if len(chunk) >= COUNT_TOKENS_CHUNK:
+            tokens += vo.count_tokens(chunk, model=model)
+            n_texts += len(chunk)
+            chunk = []
+    if chunk:
+        tokens += vo.count_tokens(chunk, model=model)
+        n_texts += len(chunk)
+    return {"texts": n_texts, "tokens": tokens, "usd": cost_usd(model, tokens)}
+
+def print_estimate(est: Dict[str, Any], model: str, batch_size: int) -> None:
+    usd = "n/a (no price for model)" if est["usd"] is None else f"${est['usd']:.4f}"
+    calls = -(-est["texts"] // batch_size) if batch_size else 0
+    print(f"Pre-flight estimate for {model}: {est['texts']} texts, {est['tokens']} tokens, "
+          f"~{calls} embed calls of ≤{batch_size}, {usd}")